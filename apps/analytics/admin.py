@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ViewerSession
+
+
+@admin.register(ViewerSession)
+class ViewerSessionAdmin(admin.ModelAdmin):
+    list_display = ('identity', 'room', 'creator_id', 'started_at', 'ended_at', 'watch_seconds', 'source')
+    search_fields = ('room', 'creator_id', 'identity')
+    # No date_hierarchy or list_filter on time: they'd scan every partition
+    show_full_result_count = False
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:45
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+
+TABLE = 'analytics_viewersession'
+
+PARTITIONED_TABLE_SQL = f"""
+DROP TABLE {TABLE};
+CREATE TABLE {TABLE} (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    session_key varchar(255) NOT NULL,
+    room varchar(255) NOT NULL,
+    creator_id varchar(255) NOT NULL,
+    identity varchar(255) NOT NULL,
+    source varchar(16) NOT NULL,
+    started_at timestamp with time zone NOT NULL,
+    ended_at timestamp with time zone NULL,
+    watch_seconds integer NOT NULL CHECK (watch_seconds >= 0),
+    PRIMARY KEY (id, started_at),
+    CONSTRAINT unique_viewer_session UNIQUE (session_key, started_at)
+) PARTITION BY RANGE (started_at);
+CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT;
+CREATE INDEX {TABLE}_started_brin ON {TABLE} USING brin (started_at) WITH (pages_per_range = 32);
+CREATE INDEX {TABLE}_ended_brin ON {TABLE} USING brin (ended_at) WITH (pages_per_range = 32);
+CREATE INDEX {TABLE}_creator_started ON {TABLE} (creator_id, started_at);
+"""
+
+# Days of partitions created up front; the daily beat task keeps extending
+INITIAL_PARTITION_DAYS = 7
+
+
+def partition_table(apps, schema_editor):
+    """
+    Swap the plain table CreateModel made for a day-partitioned one. Only
+    PostgreSQL supports this; other backends (SQLite in development) keep
+    the plain table.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(PARTITIONED_TABLE_SQL)
+    today = date.today()
+    for offset in range(-1, INITIAL_PARTITION_DAYS):
+        day = today + timedelta(days=offset)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE}_p{day:%Y%m%d} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{day.isoformat()} 00:00+00') TO ('{day + timedelta(days=1)} 00:00+00')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewerSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=255)),
+                ('room', models.CharField(max_length=255)),
+                ('creator_id', models.CharField(blank=True, max_length=255)),
+                ('identity', models.CharField(max_length=255)),
+                ('source', models.CharField(choices=[('webhook', 'LiveKit webhook'), ('token', 'Token issuance')], default='webhook', max_length=16)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('watch_seconds', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='viewersession',
+            constraint=models.UniqueConstraint(fields=('session_key', 'started_at'), name='unique_viewer_session'),
+        ),
+        # Reversing CreateModel drops the partitioned table and its partitions
+        migrations.RunPython(partition_table, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,36 @@
 from django.db import models
 
-# Create your models here.
+
+class ViewerSession(models.Model):
+    """
+    One viewer's continuous stay in a room, from join to leave.
+
+    On PostgreSQL the table is range-partitioned by day on started_at with
+    BRIN indexes on time (see migrations/0001_initial.py and
+    partitions.py). Partitioned tables can only enforce uniqueness on keys
+    that include the partition column, hence (session_key, started_at).
+    Rows are written by bulk upserts on that key.
+    """
+    SOURCE_WEBHOOK = 'webhook'
+    SOURCE_TOKEN = 'token'
+    SOURCE_CHOICES = [
+        (SOURCE_WEBHOOK, 'LiveKit webhook'),
+        (SOURCE_TOKEN, 'Token issuance'),
+    ]
+
+    session_key = models.CharField(max_length=255)
+    room = models.CharField(max_length=255)
+    creator_id = models.CharField(max_length=255, blank=True)
+    identity = models.CharField(max_length=255)
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES, default=SOURCE_WEBHOOK)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    watch_seconds = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session_key', 'started_at'], name='unique_viewer_session'),
+        ]
+
+    def __str__(self):
+        return f"{self.identity} in {self.room} ({self.watch_seconds}s)"
@@ -0,0 +1,93 @@
+"""
+Daily partition management for the ViewerSession table (PostgreSQL only).
+
+Partitions are named <table>_pYYYYMMDD and cover one UTC day each. Rows
+outside every partition land in <table>_default, which should stay
+empty: a partition can't be created for a range the default already has
+rows in, so partitions are kept PARTITION_DAYS_AHEAD days ahead.
+"""
+
+import logging
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection
+
+from .models import ViewerSession
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CONFIG = getattr(settings, 'ANALYTICS_CONFIG', {})
+PARTITION_DAYS_AHEAD = ANALYTICS_CONFIG.get('PARTITION_DAYS_AHEAD', 7)
+# None keeps every partition
+RETENTION_DAYS = ANALYTICS_CONFIG.get('SESSION_RETENTION_DAYS')
+
+TABLE = ViewerSession._meta.db_table
+
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def existing_partitions():
+    """Days that have a partition"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass", [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    days = []
+    prefix = f'{TABLE}_p'
+    for name in names:
+        if name.startswith(prefix):
+            suffix = name[len(prefix):]
+            days.append(date(int(suffix[:4]), int(suffix[4:6]), int(suffix[6:8])))
+    return sorted(days)
+
+
+def ensure_partitions(today=None):
+    """
+    Create missing partitions from yesterday to PARTITION_DAYS_AHEAD and
+    drop those older than RETENTION_DAYS. Returns (created, dropped).
+    """
+    if not is_partitioned():
+        return [], []
+
+    today = today or date.today()
+    have = set(existing_partitions())
+    created, dropped = [], []
+
+    with connection.cursor() as cursor:
+        for offset in range(-1, PARTITION_DAYS_AHEAD + 1):
+            day = today + timedelta(days=offset)
+            if day in have:
+                continue
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{day.isoformat()} 00:00+00') TO ('{day + timedelta(days=1)} 00:00+00')"
+            )
+            created.append(day)
+
+        if RETENTION_DAYS:
+            cutoff = today - timedelta(days=RETENTION_DAYS)
+            for day in sorted(have):
+                if day >= cutoff:
+                    break
+                cursor.execute(f"DROP TABLE IF EXISTS {partition_name(day)}")
+                dropped.append(day)
+
+    if created or dropped:
+        logger.info(f"Viewer session partitions: created {len(created)}, dropped {len(dropped)}")
+    return created, dropped
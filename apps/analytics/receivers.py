@@ -0,0 +1,44 @@
+"""
+Signal receivers, connected in AnalyticsConfig.ready().
+"""
+
+from django.dispatch import receiver
+
+from apps.livestream import directory
+from apps.livestream.livekit import get_field, is_standard_participant
+from apps.livestream.signals import token_issued, webhook_received
+
+from . import sessions
+from .models import ViewerSession
+
+
+@receiver(webhook_received)
+def track_viewer_sessions(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    participant = payload.get('participant') or {}
+    identity = participant.get('identity')
+
+    if event == 'participant_joined' and identity and is_standard_participant(participant):
+        creator_id = directory.get_room_creator(room_name)
+        if identity != creator_id:
+            sessions.session_started(
+                room_name, identity, creator_id,
+                started_at=get_field(participant, 'joined_at') or get_field(payload, 'created_at'),
+            )
+    elif event == 'participant_left' and identity:
+        sessions.session_ended(room_name, identity, ended_at=get_field(payload, 'created_at'))
+    elif event == 'room_finished':
+        sessions.close_room(room_name, ended_at=get_field(payload, 'created_at'))
+
+
+@receiver(token_issued)
+def open_provisional_session(sender, identity, room_name, role, **kwargs):
+    if role == 'host':
+        return
+    sessions.session_started(
+        room_name, identity, directory.get_room_creator(room_name),
+        source=ViewerSession.SOURCE_TOKEN,
+    )
@@ -0,0 +1,221 @@
+"""
+Pairing of join and leave events into viewer sessions.
+
+Open sessions live in Redis, one hash per room:
+
+    vs:open:<room>   identity -> {"k", "c", "src", "s"} (key, creator, source, start ms)
+    vs:rooms         set of rooms with open sessions
+    vs:pending       list of session rows waiting to be written
+
+Joins and leaves are paired atomically in Lua and the resulting rows are
+queued; the flush task drains the queue into ViewerSession with bulk
+upserts, so webhook handlers never touch Postgres. A session is written
+once when it opens (ended_at NULL) and upserted again when it closes.
+
+Sessions opened by token issuance are provisional: a LiveKit join for the
+same viewer replaces them, and one still provisional when it closes (on
+leave, room_finished or expiry) is dropped unwritten, since a token
+doesn't mean the viewer actually connected.
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+from .models import ViewerSession
+
+ANALYTICS_CONFIG = getattr(settings, 'ANALYTICS_CONFIG', {})
+FLUSH_BATCH_SIZE = ANALYTICS_CONFIG.get('SESSION_FLUSH_BATCH_SIZE', 5000)
+FLUSH_LOCK_TIMEOUT = ANALYTICS_CONFIG.get('SESSION_FLUSH_LOCK_TIMEOUT', 5 * 60)
+MAX_SESSION_SECONDS = ANALYTICS_CONFIG.get('MAX_SESSION_SECONDS', 12 * 60 * 60)
+
+ROOMS_KEY = make_key('vs', 'rooms')
+PENDING_KEY = make_key('vs', 'pending')
+FLUSH_LOCK_KEY = make_key('vs', 'flush', 'lock')
+
+# KEYS open hash, rooms set, pending list
+# ARGV identity, session JSON, room, source, ttl
+OPEN_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if current then
+    if ARGV[4] == 'token' or cjson.decode(current).src ~= 'token' then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('SADD', KEYS[2], ARGV[3])
+if ARGV[4] ~= 'token' then
+    local row = cjson.decode(ARGV[2])
+    row.i = ARGV[1]
+    row.r = ARGV[3]
+    redis.call('RPUSH', KEYS[3], cjson.encode(row))
+end
+return 1
+"""
+
+# KEYS open hash, rooms set, pending list
+# ARGV end ms, room, identity or '' for every open session
+# Provisional (token) sessions are dropped without a row
+CLOSE_SCRIPT = """
+local identities
+if ARGV[3] ~= '' then
+    identities = {ARGV[3]}
+else
+    identities = redis.call('HKEYS', KEYS[1])
+end
+local closed = 0
+for _, identity in ipairs(identities) do
+    local current = redis.call('HGET', KEYS[1], identity)
+    if current then
+        local row = cjson.decode(current)
+        if row.src ~= 'token' then
+            row.i = identity
+            row.r = ARGV[2]
+            row.e = tonumber(ARGV[1])
+            redis.call('RPUSH', KEYS[3], cjson.encode(row))
+            closed = closed + 1
+        end
+        redis.call('HDEL', KEYS[1], identity)
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[2])
+end
+return closed
+"""
+
+
+def _open_key(room_name):
+    return make_key('vs', 'open', room_name)
+
+
+def _ms(timestamp):
+    return int(float(timestamp) * 1000)
+
+
+def session_key(room_name, identity, started_ms):
+    digest = hashlib.sha1(f'{room_name}\x00{identity}'.encode()).hexdigest()[:24]
+    return f'{started_ms}-{digest}'
+
+
+def session_started(room_name, identity, creator_id=None, started_at=None,
+                    source=ViewerSession.SOURCE_WEBHOOK):
+    """Open a session unless one is already open. Returns True if opened."""
+    started_ms = _ms(started_at or time.time())
+    session = json.dumps({
+        'k': session_key(room_name, identity, started_ms),
+        'c': creator_id or '',
+        'src': source,
+        's': started_ms,
+    })
+    return bool(get_script(OPEN_SCRIPT)(
+        keys=[_open_key(room_name), ROOMS_KEY, PENDING_KEY],
+        args=[identity, session, room_name, source, MAX_SESSION_SECONDS * 2],
+    ))
+
+
+def session_ended(room_name, identity, ended_at=None):
+    return get_script(CLOSE_SCRIPT)(
+        keys=[_open_key(room_name), ROOMS_KEY, PENDING_KEY],
+        args=[_ms(ended_at or time.time()), room_name, identity],
+    )
+
+
+def close_room(room_name, ended_at=None):
+    """Close every session still open in a finished room"""
+    return get_script(CLOSE_SCRIPT)(
+        keys=[_open_key(room_name), ROOMS_KEY, PENDING_KEY],
+        args=[_ms(ended_at or time.time()), room_name, ''],
+    )
+
+
+def close_expired(now=None):
+    """
+    Close sessions open longer than MAX_SESSION_SECONDS; their leave was
+    lost. They are ended at the cap rather than now.
+    """
+    now_ms = _ms(now or time.time())
+    r = get_redis()
+    closed = 0
+    for room in r.smembers(ROOMS_KEY):
+        room_name = decode(room)
+        for identity, value in r.hgetall(_open_key(room_name)).items():
+            started_ms = json.loads(value)['s']
+            if now_ms - started_ms > MAX_SESSION_SECONDS * 1000:
+                closed += get_script(CLOSE_SCRIPT)(
+                    keys=[_open_key(room_name), ROOMS_KEY, PENDING_KEY],
+                    args=[started_ms + MAX_SESSION_SECONDS * 1000, room_name, decode(identity)],
+                )
+        if not r.exists(_open_key(room_name)):
+            r.srem(ROOMS_KEY, room_name)
+    return closed
+
+
+def _to_datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def _to_model(row):
+    ended = row.get('e')
+    watch_seconds = 0
+    if ended is not None:
+        watch_seconds = min(max(0, (ended - row['s']) // 1000), MAX_SESSION_SECONDS)
+    return ViewerSession(
+        session_key=row['k'],
+        room=row['r'],
+        creator_id=row.get('c') or '',
+        identity=row['i'],
+        source=row['src'],
+        started_at=_to_datetime(row['s']),
+        ended_at=_to_datetime(ended) if ended is not None else None,
+        watch_seconds=watch_seconds,
+    )
+
+
+def flush(batch_size=None):
+    """
+    Upsert queued session rows in batches. Returns the number of rows
+    written, or None if another flush holds the lock.
+    """
+    batch_size = batch_size or FLUSH_BATCH_SIZE
+    r = get_redis()
+    # Overlapping runs would each trim the same rows, losing the ones in between
+    if not r.set(FLUSH_LOCK_KEY, 1, nx=True, ex=FLUSH_LOCK_TIMEOUT):
+        return None
+    try:
+        return _flush(r, batch_size)
+    finally:
+        r.delete(FLUSH_LOCK_KEY)
+
+
+def _flush(r, batch_size):
+    written = 0
+    while True:
+        raw = r.lrange(PENDING_KEY, 0, batch_size - 1)
+        if not raw:
+            break
+
+        # One statement can't upsert the same row twice; the close wins
+        rows = {}
+        for item in raw:
+            row = json.loads(item)
+            if row['k'] not in rows or row.get('e') is not None:
+                rows[row['k']] = row
+
+        ViewerSession.objects.bulk_create(
+            [_to_model(row) for row in rows.values()],
+            update_conflicts=True,
+            unique_fields=['session_key', 'started_at'],
+            update_fields=['ended_at', 'watch_seconds'],
+        )
+        r.ltrim(PENDING_KEY, len(raw), -1)
+        written += len(rows)
+        if len(raw) < batch_size:
+            break
+
+    return written
@@ -0,0 +1,25 @@
+import logging
+from celery import shared_task
+
+from . import partitions, sessions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_viewer_sessions():
+    """Write queued viewer sessions to Postgres"""
+    written = sessions.flush()
+    if written:
+        logger.info(f"Upserted {written} viewer sessions")
+    return written
+
+
+@shared_task
+def maintain_viewer_sessions():
+    """Close sessions whose leave was lost and keep day partitions ahead"""
+    closed = sessions.close_expired()
+    if closed:
+        logger.info(f"Closed {closed} expired viewer sessions")
+    created, dropped = partitions.ensure_partitions()
+    return {'closed': closed, 'partitions_created': len(created), 'partitions_dropped': len(dropped)}
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('v1/analytics/creators/<str:creator_id>/watch-time/', views.creator_watch_time, name='creator_watch_time'),
+]
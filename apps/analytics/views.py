@@ -1,3 +1,66 @@
-from django.shortcuts import render
+from datetime import date, datetime, time, timedelta, timezone
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 
-# Create your views here.
+from .models import ViewerSession
+
+MAX_RANGE_DAYS = 400
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def creator_watch_time(request, creator_id):
+    """
+    Daily sessions, unique viewers and watch time for a creator's rooms
+    (?from=YYYY-MM-DD&to=YYYY-MM-DD, inclusive; defaults to the last 30 days)
+    """
+    try:
+        try:
+            end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else date.today()
+            start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else end - timedelta(days=29)
+        except ValueError:
+            return JsonResponse({'error': 'from and to must be YYYY-MM-DD dates'}, status=400)
+        if start > end:
+            return JsonResponse({'error': 'from must not be after to'}, status=400)
+        if (end - start).days >= MAX_RANGE_DAYS:
+            return JsonResponse({'error': f'range must be under {MAX_RANGE_DAYS} days'}, status=400)
+
+        # A range on started_at lets Postgres prune to the matching day partitions
+        since = datetime.combine(start, time.min, tzinfo=timezone.utc)
+        until = datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        days = (
+            ViewerSession.objects
+            .filter(creator_id=creator_id, started_at__gte=since, started_at__lt=until)
+            .annotate(day=TruncDate('started_at'))
+            .values('day')
+            .annotate(
+                sessions=Count('id'),
+                viewers=Count('identity', distinct=True),
+                watch_seconds=Sum('watch_seconds'),
+            )
+            .order_by('day')
+        )
+
+        daily = [{
+            'date': row['day'].isoformat(),
+            'sessions': row['sessions'],
+            'unique_viewers': row['viewers'],
+            'watch_seconds': row['watch_seconds'] or 0,
+        } for row in days]
+
+        return JsonResponse({
+            'creator_id': creator_id,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'days': daily,
+            'totals': {
+                'sessions': sum(d['sessions'] for d in daily),
+                'watch_seconds': sum(d['watch_seconds'] for d in daily),
+            },
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.core"  # Changed from "core" to "apps.core"
+
+    def ready(self):
+        # Make the project's Celery app current so shared_task .delay() calls
+        # from web processes use our broker. Imported here rather than in
+        # livestream_project/__init__.py so gevent can patch before Celery loads.
+        from livestream_project.celery import app  # noqa: F401
+        from . import receivers, tracing  # noqa: F401
+        if tracing.ENABLED:
+            tracing.instrument()
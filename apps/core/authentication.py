@@ -41,4 +41,51 @@ class ServiceUser:
     
     @property
     def id(self):
-        return f"service_{self.service_name}"
\ No newline at end of file
+        return f"service_{self.service_name}"
+
+class UserTokenAuthentication(BaseAuthentication):
+    """End-user JWTs issued by the main app: `Authorization: Bearer <jwt>` with a user_id claim"""
+
+    def authenticate(self, request):
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+
+        token = auth_header.split(' ', 1)[1]
+        secret = getattr(settings, 'MAIN_APP_CONFIG', {}).get('USER_TOKEN_SECRET') or settings.SECRET_KEY
+        try:
+            payload = jwt.decode(token, secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError:
+            raise AuthenticationFailed('Invalid user token')
+
+        user_id = payload.get('user_id')
+        if not user_id:
+            raise AuthenticationFailed('User token has no user_id')
+        return (TokenUser(str(user_id)), token)
+
+class TokenUser:
+    """An end user authenticated by a main app token"""
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.is_authenticated = True
+        self.is_service = False
+
+def authenticate_user(request):
+    """
+    ID (a string) of the user a request acts for: the user token's
+    subject, or the X-User-Id the main app names with its service token.
+    None if the request carries neither; raises AuthenticationFailed for
+    bad tokens.
+    """
+    result = UserTokenAuthentication().authenticate(request)
+    if result is not None:
+        return result[0].id
+
+    result = ServiceTokenAuthentication().authenticate(request)
+    if result is not None:
+        user_id = request.META.get('HTTP_X_USER_ID')
+        if not user_id:
+            raise AuthenticationFailed('Service calls must name the user in X-User-Id')
+        return str(user_id)
+    return None
@@ -0,0 +1,132 @@
+"""
+Helpers shared by the bench_* management commands.
+
+StubLiveKit is a local stand-in for a LiveKit node: it answers the Twirp
+endpoints the service calls, after an optional artificial delay, so
+benchmarks can model a slow upstream without a real server.
+"""
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list, pct in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency distribution (milliseconds) for one run"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def fake_participant(index):
+    return {
+        'sid': f'PA_{index:08d}',
+        'identity': f'user-{index}',
+        'name': f'Viewer {index}',
+        'state': 'ACTIVE',
+        'joined_at': str(1700000000 + index),
+        'metadata': json.dumps({'avatar': f'https://cdn.example.com/a/{index}.png'}),
+        'permission': {'can_subscribe': True, 'can_publish': False, 'can_publish_data': True},
+        'tracks': [],
+        'is_publisher': False,
+    }
+
+
+class StubLiveKit:
+    """
+    Minimal threaded HTTP server emulating the LiveKit Twirp API.
+
+    Extra endpoints can be registered with add_route(); a handler receives
+    the decoded JSON body and returns a JSON-serializable dict.
+    """
+
+    def __init__(self, delay=0.0, participants=10, host='127.0.0.1', port=0):
+        self.delay = delay
+        self.participants = participants
+        self.rooms = {}
+        self.routes = {
+            '/twirp/livekit.RoomService/ListRooms': self._list_rooms,
+            '/twirp/livekit.RoomService/ListParticipants': self._list_participants,
+        }
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def add_route(self, path, handler):
+        self.routes[path] = handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _list_rooms(self, body):
+        return {'rooms': list(self.rooms.values())}
+
+    def _list_participants(self, body):
+        return {'participants': [fake_participant(i) for i in range(self.participants)]}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                handler = stub.routes.get(self.path.split('?')[0])
+                if handler is None:
+                    payload, status = b'', 404
+                else:
+                    body = json.loads(raw) if raw else {}
+                    payload, status = json.dumps(handler(body)).encode(), 200
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _respond
+            do_POST = _respond
+
+        return Handler
@@ -0,0 +1,309 @@
+"""
+Two-tier cache backend: a bounded in-process LRU in front of django_redis.
+
+Reads of eligible keys (all keys, or those starting with one of
+LOCAL_CACHE['KEY_PREFIXES']) are served from process memory when
+possible and fall through to Redis otherwise. Every write or delete goes
+to Redis, updates the local tier and is broadcast on a pub/sub channel;
+each process runs a listener thread that evicts those keys locally, so
+other workers see the change as soon as the message lands. Entries also
+expire locally after LOCAL_CACHE['TIMEOUT'] seconds, which bounds
+staleness if a message is ever missed; a listener that reconnects drops
+its whole local tier for the same reason.
+
+    CACHES['default'] = {
+        'BACKEND': 'apps.core.cache.TwoTierRedisCache',
+        ...
+        'OPTIONS': {
+            ...
+            'LOCAL_CACHE': {'MAX_ENTRIES': 5000, 'TIMEOUT': 30, 'KEY_PREFIXES': ['livekit:', 'room:']},
+        },
+    }
+
+Local values are kept pickled, so callers can't mutate each other's copy.
+"""
+
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalTier:
+    """Thread-safe LRU of pickled values with per-entry expiry"""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, payload = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(payload)
+
+    def set(self, key, value, timeout=None):
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        if ttl <= 0:
+            self.delete(key)
+            return
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierRedisCache(RedisCache):
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        local = params.get('OPTIONS', {}).get('LOCAL_CACHE', {})
+        self.local = LocalTier(local.get('MAX_ENTRIES', 5000), local.get('TIMEOUT', 30))
+        self.local_prefixes = tuple(local.get('KEY_PREFIXES') or ())
+        self.channel = local.get('CHANNEL') or f"{params.get('KEY_PREFIX', '')}:cache-invalidation"
+        self.origin = uuid.uuid4().hex
+
+        self._stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'invalidations': 0}
+        # Bumped by every invalidation; a Redis read that raced one isn't kept locally
+        self._generation = 0
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    # Local tier plumbing
+
+    def _local_key(self, key, version):
+        return f'{self.version if version is None else version}:{key}'
+
+    def _eligible(self, key):
+        return not self.local_prefixes or str(key).startswith(self.local_prefixes)
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._listener_pid == pid and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener_pid == pid and self._listener.is_alive():
+                return
+            if self._listener_pid != pid:
+                # Forked: anything inherited may already be stale
+                self.local.clear()
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._listener_pid = pid
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while we weren't subscribed is lost
+                self._generation += 1
+                self.local.clear()
+                for message in pubsub.listen():
+                    self._apply_invalidation(message['data'])
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener lost its connection: {e}")
+                self.local.clear()
+                time.sleep(1)
+
+    def _apply_invalidation(self, data):
+        message = json.loads(data)
+        if message.get('origin') == self.origin:
+            return
+        self._generation += 1
+        self._stats['invalidations'] += 1
+        if message.get('clear'):
+            self.local.clear()
+            return
+        for key in message.get('keys', ()):
+            self.local.delete(key)
+
+    def _publish(self, keys=None, clear=False):
+        message = {'origin': self.origin}
+        if clear:
+            message['clear'] = True
+        else:
+            message['keys'] = list(keys)
+            if not message['keys']:
+                return
+        try:
+            self.client.get_client().publish(self.channel, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Cache invalidation publish failed: {e}")
+
+    def _invalidate(self, keys, version=None):
+        local_keys = [self._local_key(key, version) for key in keys if self._eligible(key)]
+        for local_key in local_keys:
+            self.local.delete(local_key)
+        self._publish(local_keys)
+
+    # Reads
+
+    def get(self, key, default=None, version=None, client=None):
+        if not self._eligible(key):
+            return self._get_remote(key, default, version, client)
+
+        self._ensure_listener()
+        local_key = self._local_key(key, version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            self._stats['local_hits'] += 1
+            return value
+
+        generation = self._generation
+        value = self._get_remote(key, _MISSING, version, client)
+        if value is _MISSING:
+            return default
+        if generation == self._generation:
+            self.local.set(local_key, value)
+        return value
+
+    def get_remote(self, key, default=None, version=None, client=None):
+        """Read straight from Redis, skipping the local tier (health checks)"""
+        return self._get_remote(key, default, version, client)
+
+    def _get_remote(self, key, default, version, client):
+        value = super().get(key, default=_MISSING, version=version, client=client)
+        if value is _MISSING:
+            self._stats['misses'] += 1
+            return default
+        self._stats['redis_hits'] += 1
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        if any(self._eligible(key) for key in keys):
+            self._ensure_listener()
+
+        found, remote = {}, []
+        for key in keys:
+            value = self.local.get(self._local_key(key, version)) if self._eligible(key) else _MISSING
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        self._stats['local_hits'] += len(found)
+
+        if remote:
+            generation = self._generation
+            fetched = super().get_many(remote, version=version, client=client)
+            self._stats['redis_hits'] += len(fetched)
+            self._stats['misses'] += len(remote) - len(fetched)
+            for key, value in fetched.items():
+                if self._eligible(key) and generation == self._generation:
+                    self.local.set(self._local_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    # Writes
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        result = super().set(key, value, timeout=timeout, version=version, client=client, nx=nx, xx=xx)
+        self._invalidate([key], version)
+        if result and self._eligible(key):
+            self.local.set(self._local_key(key, version), value, self.get_backend_timeout(timeout))
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        added = super().add(key, value, timeout=timeout, version=version, client=client)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        failed = super().set_many(data, timeout=timeout, version=version, client=client)
+        self._invalidate(data.keys(), version)
+        return failed
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self._invalidate([key], version)
+        return result
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        result = super().delete_many(keys, version=version)
+        self._invalidate(keys, version)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self.local.clear()
+        self._publish(clear=True)
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self.local.clear()
+        self._publish(clear=True)
+        return result
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        value = super().incr(key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._invalidate([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None, client=None):
+        value = super().decr(key, delta=delta, version=version, client=client)
+        self._invalidate([key], version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().touch(key, timeout=timeout, version=version, client=client)
+        self._invalidate([key], version)
+        return result
+
+    def expire(self, key, timeout, version=None, client=None):
+        result = super().expire(key, timeout, version=version, client=client)
+        self._invalidate([key], version)
+        return result
+
+    # Stats
+
+    def stats(self):
+        """Hit counts and ratios per tier since the process started"""
+        stats = dict(self._stats)
+        lookups = stats['local_hits'] + stats['redis_hits'] + stats['misses']
+        redis_lookups = stats['redis_hits'] + stats['misses']
+        stats['local_entries'] = len(self.local)
+        stats['local_hit_ratio'] = stats['local_hits'] / lookups if lookups else 0.0
+        stats['redis_hit_ratio'] = stats['redis_hits'] / redis_lookups if redis_lookups else 0.0
+        stats['overall_hit_ratio'] = (stats['local_hits'] + stats['redis_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self):
+        for name in self._stats:
+            self._stats[name] = 0
@@ -4,6 +4,8 @@ import logging
 from django.conf import settings
 from datetime import datetime, timedelta
 
+from .tracing import inject, traced
+
 logger = logging.getLogger(__name__)
 
 class MainAppClient:
@@ -24,11 +26,12 @@ class MainAppClient:
     
     def get_headers(self):
         """Get headers for API requests"""
-        return {
+        return inject({
             'Authorization': f'Service {self.get_service_token()}',
             'Content-Type': 'application/json',
-        }
+        })
     
+    @traced('main_app.get_user')
     def get_user(self, user_id):
         """Get user details from main app"""
         try:
@@ -48,6 +51,7 @@ class MainAppClient:
             logger.error(f"Error getting user {user_id}: {str(e)}")
             return None
     
+    @traced('main_app.verify_user_subscription')
     def verify_user_subscription(self, user_id, creator_id):
         """Check if user is subscribed to creator"""
         try:
@@ -65,7 +69,34 @@ class MainAppClient:
         except requests.RequestException as e:
             logger.error(f"Error checking subscription: {str(e)}")
             return False
-    
+
+    @traced('main_app.get_creator_subscribers')
+    def get_creator_subscribers(self, creator_id, cursor=None, page_size=10000):
+        """
+        One page of a creator's active subscribers:
+        {'user_ids': [...], 'next_cursor': ... or None}, or None on failure
+        """
+        try:
+            params = {'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            response = requests.get(
+                f"{self.base_url}/api/internal/subscriptions/creators/{creator_id}/subscribers/",
+                params=params,
+                headers=self.get_headers(),
+                timeout=self.timeout
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            logger.error(f"Failed to list subscribers of creator {creator_id}: {response.status_code}")
+            return None
+
+        except requests.RequestException as e:
+            logger.error(f"Error listing subscribers of creator {creator_id}: {str(e)}")
+            return None
+
+    @traced('main_app.get_user_wallet')
     def get_user_wallet(self, user_id):
         """Get user's wallet balance"""
         try:
@@ -83,6 +114,7 @@ class MainAppClient:
             logger.error(f"Error getting wallet for user {user_id}: {str(e)}")
             return None
     
+    @traced('main_app.deduct_user_coins')
     def deduct_user_coins(self, user_id, amount, description):
         """Deduct coins from user's wallet"""
         try:
@@ -103,6 +135,7 @@ class MainAppClient:
             logger.error(f"Error deducting coins: {str(e)}")
             return False
     
+    @traced('main_app.add_creator_earnings')
     def add_creator_earnings(self, creator_id, amount, description):
         """Add earnings to creator's wallet"""
         try:
@@ -123,6 +156,59 @@ class MainAppClient:
             logger.error(f"Error adding creator earnings: {str(e)}")
             return False
     
+    @traced('main_app.reserve_user_coins')
+    def reserve_user_coins(self, user_id, amount, reference, reservation_id=None):
+        """
+        Hold up to `amount` coins of the user's balance for spending in a
+        room, or add to an existing hold. Returns the reservation
+        ({'reservation_id', 'amount'}, amount being what was granted) or None.
+        """
+        try:
+            payload = {'amount': amount, 'reference': reference}
+            if reservation_id:
+                payload['reservation_id'] = reservation_id
+            response = requests.post(
+                f"{self.base_url}/api/internal/wallets/{user_id}/reservations/",
+                json=payload,
+                headers=self.get_headers(),
+                timeout=self.timeout
+            )
+
+            if response.status_code in (200, 201):
+                return response.json()
+            logger.warning(f"Reserving {amount} coins for user {user_id} failed: {response.status_code}")
+            return None
+
+        except requests.RequestException as e:
+            logger.error(f"Error reserving coins for user {user_id}: {str(e)}")
+            return None
+
+    @traced('main_app.settle_reservations')
+    def settle_reservations(self, settlements):
+        """
+        Report spending against reservations in one call. Each settlement
+        carries the cumulative amount spent and the creator it goes to;
+        `release` returns the unspent remainder to the user. Returns the IDs
+        of settled reservations, or None if the call failed.
+        """
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/internal/wallets/reservations/settle/",
+                json={'settlements': settlements, 'transaction_type': 'gift_sent'},
+                headers=self.get_headers(),
+                timeout=self.timeout
+            )
+
+            if response.status_code == 200:
+                return set(response.json().get('settled', []))
+            logger.error(f"Settling {len(settlements)} reservations failed: {response.status_code}")
+            return None
+
+        except requests.RequestException as e:
+            logger.error(f"Error settling reservations: {str(e)}")
+            return None
+
+    @traced('main_app.notify_user')
     def notify_user(self, user_id, notification_type, data):
         """Send notification to user via main app"""
         try:
@@ -0,0 +1,92 @@
+"""
+Route-aware middleware chains ("fast lanes").
+
+Django builds one middleware chain per handler, so every request pays for
+sessions, CSRF, auth and messages even on stateless, csrf_exempt JSON
+endpoints that never look at them. FAST_LANE_CONFIG['LANES'] maps URL
+prefixes to a reduced MIDDLEWARE list; the handlers here build one extra
+Django handler per lane at startup and send each request to the first
+lane whose prefix matches its path, or to the full chain otherwise.
+
+Only drop middleware a lane's views really don't use: without
+SessionMiddleware and AuthenticationMiddleware there is no request.session
+or request.user, and without CsrfViewMiddleware nothing is CSRF-checked.
+
+wsgi.py and asgi.py build their applications with get_wsgi_application()
+and get_asgi_application() from this module.
+"""
+
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+FAST_LANE_CONFIG = getattr(settings, 'FAST_LANE_CONFIG', {})
+ENABLED = FAST_LANE_CONFIG.get('ENABLED', False)
+LANES = FAST_LANE_CONFIG.get('LANES', {})
+
+
+class _Lane:
+    """Handler whose middleware chain is `middleware` instead of settings.MIDDLEWARE"""
+
+    def __init__(self, middleware):
+        self.lane_middleware = list(middleware)
+        super().__init__()
+
+    def load_middleware(self, is_async=False):
+        # BaseHandler reads settings.MIDDLEWARE; this only runs at startup
+        full = settings.MIDDLEWARE
+        settings.MIDDLEWARE = self.lane_middleware
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = full
+
+
+class LaneWSGIHandler(_Lane, WSGIHandler):
+    pass
+
+
+class LaneASGIHandler(_Lane, ASGIHandler):
+    pass
+
+
+class FastLaneWSGIHandler(WSGIHandler):
+    def __init__(self, lanes=None):
+        super().__init__()
+        lanes = LANES if lanes is None else lanes
+        self.lanes = [(prefix, LaneWSGIHandler(middleware)) for prefix, middleware in lanes.items()]
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        for prefix, handler in self.lanes:
+            if path.startswith(prefix):
+                return handler(environ, start_response)
+        return super().__call__(environ, start_response)
+
+
+class FastLaneASGIHandler(ASGIHandler):
+    def __init__(self, lanes=None):
+        super().__init__()
+        lanes = LANES if lanes is None else lanes
+        self.lanes = [(prefix, LaneASGIHandler(middleware)) for prefix, middleware in lanes.items()]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            path, root_path = scope.get('path', ''), scope.get('root_path', '')
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            for prefix, handler in self.lanes:
+                if path.startswith(prefix):
+                    return await handler(scope, receive, send)
+        return await super().__call__(scope, receive, send)
+
+
+def get_wsgi_application():
+    django.setup(set_prefix=False)
+    return FastLaneWSGIHandler() if ENABLED else WSGIHandler()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return FastLaneASGIHandler() if ENABLED else ASGIHandler()
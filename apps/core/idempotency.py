@@ -0,0 +1,215 @@
+"""
+Idempotency-Key support for POST endpoints that mobile clients retry.
+
+    @csrf_exempt
+    @require_http_methods(["POST"])
+    @idempotent
+    def send_gift(request, room_name): ...
+
+A request carrying an `Idempotency-Key` header claims
+
+    idem:<view>:<caller>:<key>    {'state': 'running' | 'done', 'fingerprint', response...}
+
+with SET NX. <caller> is a hash of the request's Authorization and
+X-User-Id headers, so keys are scoped to the credentials that sent them
+and nobody can replay another caller's response (a LiveKit token, say)
+by guessing their key. The fingerprint is a hash of method, path, body
+and caller, so a key reused for a different request gets a 422 instead
+of a stale response. The first request runs the view and stores its response for
+TTL; retries replay it with `Idempotent-Replayed: true`. Duplicates that
+arrive while the first is still running poll the key until it finishes
+(up to WAIT_TIMEOUT, then 409 with Retry-After) instead of running the
+view a second time.
+
+Server errors and transient answers (202, 409, 429) aren't stored, so a
+retry runs again. Requests without the header, and any request while Redis
+is unavailable, go straight to the view.
+
+Counters in `idem:stats` (per view) back `stats()`, whose hit_rate is the
+share of keyed requests answered without running the view.
+"""
+
+import base64
+import functools
+import hashlib
+import json
+import logging
+import time
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from redis.exceptions import RedisError
+
+from .redis_client import decode, decode_hash, get_redis, make_key
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_CONFIG = getattr(settings, 'IDEMPOTENCY_CONFIG', {})
+TTL = IDEMPOTENCY_CONFIG.get('TTL', 24 * 60 * 60)
+# Longest a request may hold its key before duplicates may run again
+LOCK_TTL = IDEMPOTENCY_CONFIG.get('LOCK_TTL', 60)
+WAIT_TIMEOUT = IDEMPOTENCY_CONFIG.get('WAIT_TIMEOUT', 10)
+POLL_INTERVAL = IDEMPOTENCY_CONFIG.get('POLL_INTERVAL', 0.05)
+MAX_POLL_INTERVAL = 0.5
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+TRANSIENT_STATUSES = (202, 409, 429)
+STATS_KEY = make_key('idem', 'stats')
+COUNTERS = ('requests', 'executed', 'replayed', 'waited', 'conflicts', 'timeouts')
+
+
+def _caller(request):
+    """Hash of the credentials a request carries"""
+    digest = hashlib.sha256()
+    for header in ('Authorization', 'X-User-Id'):
+        digest.update(request.headers.get(header, '').encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def _record_key(view_name, caller, key):
+    return make_key('idem', view_name, caller, key)
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.body, _caller(request).encode()):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _count(r, view_name, counter):
+    try:
+        r.hincrby(STATS_KEY, f'{view_name}:{counter}', 1)
+    except RedisError:
+        pass
+
+
+def _store(response, fp):
+    return json.dumps({
+        'state': 'done',
+        'fingerprint': fp,
+        'status': response.status_code,
+        'content': base64.b64encode(response.content).decode(),
+        'content_type': response['Content-Type'],
+    })
+
+
+def _replay(record):
+    response = HttpResponse(
+        base64.b64decode(record['content']), status=record['status'], content_type=record['content_type']
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _storable(response):
+    return (not getattr(response, 'streaming', False)
+            and response.status_code < 500 and response.status_code not in TRANSIENT_STATUSES)
+
+
+def _wait(r, record_key, fp):
+    """Poll a running record until it is done or gone. Returns the final record or None."""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    interval = POLL_INTERVAL
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+        raw = r.get(record_key)
+        if raw is None:
+            return None
+        record = json.loads(decode(raw))
+        if record['state'] == 'done':
+            return record
+    return {'state': 'running', 'fingerprint': fp}
+
+
+def idempotent(view):
+    view_name = view.__name__
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'error': f'{HEADER} is limited to {MAX_KEY_LENGTH} characters'}, status=400)
+
+        fp = fingerprint(request)
+        record_key = _record_key(view_name, _caller(request), key)
+        try:
+            r = get_redis()
+            _count(r, view_name, 'requests')
+            claimed = r.set(record_key, json.dumps({'state': 'running', 'fingerprint': fp}), nx=True, ex=LOCK_TTL)
+            record = None if claimed else r.get(record_key)
+            if not claimed and record is None:
+                # The first request failed and released the key between our two calls
+                claimed = r.set(record_key, json.dumps({'state': 'running', 'fingerprint': fp}), nx=True, ex=LOCK_TTL)
+        except RedisError as e:
+            logger.warning(f"Idempotency store unavailable for {view_name}, running without it: {e}")
+            return view(request, *args, **kwargs)
+
+        if not claimed:
+            record = json.loads(decode(record)) if record is not None else {'state': 'running', 'fingerprint': fp}
+            if record['fingerprint'] != fp:
+                _count(r, view_name, 'conflicts')
+                return JsonResponse({'error': f'{HEADER} was already used for a different request'}, status=422)
+            if record['state'] == 'done':
+                _count(r, view_name, 'replayed')
+                return _replay(record)
+
+            try:
+                record = _wait(r, record_key, fp)
+            except RedisError as e:
+                logger.warning(f"Lost the idempotency store waiting on {view_name} {key}: {e}")
+                record = {'state': 'running', 'fingerprint': fp}
+            if record is None:
+                # The first attempt failed without storing a response; the client should retry
+                _count(r, view_name, 'timeouts')
+                response = JsonResponse({'error': 'The original request failed, retry it'}, status=409)
+                response['Retry-After'] = '1'
+                return response
+            if record['state'] == 'done':
+                _count(r, view_name, 'waited')
+                return _replay(record)
+            _count(r, view_name, 'timeouts')
+            response = JsonResponse({'error': 'A request with this Idempotency-Key is still in progress'}, status=409)
+            response['Retry-After'] = str(max(1, int(WAIT_TIMEOUT)))
+            return response
+
+        _count(r, view_name, 'executed')
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            _release(r, record_key)
+            raise
+        try:
+            if _storable(response):
+                r.set(record_key, _store(response, fp), ex=TTL)
+            else:
+                r.delete(record_key)
+        except RedisError as e:
+            logger.warning(f"Could not store idempotent response for {view_name} {key}: {e}")
+        return response
+
+    return wrapper
+
+
+def _release(r, record_key):
+    try:
+        r.delete(record_key)
+    except RedisError:
+        pass
+
+
+def stats():
+    """Counters per view, with hit_rate = (replayed + waited) / requests"""
+    views = {}
+    for field, value in decode_hash(get_redis().hgetall(STATS_KEY)).items():
+        view_name, _, counter = field.rpartition(':')
+        views.setdefault(view_name, dict.fromkeys(COUNTERS, 0))[counter] = int(value)
+    for counters in views.values():
+        deduplicated = counters['replayed'] + counters['waited']
+        counters['hit_rate'] = round(deduplicated / counters['requests'], 4) if counters['requests'] else 0.0
+    return views
@@ -0,0 +1,107 @@
+"""
+Incremental parsing of large JSON responses.
+
+iter_array() walks a top-level JSON object as its bytes arrive and yields
+the elements of one array member one at a time, so a 50k-element upstream
+response never exists as a single string or list. Memory is bounded by
+one read chunk plus the element being decoded; everything else in the
+body is decoded and dropped.
+"""
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """Text buffer over an iterable of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping what has been consumed; False at the end of the body"""
+        if self.eof:
+            return False
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += self.text.decode(chunk)
+                return True
+        self.buffer += self.text.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the body"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'expected {char!r} at offset {self.pos} of the JSON body')
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more of the body until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end < len(self.buffer) or self.eof:
+                self.pos = end
+                return value
+            self.fill()
+
+
+def iter_array(chunks, key):
+    """
+    Elements of the array `key` of the JSON object in `chunks` (bytes), in
+    order. Yields nothing if the object has no such member; raises
+    ValueError on malformed JSON.
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.pos += 1
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    separator = reader.peek()
+                    reader.pos += 1
+                    if separator == ']':
+                        break
+                    if separator != ',':
+                        raise ValueError(f'expected , or ] at offset {reader.pos - 1} of the JSON body')
+        else:
+            reader.value()
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError(f'expected , or }} at offset {reader.pos - 1} of the JSON body')
@@ -0,0 +1,93 @@
+"""
+Compare cache read latency with and without the in-process tier.
+
+Seeds --keys values into Redis, then issues --reads lookups with a Zipf
+key distribution (a few hot keys, a long tail) against the plain
+django_redis backend and against TwoTierRedisCache, and reports latency
+percentiles plus per-tier hit ratios. --write-ratio mixes in writes, which
+exercise pub/sub invalidation.
+
+    python manage.py bench_cache --keys 2000 --reads 100000 --write-ratio 0.01
+"""
+
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis.cache import RedisCache
+
+from apps.core.benchmarking import summarize
+from apps.core.cache import TwoTierRedisCache
+
+
+class Command(BaseCommand):
+    help = 'Benchmark p50/p99 cache read latency with and without the local LRU tier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--reads', type=int, default=100000)
+        parser.add_argument('--value-size', type=int, default=512)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of key popularity')
+        parser.add_argument('--write-ratio', type=float, default=0.0)
+        parser.add_argument('--local-entries', type=int, default=5000)
+        parser.add_argument('--local-timeout', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        params = dict(settings.CACHES['default'])
+        location = params.pop('LOCATION')
+        params['KEY_PREFIX'] = 'bench-cache'
+        params['OPTIONS'] = dict(params.get('OPTIONS', {}), LOCAL_CACHE={
+            'MAX_ENTRIES': options['local_entries'],
+            'TIMEOUT': options['local_timeout'],
+        })
+
+        plain = RedisCache(location, params)
+        two_tier = TwoTierRedisCache(location, params)
+
+        keys = [f'room:{i}:meta' for i in range(options['keys'])]
+        value = {'title': 'x' * options['value_size'], 'creator_id': 'creator-1', 'category': 'music'}
+        plain.set_many({key: value for key in keys}, timeout=600)
+
+        rng = random.Random(options['seed'])
+        weights = [1 / (rank + 1) ** options['zipf'] for rank in range(len(keys))]
+        workload = rng.choices(keys, weights=weights, k=options['reads'])
+        writes = [rng.random() < options['write_ratio'] for _ in workload]
+
+        try:
+            results = {}
+            for name, cache in (('redis', plain), ('two-tier', two_tier)):
+                results[name] = self.run(cache, workload, writes, value)
+        finally:
+            plain.delete_many(keys)
+
+        self.stdout.write(
+            f"{len(keys)} keys, {len(workload)} operations, zipf {options['zipf']}, "
+            f"write ratio {options['write_ratio']}"
+        )
+        self.stdout.write(f"{'backend':<10}{'ops/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<10}{r['rps']:>10.0f}{r['p50_ms']:>8.3f}ms{r['p95_ms']:>8.3f}ms"
+                f"{r['p99_ms']:>8.3f}ms{r['max_ms']:>8.2f}ms"
+            )
+
+        stats = two_tier.stats()
+        self.stdout.write(
+            f"two-tier hit ratio: local {stats['local_hit_ratio']:.1%}, "
+            f"redis {stats['redis_hit_ratio']:.1%} of local misses, "
+            f"overall {stats['overall_hit_ratio']:.1%}; {stats['local_entries']} local entries"
+        )
+
+    def run(self, cache, workload, writes, value):
+        latencies = []
+        started = time.perf_counter()
+        for key, write in zip(workload, writes):
+            if write:
+                cache.set(key, value, timeout=600)
+                continue
+            t0 = time.perf_counter()
+            cache.get(key)
+            latencies.append(time.perf_counter() - t0)
+        return summarize(latencies, time.perf_counter() - started)
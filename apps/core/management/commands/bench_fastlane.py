@@ -0,0 +1,181 @@
+"""
+Measure the per-request CPU the fast lane saves on generate_token.
+
+Builds the full-chain WSGI handler and the fast-lane handler in this
+process and drives POST /api/v1/livestream/generate-token/ through each
+with --concurrency threads, alternating modes for --rounds so both see the
+same Redis and machine noise. Requests authenticate as the main app with
+X-User-Id, and host requests all come from one creator. CPU is process time (all threads) divided by
+requests. A second table times the JSON parse and response alone, stdlib
+JsonResponse against apps.core.fastjson.
+
+    python manage.py bench_fastlane --requests 5000 --concurrency 64
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+import uuid
+
+import jwt
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+
+from apps.core import fastjson
+from apps.core.benchmarking import summarize
+from apps.core.fastlane import FastLaneWSGIHandler, LANES
+
+PATH = '/api/v1/livestream/generate-token/'
+
+
+def _host():
+    return next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+
+def service_token():
+    return 'Service ' + jwt.encode({'service': 'main_app'}, settings.SECRET_KEY, algorithm='HS256')
+
+
+def make_environ(body, host, authorization='', user_id=''):
+    return {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': PATH,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_X_FORWARDED_PROTO': 'https',
+        'HTTP_AUTHORIZATION': authorization,
+        'HTTP_X_USER_ID': user_id,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'https',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request CPU of generate_token through the full middleware chain vs the fast lane'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Per mode per round')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--role', default='host')
+        parser.add_argument('--json-iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        if not any(PATH.startswith(prefix) for prefix in LANES):
+            raise CommandError(f'No fast lane covers {PATH}; check FAST_LANE_CONFIG')
+
+        handlers = {'full': WSGIHandler(), 'fast lane': FastLaneWSGIHandler()}
+        self.stdout.write(f"full chain: {len(settings.MIDDLEWARE)} middleware, "
+                          f"fast lane: {len(next(m for p, m in LANES.items() if PATH.startswith(p)))}")
+
+        room = f'bench-fl-{uuid.uuid4().hex[:8]}'
+        totals = {mode: {'cpu': 0.0, 'latencies': [], 'elapsed': 0.0, 'errors': 0} for mode in handlers}
+        self.drive(handlers['full'], room, options['role'], 200, options['concurrency'])  # warm up
+        self.drive(handlers['fast lane'], room, options['role'], 200, options['concurrency'])
+        for round_number in range(options['rounds']):
+            for mode, handler in handlers.items():
+                self.stdout.write(f'Round {round_number + 1}: {mode}...')
+                cpu, elapsed, latencies, errors = self.drive(
+                    handler, room, options['role'], options['requests'], options['concurrency'],
+                )
+                totals[mode]['cpu'] += cpu
+                totals[mode]['elapsed'] += elapsed
+                totals[mode]['latencies'] += latencies
+                totals[mode]['errors'] += errors
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"generate_token ({options['role']}), concurrency {options['concurrency']}, "
+            f"{options['requests'] * options['rounds']} requests per mode"
+        )
+        self.stdout.write(f"{'mode':<11}{'CPU/req':>10}{'req/s':>10}{'p50':>10}{'p99':>10}{'errors':>8}")
+        cpu_per_request = {}
+        for mode, t in totals.items():
+            r = summarize(t['latencies'], t['elapsed'], t['errors'])
+            cpu_per_request[mode] = t['cpu'] / max(len(t['latencies']) + t['errors'], 1)
+            self.stdout.write(
+                f"{mode:<11}{cpu_per_request[mode] * 1e6:>8.0f}us{r['rps']:>10.0f}"
+                f"{r['p50_ms']:>8.1f}ms{r['p99_ms']:>8.1f}ms{r['errors']:>8}"
+            )
+        saved = cpu_per_request['full'] - cpu_per_request['fast lane']
+        self.stdout.write(
+            f"fast lane saves {saved * 1e6:.0f}us CPU per request "
+            f"({saved / cpu_per_request['full'] * 100:.0f}%)"
+        )
+
+        self.stdout.write('')
+        self.bench_json(options['json_iterations'])
+
+    def drive(self, handler, room, role, requests, concurrency):
+        host = _host()
+        authorization = service_token()
+        latencies, errors, lock = [], [0], threading.Lock()
+        per_thread = max(requests // concurrency, 1)
+
+        def client(index):
+            local, local_errors = [], 0
+            for i in range(per_thread):
+                # A room has one creator, so every host request is theirs
+                identity = f'{room}-host' if role == 'host' else f'user-{index}-{i}'
+                body = json.dumps({'identity': identity, 'room_name': room, 'role': role}).encode()
+                status = []
+                started = time.perf_counter()
+                environ = make_environ(body, host, authorization, identity)
+                result = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+                b''.join(result)
+                if hasattr(result, 'close'):
+                    result.close()
+                elapsed = time.perf_counter() - started
+                if status and status[0].startswith('200'):
+                    local.append(elapsed)
+                else:
+                    local_errors += 1
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        cpu_started, started = time.process_time(), time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.process_time() - cpu_started, time.perf_counter() - started, latencies, errors[0]
+
+    def bench_json(self, iterations):
+        body = json.dumps({'identity': 'user-12345', 'room_name': 'room-abc', 'role': 'audience'}).encode()
+        payload = {
+            'token': 'x' * 400, 'identity': 'user-12345', 'room_name': 'room-abc', 'role': 'audience',
+            'server_url': 'wss://livekit.example.com',
+            'server_config': {'ws_url': 'wss://livekit.example.com', 'http_url': 'https://livekit.example.com',
+                              'rtc_port': 7881, 'udp_range': '50000-60000'},
+            'expires_in': 86400, 'admission': {'admitted': True, 'seats': 12, 'lease_seconds': 60},
+        }
+        timings = {}
+        for name, parse, respond in (
+            ('JsonResponse', json.loads, JsonResponse),
+            (f'fastjson ({fastjson.BACKEND})', fastjson.loads, fastjson.FastJsonResponse),
+        ):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                parse(body)
+                respond(payload)
+            timings[name] = (time.perf_counter() - started) / iterations
+        self.stdout.write(f'JSON parse + response, {iterations} iterations')
+        for name, seconds in timings.items():
+            self.stdout.write(f'{name:<24}{seconds * 1e6:>8.1f}us')
@@ -0,0 +1,135 @@
+"""
+Compare sync, gevent and ASGI serving modes against a slow upstream.
+
+Each mode is started as a real server process pointed at a local LiveKit
+stand-in that sleeps --upstream-delay seconds per call, then driven with
+--concurrency client threads for --duration seconds.
+
+    python manage.py bench_serving --modes sync,gevent,asgi --upstream-delay 0.2
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarking import StubLiveKit, summarize
+from livestream_project.serving import SERVING_MODES
+
+
+class Command(BaseCommand):
+    help = 'Benchmark req/s and tail latency across sync, gevent and ASGI serving modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(SERVING_MODES))
+        parser.add_argument('--path', default='/api/v1/livestream/rooms/')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument('--upstream-delay', type=float, default=0.2)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        for mode in modes:
+            if mode not in SERVING_MODES:
+                raise CommandError(f'Unknown serving mode: {mode}')
+
+        results = {}
+        with StubLiveKit(delay=options['upstream_delay']) as stub:
+            for mode in modes:
+                self.stdout.write(f'Running {mode}...')
+                results[mode] = self.run_mode(mode, stub.url, options)
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"upstream delay {options['upstream_delay'] * 1000:.0f}ms, "
+            f"concurrency {options['concurrency']}, workers {options['workers']}"
+        )
+        self.stdout.write(f"{'mode':<8}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}")
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<8}{r['rps']:>10.1f}{r['p50_ms']:>9.0f}ms{r['p95_ms']:>8.0f}ms"
+                f"{r['p99_ms']:>8.0f}ms{r['errors']:>8}"
+            )
+
+    def run_mode(self, mode, upstream_url, options):
+        port = options['port']
+        env = dict(
+            os.environ,
+            SERVING_MODE=mode,
+            WEB_CONCURRENCY=str(options['workers']),
+            LIVEKIT_HTTP_URL=upstream_url,
+            SECURE_SSL_REDIRECT='False',
+            DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'livestream_project.settings_production'),
+        )
+
+        if mode == 'asgi':
+            cmd = [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port),
+                   'livestream_project.asgi:application']
+        else:
+            cmd = [sys.executable, '-m', 'gunicorn', '-c', 'livestream_project/gunicorn_conf.py',
+                   '--bind', f'127.0.0.1:{port}', 'livestream_project.wsgi:application']
+
+        proc = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            self.wait_until_ready(base_url, proc)
+            return self.drive(base_url + options['path'], options['concurrency'], options['duration'])
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def wait_until_ready(self, base_url, proc, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f'Server exited with code {proc.returncode}')
+            try:
+                requests.get(f'{base_url}/health/live/', timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise CommandError(f'Server at {base_url} did not become ready')
+
+    def drive(self, url, concurrency, duration):
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.time() + duration
+
+        def client():
+            session = requests.Session()
+            local, local_errors = [], 0
+            while time.time() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = session.get(url, timeout=30)
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    ok = False
+                if ok:
+                    local.append(time.perf_counter() - started)
+                else:
+                    local_errors += 1
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+        started = time.time()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return summarize(latencies, time.time() - started, errors[0])
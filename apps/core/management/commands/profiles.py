@@ -0,0 +1,107 @@
+"""
+List and aggregate request profiles captured by ProfilingMiddleware.
+
+    python manage.py profiles --token                  # X-Profile header value
+    python manage.py profiles                          # per-route summary
+    python manage.py profiles --route livestream.list_participants
+    python manage.py profiles --route health_check --min-ms 200 --aggregate slow.folded
+
+--aggregate sums the stacks of the selected profiles into one collapsed
+file (flamegraph.pl slow.folded > slow.svg, or drop it on speedscope) and
+prints the frames with the most self samples.
+"""
+
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarking import percentile
+from apps.core.profiling import TOKEN_MAX_AGE, get_storage, make_token, parse_name
+
+
+class Command(BaseCommand):
+    help = 'List and aggregate sampled request profiles per route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', action='store_true', help='Print a signed X-Profile header value')
+        parser.add_argument('--route', help='Only profiles of this route')
+        parser.add_argument('--since', help='Only profiles taken at or after this UTC time (e.g. 20250101T0000)')
+        parser.add_argument('--min-ms', type=int, default=0, help='Only profiles at least this slow')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--aggregate', metavar='OUTPUT', help='Write the merged stacks to this file')
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_token())
+            self.stderr.write(f'Valid for {TOKEN_MAX_AGE}s; send it as the X-Profile header')
+            return
+
+        storage, prefix = get_storage()
+        try:
+            routes = [options['route']] if options['route'] else sorted(storage.listdir(prefix)[0])
+        except FileNotFoundError:
+            routes = []
+        selected = {}
+        for route in routes:
+            directory = '/'.join(filter(None, [prefix, route]))
+            try:
+                names = storage.listdir(directory)[1]
+            except FileNotFoundError:
+                raise CommandError(f'No profiles for {route}')
+            for name in names:
+                parsed = parse_name(name)
+                if parsed is None:
+                    continue
+                timestamp, duration_ms, _ = parsed
+                if duration_ms < options['min_ms'] or (options['since'] and timestamp < options['since']):
+                    continue
+                selected.setdefault(route, []).append((f'{directory}/{name}', *parsed))
+
+        if not selected:
+            self.stdout.write('No profiles match')
+            return
+        if options['aggregate']:
+            self.aggregate(storage, selected, options)
+        elif options['route']:
+            self.list_profiles(selected[options['route']], options['limit'])
+        else:
+            self.summarize_routes(selected)
+
+    def summarize_routes(self, selected):
+        self.stdout.write(f"{'route':40} {'profiles':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  latest")
+        for route, profiles in sorted(selected.items(), key=lambda item: -len(item[1])):
+            durations = sorted(duration for _, _, duration, _ in profiles)
+            latest = max(timestamp for _, timestamp, _, _ in profiles)
+            self.stdout.write(
+                f'{route:40} {len(profiles):>8} {percentile(durations, 50):>8.0f} '
+                f'{percentile(durations, 95):>8.0f} {durations[-1]:>8}  {latest}'
+            )
+
+    def list_profiles(self, profiles, limit):
+        for path, timestamp, duration_ms, profile_id in sorted(profiles, key=lambda p: p[1], reverse=True)[:limit]:
+            self.stdout.write(f'{timestamp}  {duration_ms:>7}ms  {profile_id}  {path}')
+
+    def aggregate(self, storage, selected, options):
+        stacks = Counter()
+        count = 0
+        for profiles in selected.values():
+            for path, *_ in profiles:
+                with storage.open(path) as f:
+                    for line in f.read().decode().splitlines():
+                        stack, _, samples = line.rpartition(' ')
+                        if stack:
+                            stacks[stack] += int(samples)
+                count += 1
+
+        with open(options['aggregate'], 'w') as f:
+            for stack, samples in stacks.most_common():
+                f.write(f'{stack} {samples}\n')
+
+        total = sum(stacks.values())
+        self_samples = Counter()
+        for stack, samples in stacks.items():
+            self_samples[stack.rsplit(';', 1)[-1]] += samples
+        self.stdout.write(f"Merged {count} profiles ({total} samples) into {options['aggregate']}")
+        self.stdout.write(f"{'self %':>7}  frame")
+        for frame, samples in self_samples.most_common(options['top']):
+            self.stdout.write(f'{samples / total:>7.1%}  {frame}')
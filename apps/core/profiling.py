@@ -0,0 +1,184 @@
+"""
+Opt-in sampling profiler for production requests.
+
+A request is profiled when it carries a valid signed `X-Profile` header
+(`python manage.py profiles --token`) or is picked by SAMPLE_RATE. While
+the view runs, a background thread reads the request thread's stack from
+sys._current_frames() every INTERVAL seconds; nothing is traced, so the
+request itself runs at full speed. The samples are written in the
+collapsed-stack format read by flamegraph.pl and speedscope:
+
+    livestream_project.wsgi:...;apps.livestream.views:list_participants;... 42
+
+under <route>/<timestamp>_<latency>ms_<id>.folded, to PROFILING_CONFIG
+['LOCAL_PATH'] or, with STORAGE = 'media', to the default file storage
+(MediaStorage on S3). `manage.py profiles` lists and aggregates them.
+
+With SAMPLE_RATE at 0 and header profiling off, the middleware removes
+itself from the stack at startup. Only the thread that runs the view is
+sampled, so async views served under ASGI show up as the event loop.
+Under SERVING_MODE=gevent it removes itself too: the request is a
+greenlet that sys._current_frames() doesn't list, and the sampler would
+be a greenlet that can't run while the request holds the CPU, so every
+profile would come out empty.
+"""
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+
+from livestream_project.serving import is_gevent
+
+logger = logging.getLogger(__name__)
+
+PROFILING_CONFIG = getattr(settings, 'PROFILING_CONFIG', {})
+SAMPLE_RATE = PROFILING_CONFIG.get('SAMPLE_RATE', 0.0)
+HEADER_ENABLED = PROFILING_CONFIG.get('HEADER_ENABLED', True)
+INTERVAL = PROFILING_CONFIG.get('INTERVAL', 0.005)
+# Sampled requests faster than this aren't worth keeping (header requests always are)
+MIN_DURATION_MS = PROFILING_CONFIG.get('MIN_DURATION_MS', 0)
+TOKEN_MAX_AGE = PROFILING_CONFIG.get('TOKEN_MAX_AGE', 60 * 60)
+STORAGE = PROFILING_CONFIG.get('STORAGE', 'local')
+LOCAL_PATH = PROFILING_CONFIG.get('LOCAL_PATH') or os.path.join(settings.BASE_DIR, 'profiles')
+
+HEADER = 'X-Profile'
+SALT = 'apps.core.profiling'
+MEDIA_PREFIX = 'profiles'
+
+
+def make_token():
+    """Value for the X-Profile header, valid for TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(value, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def get_storage():
+    if STORAGE == 'media':
+        return default_storage, MEDIA_PREFIX
+    return FileSystemStorage(location=LOCAL_PATH), ''
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Counts the stacks of one thread, sampled from a daemon thread"""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return (match.view_name or match.url_name or 'unnamed').replace(':', '.')
+
+
+def save_profile(stacks, route, duration_ms):
+    storage, prefix = get_storage()
+    profile_id = uuid.uuid4().hex[:12]
+    name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{int(duration_ms)}ms_{profile_id}.folded"
+    content = ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    storage.save('/'.join(filter(None, [prefix, route, name])), ContentFile(content.encode()))
+    return profile_id
+
+
+def parse_name(name):
+    """(timestamp, duration_ms, profile_id) from a profile's file name, or None"""
+    if not name.endswith('.folded'):
+        return None
+    try:
+        timestamp, duration, profile_id = name[:-len('.folded')].split('_')
+        return timestamp, int(duration[:-len('ms')]), profile_id
+    except ValueError:
+        return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not SAMPLE_RATE and not HEADER_ENABLED:
+            raise MiddlewareNotUsed
+        if is_gevent():
+            logger.warning("Request profiling is unavailable under gevent workers; disabled")
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def _wanted(self, request):
+        value = request.headers.get(HEADER) if HEADER_ENABLED else None
+        if value:
+            return 'header' if valid_token(value) else None
+        if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        reason = self._wanted(request)
+        if reason is None:
+            return self.get_response(request)
+
+        sampler = Sampler(threading.get_ident()).start()
+        started = time.monotonic()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        duration_ms = (time.monotonic() - started) * 1000
+
+        if reason == 'sampled' and duration_ms < MIN_DURATION_MS:
+            return response
+        route = route_name(request)
+        try:
+            profile_id = save_profile(stacks, route, duration_ms)
+        except Exception as e:
+            logger.warning(f"Could not save profile of {route}: {e}")
+            return response
+        logger.info(f"Profiled {route} ({reason}): {duration_ms:.1f}ms, {sum(stacks.values())} samples, id {profile_id}")
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,38 @@
+"""
+Signal receivers, connected in CoreConfig.ready().
+"""
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+
+from . import tracing
+
+# task id -> (span, context token) while the task runs
+_task_spans = {}
+
+
+@before_task_publish.connect
+def inject_trace_context(headers=None, **kwargs):
+    if headers is not None:
+        tracing.inject(headers)
+
+
+@task_prerun.connect
+def start_task_trace(task_id=None, task=None, **kwargs):
+    if not tracing.ENABLED:
+        return
+    span, token = tracing.start_trace(
+        task.name, kind='consumer', traceparent=task.request.get(tracing.TRACEPARENT),
+        **{'celery.task_id': task_id, 'celery.retries': task.request.retries},
+    )
+    _task_spans[task_id] = (span, token)
+
+
+@task_postrun.connect
+def end_task_trace(task_id=None, state=None, **kwargs):
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    span.set('celery.state', state)
+    if state == 'FAILURE':
+        span.status = 'error'
+    tracing.end_trace(span, token)
@@ -0,0 +1,41 @@
+"""
+Direct Redis access for data structures the cache API can't express
+(sorted sets, streams, pub/sub, Lua scripts).
+
+Uses the connection pool of CACHES['default'] so the service keeps a
+single pool per process.
+"""
+
+from django_redis import get_redis_connection
+
+KEY_PREFIX = 'livestream'
+
+_scripts = {}
+
+
+def get_redis(alias='default'):
+    """Raw redis-py client for the given cache alias"""
+    return get_redis_connection(alias)
+
+
+def make_key(*parts):
+    """Namespaced Redis key, e.g. make_key('dir', 'room', name)"""
+    return ':'.join([KEY_PREFIX, *(str(p) for p in parts)])
+
+
+def get_script(source):
+    """Registered Lua script, cached per process so its SHA is computed once"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis().register_script(source)
+    return script
+
+
+def decode(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def decode_hash(mapping):
+    return {decode(k): decode(v) for k, v in mapping.items()}
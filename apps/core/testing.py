@@ -0,0 +1,32 @@
+"""
+Test helpers for code built on apps.core.redis_client.
+
+RedisTestCase points get_redis() at a fresh in-process fakeredis server
+(with Lua, via lupa) for each test, so the scripts run for real without a
+Redis to talk to. Tests using it are skipped where fakeredis isn't
+installed.
+"""
+
+import unittest
+from unittest import mock
+from django.test import SimpleTestCase
+
+from . import redis_client
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        patcher = mock.patch.object(redis_client, 'get_redis_connection', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Registered scripts are bound to the client that registered them
+        redis_client._scripts.clear()
+        self.addCleanup(redis_client._scripts.clear)
@@ -1,3 +1,99 @@
-from django.test import TestCase
+import json
+import threading
+from unittest import mock
+from django.http import JsonResponse
+from django.test import RequestFactory
 
-# Create your tests here.
+from . import idempotency
+from .testing import RedisTestCase
+
+
+class IdempotencyTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.calls = []
+        self.status = 201
+
+        def create_thing(request):
+            self.calls.append(request.body)
+            return JsonResponse({'n': len(self.calls)}, status=self.status)
+
+        self.view = idempotency.idempotent(create_thing)
+
+    def request(self, body=None, key='key-1', **headers):
+        if key:
+            headers['HTTP_IDEMPOTENCY_KEY'] = key
+        return self.factory.post('/things/', json.dumps(body or {'a': 1}), content_type='application/json', **headers)
+
+    def post(self, body=None, key='key-1', **headers):
+        return self.view(self.request(body, key, **headers))
+
+    def hold_key(self):
+        """Mark key-1 as claimed by a request still running; returns its record key and fingerprint"""
+        request = self.request()
+        record_key = idempotency._record_key('create_thing', idempotency._caller(request), 'key-1')
+        fp = idempotency.fingerprint(request)
+        self.redis.set(record_key, json.dumps({'state': 'running', 'fingerprint': fp}))
+        return record_key, fp
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(HTTP_AUTHORIZATION='Bearer a')
+        retry = self.post(HTTP_AUTHORIZATION='Bearer a')
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+
+    def test_key_reused_for_another_body_is_rejected(self):
+        self.post({'a': 1})
+        response = self.post({'a': 2})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_keys_are_scoped_to_the_caller(self):
+        self.post(HTTP_AUTHORIZATION='Bearer a')
+        other = self.post(HTTP_AUTHORIZATION='Bearer b')
+        other_user = self.post(HTTP_AUTHORIZATION='Bearer a', HTTP_X_USER_ID='7')
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertNotIn('Idempotent-Replayed', other)
+        self.assertNotIn('Idempotent-Replayed', other_user)
+
+    def test_server_errors_are_not_stored(self):
+        self.status = 500
+        self.post()
+        self.status = 201
+        retry = self.post()
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(retry.status_code, 201)
+
+    def test_requests_without_a_key_always_run(self):
+        self.post(key=None)
+        self.post(key=None)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_duplicate_waits_for_the_running_request(self):
+        record_key, fp = self.hold_key()
+        stored = idempotency._store(JsonResponse({'n': 'first'}, status=201), fp)
+        finish = threading.Timer(0.1, self.redis.set, args=(record_key, stored))
+        finish.start()
+        self.addCleanup(finish.cancel)
+        response = self.post()
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(json.loads(response.content), {'n': 'first'})
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_duplicate_gives_up_after_wait_timeout(self):
+        self.hold_key()
+        with mock.patch.object(idempotency, 'WAIT_TIMEOUT', 0.1):
+            response = self.post()
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Retry-After', response)
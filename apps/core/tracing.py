@@ -0,0 +1,396 @@
+"""
+Request-scoped tracing across views, Celery tasks and upstream calls.
+
+A trace starts at TracingMiddleware (one span per request, named after the
+view) or at a Celery task, and is carried in a contextvar. Spans are opened
+around MainAppClient methods and LiveKit Twirp calls with @traced /
+start_span(), and around every Redis command and SQL query by the hooks
+that instrument() installs. Context crosses process boundaries as a W3C
+`traceparent` header: read from incoming requests, added to outgoing
+main-app and LiveKit requests by inject(), and sent with Celery messages.
+
+Sampling is decided once per trace: SAMPLE_RATE of new traces (or the
+caller's sampled flag from traceparent), capped at MAX_TRACES_PER_SECOND
+per process. Outside a sampled trace, start_span() hands back a shared
+no-op span, so unsampled requests pay a contextvar lookup per call site.
+
+Finished traces are handed to a background thread that calls the
+exporter (TRACING_CONFIG['EXPORTER'], any class with export(spans)). The
+queue is bounded and drops traces when full, so a slow exporter never
+holds up requests. JsonFileExporter writes one JSON span per line for
+offline use.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TRACING_CONFIG = getattr(settings, 'TRACING_CONFIG', {})
+ENABLED = TRACING_CONFIG.get('ENABLED', False)
+SAMPLE_RATE = TRACING_CONFIG.get('SAMPLE_RATE', 0.01)
+MAX_TRACES_PER_SECOND = TRACING_CONFIG.get('MAX_TRACES_PER_SECOND', 10)
+# Spans kept per trace; a request issuing thousands of Redis calls stops recording past this
+MAX_SPANS_PER_TRACE = TRACING_CONFIG.get('MAX_SPANS_PER_TRACE', 500)
+EXPORTER = TRACING_CONFIG.get('EXPORTER', 'apps.core.tracing.JsonFileExporter')
+EXPORTER_OPTIONS = TRACING_CONFIG.get('EXPORTER_OPTIONS', {})
+QUEUE_SIZE = TRACING_CONFIG.get('QUEUE_SIZE', 1000)
+SERVICE_NAME = TRACING_CONFIG.get('SERVICE_NAME', 'livestream_service')
+
+TRACEPARENT = 'traceparent'
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class Trace:
+    __slots__ = ('trace_id', 'spans', 'dropped')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped = 0
+
+
+class Span:
+    sampled = True
+
+    def __init__(self, trace, name, kind, parent_id, attributes):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.status = 'ok'
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = 'error'
+        self.attributes['error'] = f'{type(error).__name__}: {error}'
+
+    def finish(self, keep=False):
+        """Record the span on its trace; past MAX_SPANS_PER_TRACE only if `keep` (the root)"""
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        if keep or len(self.trace.spans) < MAX_SPANS_PER_TRACE:
+            self.trace.spans.append(self.to_dict())
+        else:
+            self.trace.dropped += 1
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'service': SERVICE_NAME,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    sampled = False
+    trace_id = span_id = None
+
+    def set(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class _Budget:
+    """Token bucket capping how many traces per second are recorded"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_budget = _Budget(MAX_TRACES_PER_SECOND)
+
+
+def current_span():
+    return _current.get() or NOOP
+
+
+def parse_traceparent(value):
+    """(trace_id, parent_span_id, sampled) from a traceparent header, or None"""
+    try:
+        version, trace_id, span_id, flags = value.strip().split('-')
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or version == 'ff':
+        return None
+    return trace_id, span_id, sampled
+
+
+def inject(headers):
+    """Add the current context as a traceparent header (in place)"""
+    span = _current.get()
+    if span is not None:
+        headers[TRACEPARENT] = f'00-{span.trace_id}-{span.span_id}-01'
+    return headers
+
+
+def start_trace(name, kind='server', traceparent=None, **attributes):
+    """
+    Open the root span of a trace (or continue the caller's). Returns the
+    span, or NOOP when the trace isn't sampled, and a token for end_trace().
+    """
+    if not ENABLED:
+        return NOOP, None
+    parent = parse_traceparent(traceparent) if traceparent else None
+    sampled = parent[2] if parent else random.random() < SAMPLE_RATE
+    if not sampled or not _budget.take():
+        return NOOP, _current.set(None)
+    trace = Trace(parent[0] if parent else os.urandom(16).hex())
+    span = Span(trace, name, kind, parent[1] if parent else None, attributes)
+    return span, _current.set(span)
+
+
+def end_trace(span, token):
+    if token is not None:
+        _current.reset(token)
+    if not span.sampled:
+        return
+    # The root finishes last, so it's always kept even when the trace is full
+    span.finish(keep=True)
+    trace = span.trace
+    if trace.dropped:
+        trace.spans[-1]['attributes']['dropped_spans'] = trace.dropped
+    _export(trace.spans)
+
+
+class start_span:
+    """
+    Context manager for a child span of the current one; a no-op outside a
+    sampled trace:
+
+        with start_span('escrow.reserve', user_id=user_id) as span:
+            ...
+    """
+
+    __slots__ = ('name', 'kind', 'attributes', 'span', 'token')
+
+    def __init__(self, name, kind='internal', **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            self.span, self.token = NOOP, None
+            return NOOP
+        self.span = Span(parent.trace, self.name, self.kind, parent.span_id, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is None:
+            return False
+        _current.reset(self.token)
+        if exc is not None:
+            self.span.record_error(exc)
+        self.span.finish()
+        return False
+
+
+def traced(name, kind='client'):
+    """Decorator running the function inside a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with start_span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Export
+
+class JsonFileExporter:
+    """One JSON object per span per line, appended to `path`"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(settings.BASE_DIR, 'traces.jsonl')
+
+    def export(self, spans):
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + '\n')
+
+
+class LoggingExporter:
+    """Spans as INFO records on the apps.core.tracing logger"""
+
+    def export(self, spans):
+        for span in spans:
+            logger.info(json.dumps(span, default=str))
+
+
+_exporter = None
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = import_string(EXPORTER)(**EXPORTER_OPTIONS)
+    return _exporter
+
+
+def _export_loop():
+    while True:
+        spans = _queue.get()
+        try:
+            get_exporter().export(spans)
+        except Exception as e:
+            logger.warning(f"Trace export failed: {e}")
+
+
+def _export(spans):
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_export_loop, name='trace-exporter', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(spans)
+    except queue.Full:
+        pass
+
+
+def flush(timeout=5):
+    """Wait for queued traces to be exported (for commands and tests)"""
+    deadline = time.monotonic() + timeout
+    while not _queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+# Instrumentation
+
+class TracingMiddleware:
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        span, token = start_trace(
+            f'{request.method} {request.path}', traceparent=request.headers.get(TRACEPARENT),
+            **{'http.method': request.method, 'http.target': request.path},
+        )
+        if not span.sampled:
+            try:
+                return self.get_response(request)
+            finally:
+                _current.reset(token)
+        try:
+            response = self.get_response(request)
+        except Exception as e:
+            span.record_error(e)
+            raise
+        else:
+            # Views report failures as 500 responses rather than raising
+            span.set('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = 'error'
+            response['X-Trace-Id'] = span.trace_id
+            return response
+        finally:
+            match = getattr(request, 'resolver_match', None)
+            if match is not None:
+                span.name = match.view_name or span.name
+                span.set('http.route', match.route)
+            end_trace(span, token)
+
+
+def _redis_command(execute_command):
+    @functools.wraps(execute_command)
+    def wrapper(self, *args, **options):
+        if _current.get() is None:
+            return execute_command(self, *args, **options)
+        with start_span(f'redis.{args[0]}', 'client'):
+            return execute_command(self, *args, **options)
+    return wrapper
+
+
+def _redis_pipeline(execute):
+    @functools.wraps(execute)
+    def wrapper(self, *args, **kwargs):
+        if _current.get() is None:
+            return execute(self, *args, **kwargs)
+        with start_span('redis.pipeline', 'client', commands=len(self.command_stack)):
+            return execute(self, *args, **kwargs)
+    return wrapper
+
+
+def _db_query(execute, sql, params, many, context):
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    with start_span('db.query', 'client', statement=sql[:200], many=many):
+        return execute(sql, params, many, context)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    if _db_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_query)
+
+
+def instrument():
+    """Hook Redis commands and SQL queries into the current trace (once, from CoreConfig.ready)"""
+    from django.db.backends.signals import connection_created
+    from redis.client import Pipeline, Redis
+
+    if getattr(Redis.execute_command, '_traced', False):
+        return
+    Redis.execute_command = _redis_command(Redis.execute_command)
+    Redis.execute_command._traced = True
+    Pipeline.execute = _redis_pipeline(Pipeline.execute)
+    connection_created.connect(_on_connection_created, dispatch_uid='apps.core.tracing')
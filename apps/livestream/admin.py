@@ -1,3 +1,39 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GiftLeaderboard, GiftLeaderboardEntry, ModerationList, ScheduledShow
+
+
+@admin.register(ModerationList)
+class ModerationListAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'block_links', 'version', 'updated_at')
+    search_fields = ('owner',)
+    readonly_fields = ('version', 'updated_at')
+
+
+class GiftLeaderboardEntryInline(admin.TabularInline):
+    model = GiftLeaderboardEntry
+    extra = 0
+    readonly_fields = ('rank', 'user_id', 'coins', 'gift_count')
+    can_delete = False
+
+
+@admin.register(GiftLeaderboard)
+class GiftLeaderboardAdmin(admin.ModelAdmin):
+    list_display = ('room', 'creator', 'finished_at', 'total_coins', 'gift_count')
+    search_fields = ('room', 'creator')
+    list_filter = ('finished_at',)
+    inlines = [GiftLeaderboardEntryInline]
+
+
+@admin.register(ScheduledShow)
+class ScheduledShowAdmin(admin.ModelAdmin):
+    list_display = ('room_name', 'creator_id', 'title', 'starts_at', 'expected_viewers', 'status', 'metadata_synced')
+    search_fields = ('room_name', 'creator_id', 'title')
+    list_filter = ('status', 'starts_at')
+    readonly_fields = ('status', 'metadata_synced', 'attempts', 'sync_attempts', 'error', 'prewarmed_at',
+                       'created_at', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.mark_edited(rescheduled='starts_at' in form.changed_data)
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,188 @@
+"""
+Capacity-aware admission of viewers at token issuance.
+
+Every admitted viewer holds a lease in two sorted sets, scored by expiry:
+
+    adm:room:<room>      identity -> lease expiry
+    adm:node:<node>      <room>|<identity> -> lease expiry
+    adm:queue:<room>     identity -> time they started waiting
+    adm:seen:<room>      identity -> last time a waiting viewer polled
+    adm:nodes            hash room -> LiveKit node hosting it
+
+A lease lasts JOIN_TTL, so tokens that are never used free their seat
+quickly. participant_joined stretches it to SESSION_TTL and
+participant_left or room_finished drops it. Admission checks both the
+room's and the node's limits and takes the seat in one Lua call, so
+concurrent token requests can't overshoot either.
+
+Viewers who don't fit are sent to the HLS fallback when
+HLS_FALLBACK_URL is set, otherwise they join a FIFO queue. Polling the
+queue re-runs admission, so the head of the queue gets a token as soon as
+seats free up. Waiting viewers who stop polling for QUEUE_TTL lose their
+place.
+"""
+
+import time
+from django.conf import settings
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+ADMISSION_CONFIG = getattr(settings, 'ADMISSION_CONFIG', {})
+ROOM_LIMIT = ADMISSION_CONFIG.get('ROOM_LIMIT', 1000)
+NODE_LIMIT = ADMISSION_CONFIG.get('NODE_LIMIT', 5000)
+JOIN_TTL = ADMISSION_CONFIG.get('JOIN_TTL', 60)
+SESSION_TTL = ADMISSION_CONFIG.get('SESSION_TTL', 6 * 60 * 60)
+QUEUE_TTL = ADMISSION_CONFIG.get('QUEUE_TTL', 30)
+POLL_INTERVAL = ADMISSION_CONFIG.get('POLL_INTERVAL', 5)
+# e.g. 'https://cdn.example.com/live/{room_name}/index.m3u8'; blank queues instead
+HLS_FALLBACK_URL = ADMISSION_CONFIG.get('HLS_FALLBACK_URL', '')
+
+DEFAULT_NODE = 'default'
+NODES_KEY = make_key('adm', 'nodes')
+
+# KEYS room, node, queue, seen
+# ARGV now, identity, node member, lease expiry, room limit, node limit, queue (1/0), queue cutoff
+# Returns {1, seats taken} when admitted, {0, queue position or 0}
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local gone = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', ARGV[8])
+if #gone > 0 then
+    redis.call('ZREM', KEYS[3], unpack(gone))
+    redis.call('ZREM', KEYS[4], unpack(gone))
+end
+
+local current = redis.call('ZSCORE', KEYS[1], ARGV[2])
+if current then
+    local expiry = math.max(tonumber(current), tonumber(ARGV[4]))
+    redis.call('ZADD', KEYS[1], expiry, ARGV[2])
+    redis.call('ZADD', KEYS[2], expiry, ARGV[3])
+    return {1, redis.call('ZCARD', KEYS[1])}
+end
+
+local free = math.min(tonumber(ARGV[5]) - redis.call('ZCARD', KEYS[1]),
+                      tonumber(ARGV[6]) - redis.call('ZCARD', KEYS[2]))
+if free > 0 then
+    local rank = redis.call('ZRANK', KEYS[3], ARGV[2])
+    -- Seats go to the head of the queue first
+    if redis.call('ZCARD', KEYS[3]) == 0 or (rank and rank < free) then
+        redis.call('ZREM', KEYS[3], ARGV[2])
+        redis.call('ZREM', KEYS[4], ARGV[2])
+        redis.call('ZADD', KEYS[1], ARGV[4], ARGV[2])
+        redis.call('ZADD', KEYS[2], ARGV[4], ARGV[3])
+        return {1, redis.call('ZCARD', KEYS[1])}
+    end
+end
+
+if ARGV[7] ~= '1' then
+    return {0, 0}
+end
+redis.call('ZADD', KEYS[3], 'NX', now, ARGV[2])
+redis.call('ZADD', KEYS[4], now, ARGV[2])
+return {0, redis.call('ZRANK', KEYS[3], ARGV[2]) + 1}
+"""
+
+# KEYS room, node; ARGV identity, node member, expiry
+JOINED_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+return 1
+"""
+
+
+def _room_key(room_name):
+    return make_key('adm', 'room', room_name)
+
+
+def _node_key(node):
+    return make_key('adm', 'node', node)
+
+
+def _queue_keys(room_name):
+    return make_key('adm', 'queue', room_name), make_key('adm', 'seen', room_name)
+
+
+def _member(room_name, identity):
+    return f'{room_name}|{identity}'
+
+
+def room_node(room_name):
+    return decode(get_redis().hget(NODES_KEY, room_name)) or DEFAULT_NODE
+
+
+def record_room_nodes(mapping):
+    """
+    Remember which LiveKit node hosts each room (fed by the reaper's
+    listing), moving seats already counted against another node.
+    """
+    r = get_redis()
+    known = dict(zip(mapping, r.hmget(NODES_KEY, list(mapping)))) if mapping else {}
+    for room_name, node in mapping.items():
+        previous = decode(known.get(room_name)) or DEFAULT_NODE
+        if previous == node:
+            continue
+        seats = r.zrange(_room_key(room_name), 0, -1, withscores=True)
+        pipe = r.pipeline()
+        if seats:
+            members = {_member(room_name, decode(identity)): expiry for identity, expiry in seats}
+            pipe.zrem(_node_key(previous), *members)
+            pipe.zadd(_node_key(node), members)
+        pipe.hset(NODES_KEY, room_name, node)
+        pipe.execute()
+
+
+def fallback_url(room_name):
+    return HLS_FALLBACK_URL.format(room_name=room_name) if HLS_FALLBACK_URL else None
+
+
+def admit(room_name, identity, now=None):
+    """
+    Try to seat a viewer. Returns a dict with `admitted`, and when not
+    admitted either `hls_url` or the viewer's 1-based queue `position`.
+    """
+    now = now or time.time()
+    node = room_node(room_name)
+    hls_url = fallback_url(room_name)
+    queue_key, seen_key = _queue_keys(room_name)
+    admitted, value = get_script(ADMIT_SCRIPT)(
+        keys=[_room_key(room_name), _node_key(node), queue_key, seen_key],
+        args=[now, identity, _member(room_name, identity), now + JOIN_TTL,
+              ROOM_LIMIT, NODE_LIMIT, 0 if hls_url else 1, now - QUEUE_TTL],
+    )
+    if admitted:
+        return {'admitted': True, 'viewers': value, 'lease_seconds': JOIN_TTL, 'node': node}
+    if hls_url:
+        return {'admitted': False, 'hls_url': hls_url}
+    return {'admitted': False, 'position': value, 'poll_interval': POLL_INTERVAL}
+
+
+def joined(room_name, identity, now=None):
+    """The viewer connected: hold the seat for the session"""
+    get_script(JOINED_SCRIPT)(
+        keys=[_room_key(room_name), _node_key(room_node(room_name))],
+        args=[identity, _member(room_name, identity), (now or time.time()) + SESSION_TTL],
+    )
+
+
+def release(room_name, identity):
+    """Give up a seat or a place in the queue"""
+    queue_key, seen_key = _queue_keys(room_name)
+    pipe = get_redis().pipeline()
+    pipe.zrem(_room_key(room_name), identity)
+    pipe.zrem(_node_key(room_node(room_name)), _member(room_name, identity))
+    pipe.zrem(queue_key, identity)
+    pipe.zrem(seen_key, identity)
+    pipe.execute()
+
+
+def close_room(room_name):
+    r = get_redis()
+    node = room_node(room_name)
+    identities = [decode(i) for i in r.zrange(_room_key(room_name), 0, -1)]
+    pipe = r.pipeline()
+    if identities:
+        pipe.zrem(_node_key(node), *[_member(room_name, i) for i in identities])
+    pipe.delete(_room_key(room_name), *_queue_keys(room_name))
+    pipe.hdel(NODES_KEY, room_name)
+    pipe.execute()
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LivestreamConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.livestream"
+
+    def ready(self):
+        from . import receivers  # noqa: F401
@@ -0,0 +1,220 @@
+"""
+Per-room chat history.
+
+Recent messages live in a Redis Stream per room, so late joiners get the
+last N messages with a single XREVRANGE and no database query. The
+archiver task copies new entries into ChatMessage in large batches and
+then trims whatever is older than RETENTION from the stream, never past
+what it has archived. Appends cap the stream at MAX_LENGTH entries, but
+only by dropping archived ones (at most TRIM_BATCH per append); a stream
+that is over the cap because the rest isn't archived yet gets an archive
+run of its own without waiting for the next beat. Scroll-back reads the
+stream first and only falls through to Postgres once the cursor is older
+than the stream's first entry.
+
+Cursors are stream entry IDs ("<ms>-<seq>") in both tiers.
+"""
+
+import time
+from django.conf import settings
+from django.db.models import Q
+
+from apps.core.redis_client import decode, decode_hash, get_redis, get_script, make_key
+
+from .models import ChatMessage
+
+CHAT_CONFIG = getattr(settings, 'CHAT_CONFIG', {})
+MAX_LENGTH = CHAT_CONFIG.get('MAX_LENGTH', 5000)
+TRIM_BATCH = CHAT_CONFIG.get('TRIM_BATCH', 100)
+ARCHIVE_LOCK_TTL = CHAT_CONFIG.get('ARCHIVE_LOCK_TTL', 5 * 60)
+RETENTION = CHAT_CONFIG.get('RETENTION', 60 * 60)
+ARCHIVE_BATCH_SIZE = CHAT_CONFIG.get('ARCHIVE_BATCH_SIZE', 5000)
+MAX_MESSAGE_LENGTH = CHAT_CONFIG.get('MAX_MESSAGE_LENGTH', 500)
+PAGE_SIZE = CHAT_CONFIG.get('PAGE_SIZE', 50)
+MAX_PAGE_SIZE = CHAT_CONFIG.get('MAX_PAGE_SIZE', 200)
+
+ROOMS_KEY = make_key('chat', 'rooms')
+
+# KEYS stream, rooms set, watermark; ARGV room name, max length, trim batch, identity, name, text
+# Returns {entry id, stream length}
+APPEND_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], '*', 'u', ARGV[4], 'n', ARGV[5], 't', ARGV[6])
+redis.call('SADD', KEYS[2], ARGV[1])
+local length = redis.call('XLEN', KEYS[1])
+local excess = length - tonumber(ARGV[2])
+if excess > 0 then
+    local watermark = redis.call('GET', KEYS[3])
+    if watermark then
+        -- Only entries the archiver has already written may go
+        local archived = redis.call('XRANGE', KEYS[1], '-', watermark, 'COUNT', math.min(excess, tonumber(ARGV[3])))
+        if #archived > 0 then
+            local ms, seq = string.match(archived[#archived][1], '^(%d+)-(%d+)$')
+            redis.call('XTRIM', KEYS[1], 'MINID', ms .. '-' .. (tonumber(seq) + 1))
+            length = length - #archived
+        end
+    end
+end
+return {id, length}
+"""
+
+# KEYS stream, rooms set, watermark; ARGV room name
+FORGET_IF_EMPTY_SCRIPT = """
+if redis.call('XLEN', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[1])
+    redis.call('DEL', KEYS[1], KEYS[3])
+    return 1
+end
+return 0
+"""
+
+
+def stream_key(room_name):
+    return make_key('chat', room_name)
+
+
+def _watermark_key(room_name):
+    return make_key('chat', room_name, 'archived')
+
+
+def parse_id(message_id):
+    """'<ms>-<seq>' -> (ms, seq); raises ValueError on bad input"""
+    ms, _, seq = str(message_id).partition('-')
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        raise ValueError(f'invalid message id: {message_id}')
+
+
+def _from_entry(entry_id, fields):
+    fields = decode_hash(fields)
+    return {
+        'id': decode(entry_id),
+        'identity': fields.get('u'),
+        'name': fields.get('n', ''),
+        'text': fields.get('t', ''),
+    }
+
+
+def _from_model(message):
+    return {
+        'id': message.message_id,
+        'identity': message.identity,
+        'name': message.name,
+        'text': message.text,
+    }
+
+
+def _archive_lock_key(room_name):
+    return make_key('chat', room_name, 'archiving')
+
+
+def append(room_name, identity, text, name=''):
+    """
+    Store a message. Returns (message with its stream ID, archive_due);
+    archive_due is True for one caller while the stream is over MAX_LENGTH
+    with too little archived to trim, which should queue archive_room.
+    """
+    r = get_redis()
+    entry_id, length = get_script(APPEND_SCRIPT)(
+        keys=[stream_key(room_name), ROOMS_KEY, _watermark_key(room_name)],
+        args=[room_name, MAX_LENGTH, TRIM_BATCH, identity, name or '', text],
+    )
+    message = {'id': decode(entry_id), 'identity': identity, 'name': name or '', 'text': text}
+
+    archive_due = False
+    if length > MAX_LENGTH:
+        # Only one caller queues it; the run itself holds the room's archive lock
+        archive_due = bool(r.set(make_key('chat', room_name, 'archive_queued'), 1, nx=True, ex=30))
+    return message, archive_due
+
+
+def history(room_name, before=None, limit=None):
+    """
+    Messages older than `before` (newest first), or the latest ones.
+    Returns (messages, next_cursor); next_cursor is None when exhausted.
+    """
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+    if before is not None:
+        parse_id(before)
+
+    r = get_redis()
+    upper = f'({before}' if before else '+'
+    entries = r.xrevrange(stream_key(room_name), max=upper, min='-', count=limit)
+    messages = [_from_entry(entry_id, fields) for entry_id, fields in entries]
+
+    if len(messages) < limit:
+        # Stream exhausted; continue from the archive
+        cursor = messages[-1]['id'] if messages else before
+        messages.extend(_archived_before(room_name, cursor, limit - len(messages)))
+
+    next_cursor = messages[-1]['id'] if len(messages) == limit else None
+    return messages, next_cursor
+
+
+def _archived_before(room_name, before, limit):
+    queryset = ChatMessage.objects.filter(room=room_name)
+    if before:
+        ms, seq = parse_id(before)
+        queryset = queryset.filter(Q(sent_at_ms__lt=ms) | Q(sent_at_ms=ms, seq__lt=seq))
+    return [_from_model(m) for m in queryset.order_by('-sent_at_ms', '-seq')[:limit]]
+
+
+def rooms_with_history():
+    return [decode(room) for room in get_redis().smembers(ROOMS_KEY)]
+
+
+def archive_room(room_name):
+    """
+    Copy unarchived stream entries to Postgres in batches, then trim the
+    stream to RETENTION without dropping anything not yet archived.
+    Returns the number of messages archived, or None if another run holds
+    the room.
+    """
+    r = get_redis()
+    lock = _archive_lock_key(room_name)
+    if not r.set(lock, 1, nx=True, ex=ARCHIVE_LOCK_TTL):
+        return None
+    try:
+        return _archive_room(r, room_name)
+    finally:
+        r.delete(lock)
+
+
+def _archive_room(r, room_name):
+    key = stream_key(room_name)
+    watermark = decode(r.get(_watermark_key(room_name)))
+    archived = 0
+
+    while True:
+        start = f'({watermark}' if watermark else '-'
+        entries = r.xrange(key, min=start, max='+', count=ARCHIVE_BATCH_SIZE)
+        if not entries:
+            break
+
+        rows = []
+        for entry_id, fields in entries:
+            message = _from_entry(entry_id, fields)
+            ms, seq = parse_id(message['id'])
+            rows.append(ChatMessage(
+                room=room_name, sent_at_ms=ms, seq=seq,
+                identity=message['identity'] or '', name=message['name'], text=message['text'],
+            ))
+        ChatMessage.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+        watermark = decode(entries[-1][0])
+        r.set(_watermark_key(room_name), watermark)
+        archived += len(rows)
+        if len(entries) < ARCHIVE_BATCH_SIZE:
+            break
+
+    if watermark:
+        cutoff = int(time.time() * 1000) - RETENTION * 1000
+        ms, seq = parse_id(watermark)
+        min_id = f'{cutoff}-0' if cutoff <= ms else f'{ms}-{seq + 1}'
+        r.xtrim(key, minid=min_id, approximate=False)
+
+    get_script(FORGET_IF_EMPTY_SCRIPT)(
+        keys=[key, ROOMS_KEY, _watermark_key(room_name)], args=[room_name]
+    )
+
+    return archived
@@ -0,0 +1,282 @@
+"""
+Live room directory backed by Redis sorted sets.
+
+Every live room is a member of one sorted set per (sort, scope):
+
+    livestream:dir:idx:<sort>:all
+    livestream:dir:idx:<sort>:creator:<creator_id>
+    livestream:dir:idx:<sort>:cat:<category>
+
+with sort one of viewers / gifts / recent. Webhooks keep the scores up to
+date incrementally, so a page read is a ZREVRANGE plus one hash read per
+room: O(log N + page size) regardless of how many rooms are live.
+
+Gift velocity uses forward exponential decay stored in log2 space: the
+score is log2(sum(amount * 2^(t / half_life))). Adding a gift is a
+log-add-exp in Lua, ordering matches the decayed total at any instant, and
+scores never need rebasing.
+"""
+
+import base64
+import json
+import math
+import time
+from django.conf import settings
+
+from apps.core.redis_client import decode, decode_hash, get_redis, get_script, make_key
+
+DIRECTORY_CONFIG = getattr(settings, 'ROOM_DIRECTORY_CONFIG', {})
+GIFT_HALF_LIFE = DIRECTORY_CONFIG.get('GIFT_HALF_LIFE', 300)
+PAGE_SIZE = DIRECTORY_CONFIG.get('PAGE_SIZE', 20)
+MAX_PAGE_SIZE = DIRECTORY_CONFIG.get('MAX_PAGE_SIZE', 100)
+PENDING_TTL = DIRECTORY_CONFIG.get('PENDING_TTL', 24 * 60 * 60)
+
+SORTS = ('viewers', 'gifts', 'recent')
+
+# KEYS[1] room hash; ARGV[1] ttl, ARGV[2..] field/value pairs
+REGISTER_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'started_at') == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] room hash, KEYS[2..] viewer indexes; ARGV[1] delta, ARGV[2] room name
+VIEWERS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local viewers = redis.call('HINCRBY', KEYS[1], 'viewers', ARGV[1])
+if viewers < 0 then
+    viewers = 0
+    redis.call('HSET', KEYS[1], 'viewers', 0)
+end
+for i = 2, #KEYS do
+    redis.call('ZADD', KEYS[i], 'XX', viewers, ARGV[2])
+end
+return viewers
+"""
+
+# KEYS gift indexes; ARGV[1] log2 of the decayed increment, ARGV[2] room name
+GIFT_SCRIPT = """
+local x = tonumber(ARGV[1])
+for i = 1, #KEYS do
+    local s = redis.call('ZSCORE', KEYS[i], ARGV[2])
+    if s then
+        s = tonumber(s)
+        local hi, lo = math.max(s, x), math.min(s, x)
+        local score = hi + math.log(1 + 2 ^ (lo - hi)) / math.log(2)
+        redis.call('ZADD', KEYS[i], string.format('%.17g', score), ARGV[2])
+    end
+end
+return 1
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def room_key(room_name):
+    return make_key('dir', 'room', room_name)
+
+
+def index_key(sort, scope='all'):
+    return make_key('dir', 'idx', sort, scope)
+
+
+def _scopes(creator=None, category=None):
+    scopes = ['all']
+    if creator:
+        scopes.append(f'creator:{creator}')
+    if category:
+        scopes.append(f'cat:{category}')
+    return scopes
+
+
+def _room_scopes(r, room_name):
+    creator, category = (decode(v) for v in r.hmget(room_key(room_name), 'creator', 'category'))
+    return creator, category, _scopes(creator, category)
+
+
+def get_room_creator(room_name):
+    return decode(get_redis().hget(room_key(room_name), 'creator'))
+
+
+def register_room(room_name, creator, category=None, title=None, subscribers_only=False):
+    """
+    Record who owns a room before it goes live. The room is only listed
+    once LiveKit reports room_started; unstarted registrations expire.
+    """
+    fields = {'creator': creator, 'category': category, 'title': title,
+              'subscribers_only': 1 if subscribers_only else None}
+    args = [PENDING_TTL]
+    for name, value in fields.items():
+        if value:
+            args.extend([name, value])
+    get_script(REGISTER_SCRIPT)(keys=[room_key(room_name)], args=args)
+
+
+def room_started(room_name, started_at=None, metadata=None):
+    """Add a room to every index it belongs to"""
+    r = get_redis()
+    key = room_key(room_name)
+    metadata = metadata or {}
+    started_at = int(started_at or time.time())
+
+    fields = {'started_at': started_at}
+    for field, source in (('creator', 'creator_id'), ('category', 'category'), ('title', 'title')):
+        if metadata.get(source):
+            fields[field] = metadata[source]
+    if metadata.get('subscribers_only'):
+        fields['subscribers_only'] = 1
+
+    pipe = r.pipeline()
+    pipe.hset(key, mapping=fields)
+    pipe.hsetnx(key, 'viewers', 0)
+    pipe.persist(key)
+    pipe.hmget(key, 'creator', 'category', 'viewers')
+    creator, category, viewers = (decode(v) for v in pipe.execute()[-1])
+
+    pipe = r.pipeline()
+    for scope in _scopes(creator, category):
+        pipe.zadd(index_key('viewers', scope), {room_name: int(viewers or 0)})
+        pipe.zadd(index_key('recent', scope), {room_name: started_at})
+        pipe.zadd(index_key('gifts', scope), {room_name: 0}, nx=True)
+    pipe.execute()
+
+
+def remove_room(room_name):
+    r = get_redis()
+    _, _, scopes = _room_scopes(r, room_name)
+
+    pipe = r.pipeline()
+    for sort in SORTS:
+        for scope in scopes:
+            pipe.zrem(index_key(sort, scope), room_name)
+    pipe.delete(room_key(room_name))
+    pipe.execute()
+
+
+def live_rooms():
+    """{room_name: started_at} for every room the directory lists as live"""
+    entries = get_redis().zrange(index_key('recent'), 0, -1, withscores=True)
+    return {decode(member): score for member, score in entries}
+
+
+def _adjust_viewers(room_name, identity, delta):
+    r = get_redis()
+    creator, _, scopes = _room_scopes(r, room_name)
+    if creator and identity == creator:
+        return None
+
+    keys = [room_key(room_name)] + [index_key('viewers', scope) for scope in scopes]
+    return get_script(VIEWERS_SCRIPT)(keys=keys, args=[delta, room_name])
+
+
+def viewer_joined(room_name, identity):
+    return _adjust_viewers(room_name, identity, 1)
+
+
+def viewer_left(room_name, identity):
+    return _adjust_viewers(room_name, identity, -1)
+
+
+def record_gift(room_name, amount, now=None):
+    """Bump a live room's gift velocity by a gift worth `amount` coins"""
+    if amount <= 0:
+        return
+    now = now or time.time()
+    r = get_redis()
+    _, _, scopes = _room_scopes(r, room_name)
+
+    increment = math.log2(amount) + now / GIFT_HALF_LIFE
+    keys = [index_key('gifts', scope) for scope in scopes]
+    get_script(GIFT_SCRIPT)(keys=keys, args=[repr(increment), room_name])
+
+
+def gift_velocity(score, now=None):
+    """Decayed gift total converted to coins per minute"""
+    if not score:
+        return 0.0
+    now = now or time.time()
+    decayed = 2 ** (score - now / GIFT_HALF_LIFE)
+    return decayed * math.log(2) / GIFT_HALF_LIFE * 60
+
+
+def encode_cursor(score, member):
+    raw = json.dumps([score, member]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, member = json.loads(raw)
+        return float(score), str(member)
+    except (ValueError, TypeError):
+        raise InvalidCursor('invalid cursor')
+
+
+def list_live_rooms(sort='viewers', creator=None, category=None, cursor=None, limit=None):
+    """
+    One page of live rooms ordered by `sort`, highest first.
+    Returns (rooms, next_cursor); next_cursor is None on the last page.
+    """
+    if sort not in SORTS:
+        raise ValueError(f'sort must be one of {", ".join(SORTS)}')
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+
+    if creator:
+        scope = f'creator:{creator}'
+    elif category:
+        scope = f'cat:{category}'
+    else:
+        scope = 'all'
+    key = index_key(sort, scope)
+
+    r = get_redis()
+    start = 0
+    if cursor:
+        score, member = decode_cursor(cursor)
+        pipe = r.pipeline()
+        pipe.zrevrank(key, member)
+        pipe.zscore(key, member)
+        rank, current = pipe.execute()
+        if rank is not None and current == score:
+            start = rank + 1
+        else:
+            # The cursor room left or moved; resume after its old score
+            start = r.zcount(key, f'({score!r}', '+inf')
+
+    entries = r.zrevrange(key, start, start + limit - 1, withscores=True)
+    if not entries:
+        return [], None
+
+    pipe = r.pipeline()
+    for member, _ in entries:
+        pipe.hgetall(room_key(decode(member)))
+        pipe.zscore(index_key('gifts'), member)
+    hydrated = pipe.execute()
+
+    now = time.time()
+    rooms = []
+    for i, (member, _) in enumerate(entries):
+        info = decode_hash(hydrated[2 * i])
+        rooms.append({
+            'room_name': decode(member),
+            'creator': info.get('creator'),
+            'category': info.get('category'),
+            'title': info.get('title'),
+            'viewers': int(info.get('viewers') or 0),
+            'started_at': int(info.get('started_at') or 0),
+            'gift_velocity': round(gift_velocity(hydrated[2 * i + 1], now), 2),
+        })
+
+    next_cursor = None
+    if len(entries) == limit:
+        member, score = entries[-1]
+        next_cursor = encode_cursor(score, decode(member))
+    return rooms, next_cursor
@@ -0,0 +1,162 @@
+"""
+Latency-aware choice between the configured LiveKit endpoints.
+
+A beat task probes every endpoint concurrently and folds each result into
+an EWMA of round-trip time and availability, kept in the cache as one
+table (so in-process on the two-tier backend):
+
+    score = ewma_rtt_ms / max(availability, MIN_AVAILABILITY)
+
+An endpoint is unhealthy after FAILURE_THRESHOLD failed probes in a row
+and is only used when nothing else is up. Request paths just read the
+table; if the prober hasn't run (or its table expired) they fall back to
+the configured order.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .livekit import LIVEKIT_HTTP_URL, LIVEKIT_IP_URL, LIVEKIT_WS_URL, LiveKitError, RoomServiceClient
+
+logger = logging.getLogger(__name__)
+
+PROBE_CONFIG = getattr(settings, 'LIVEKIT_PROBE_CONFIG', {})
+PROBE_TIMEOUT = PROBE_CONFIG.get('TIMEOUT', 2)
+# Weight of the newest probe in the moving averages
+ALPHA = PROBE_CONFIG.get('ALPHA', 0.3)
+FAILURE_THRESHOLD = PROBE_CONFIG.get('FAILURE_THRESHOLD', 2)
+MIN_AVAILABILITY = 0.05
+# A few missed probe intervals before request paths stop trusting the table
+TABLE_TTL = PROBE_CONFIG.get('TABLE_TTL', 60)
+# Connections kept per endpoint; batch jobs (shows.py) call from many threads
+POOL_SIZE = PROBE_CONFIG.get('POOL_SIZE', 32)
+
+TABLE_KEY = 'livekit:endpoints'
+
+# Any HTTP answer means the server is up; LiveKit's root path returns 200 "OK"
+REACHABLE_STATUSES = (200, 401, 404)
+
+
+def _ws_url(http_url):
+    return 'ws' + http_url[len('http'):] if http_url.startswith('http') else http_url
+
+
+ENDPOINTS = getattr(settings, 'LIVEKIT_CONFIG', {}).get('ENDPOINTS') or [
+    {'name': 'domain', 'http_url': LIVEKIT_HTTP_URL, 'ws_url': LIVEKIT_WS_URL},
+    {'name': 'ip', 'http_url': LIVEKIT_IP_URL, 'ws_url': _ws_url(LIVEKIT_IP_URL)},
+]
+
+_session = requests.Session()
+_clients = {}
+
+
+def probe(endpoint):
+    """One reachability check: (ok, rtt_ms, detail)"""
+    started = time.monotonic()
+    try:
+        response = _session.get(f"{endpoint['http_url']}/", timeout=PROBE_TIMEOUT)
+    except requests.RequestException as e:
+        return False, None, str(e)
+    rtt_ms = (time.monotonic() - started) * 1000
+    return response.status_code in REACHABLE_STATUSES, rtt_ms, response.status_code
+
+
+def _update(previous, ok, rtt_ms, detail, now):
+    entry = dict(previous or {})
+    availability = entry.get('availability', 1.0 if ok else 0.0)
+    entry['availability'] = round(ALPHA * (1.0 if ok else 0.0) + (1 - ALPHA) * availability, 4)
+    if ok:
+        ewma = entry.get('ewma_rtt_ms')
+        entry['ewma_rtt_ms'] = round(rtt_ms if ewma is None else ALPHA * rtt_ms + (1 - ALPHA) * ewma, 2)
+        entry['last_rtt_ms'] = round(rtt_ms, 2)
+        entry['consecutive_failures'] = 0
+        entry['response_code'] = detail
+        entry.pop('error', None)
+    else:
+        entry['consecutive_failures'] = entry.get('consecutive_failures', 0) + 1
+        entry['error'] = str(detail)
+    entry['healthy'] = entry['consecutive_failures'] < FAILURE_THRESHOLD and entry.get('ewma_rtt_ms') is not None
+    entry['score'] = (
+        round(entry['ewma_rtt_ms'] / max(entry['availability'], MIN_AVAILABILITY), 2)
+        if entry.get('ewma_rtt_ms') is not None else None
+    )
+    entry['checked_at'] = int(now)
+    return entry
+
+
+def probe_all(now=None):
+    """Probe every endpoint at once and store the updated table"""
+    now = now or time.time()
+    with ThreadPoolExecutor(max_workers=len(ENDPOINTS)) as pool:
+        results = list(pool.map(probe, ENDPOINTS))
+
+    previous = cache.get(TABLE_KEY) or {}
+    table = {}
+    for endpoint, (ok, rtt_ms, detail) in zip(ENDPOINTS, results):
+        entry = _update(previous.get(endpoint['name']), ok, rtt_ms, detail, now)
+        entry.update(endpoint)
+        table[endpoint['name']] = entry
+    cache.set(TABLE_KEY, table, TABLE_TTL)
+    return table
+
+
+def get_table():
+    return cache.get(TABLE_KEY)
+
+
+def ranked(table=None):
+    """Endpoints fastest first: healthy ones by score, then the rest in configured order"""
+    table = table if table is not None else get_table()
+    if not table:
+        return list(ENDPOINTS)
+
+    def key(endpoint):
+        entry = table.get(endpoint['name']) or {}
+        return (not entry.get('healthy'), entry.get('score') if entry.get('healthy') else 0)
+
+    return sorted(ENDPOINTS, key=key)
+
+
+def best():
+    return ranked()[0]
+
+
+def get_client(endpoint):
+    client = _clients.get(endpoint['http_url'])
+    if client is None:
+        client = _clients[endpoint['http_url']] = RoomServiceClient(endpoint['http_url'], pool_size=POOL_SIZE)
+    return client
+
+
+def call(method, payload=None):
+    """
+    A RoomService call on the best endpoint, falling through to the others.
+    Returns (response, http_url); raises LiveKitError if none answered.
+    """
+    error = None
+    for endpoint in ranked():
+        try:
+            return get_client(endpoint).call(method, payload), endpoint['http_url']
+        except LiveKitError as e:
+            logger.warning(f"LiveKit {method} via {endpoint['name']} failed: {e}")
+            error = e
+    raise error
+
+
+def stream(method, payload=None):
+    """
+    call() for large responses: returns (unread response, http_url) with
+    the body still to be read. Close the response when done.
+    """
+    error = None
+    for endpoint in ranked():
+        try:
+            return get_client(endpoint).stream(method, payload), endpoint['http_url']
+        except LiveKitError as e:
+            logger.warning(f"LiveKit {method} via {endpoint['name']} failed: {e}")
+            error = e
+    raise error
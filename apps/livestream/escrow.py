@@ -0,0 +1,329 @@
+"""
+Local escrow of viewer wallet balances.
+
+When a viewer enters a room (or sends their first gift) we reserve a
+spending allowance from the main app in one call. Gifts are then debited
+against that reservation with one Lua call, which refuses to spend past
+the granted amount, so a gift costs a single Redis round trip and can't
+double-spend. Spending is reported back to the main app in batches by
+the settlement task:
+
+    wallet:res:<user>:<room>  hash   id, granted, spent, settled, creator, closing
+    wallet:active             zset   <user>|<room> -> last activity
+    wallet:dirty              zset   <user>|<room> -> first unsettled change
+    wallet:room:<room>        set    users holding a reservation in the room
+
+Settlements carry the cumulative amount spent, so retrying one is
+harmless. Leaving the room, the room finishing or IDLE_TIMEOUT without a
+gift closes the reservation: no more debits, and the next settlement
+releases the unspent remainder. Reservation hashes carry no TTL: one
+leaves Redis only when its final settlement is acknowledged, so coins
+spent (or still held) are never lost to an expired key.
+"""
+
+import logging
+import time
+from django.conf import settings
+
+from apps.core.clients import MainAppClient
+from apps.core.redis_client import decode, decode_hash, get_redis, get_script, make_key
+
+logger = logging.getLogger(__name__)
+
+ESCROW_CONFIG = getattr(settings, 'WALLET_ESCROW_CONFIG', {})
+ALLOWANCE = ESCROW_CONFIG.get('ALLOWANCE', 500)
+IDLE_TIMEOUT = ESCROW_CONFIG.get('IDLE_TIMEOUT', 15 * 60)
+RESERVATION_TTL = ESCROW_CONFIG.get('RESERVATION_TTL', 24 * 60 * 60)
+SETTLE_BATCH_SIZE = ESCROW_CONFIG.get('SETTLE_BATCH_SIZE', 500)
+
+ACTIVE_KEY = make_key('wallet', 'active')
+DIRTY_KEY = make_key('wallet', 'dirty')
+
+NO_RESERVATION = -1
+INSUFFICIENT = -2
+CLOSING = -3
+
+# KEYS reservation, active, room set; ARGV ttl, now, member, user, field/value pairs...
+OPEN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS reservation, active, dirty; ARGV amount, now, member
+DEBIT_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'granted', 'spent', 'closing')
+if not state[1] then
+    return -1
+end
+if state[3] == '1' then
+    return -3
+end
+local remaining = tonumber(state[1]) - tonumber(state[2]) - tonumber(ARGV[1])
+if remaining < 0 then
+    return -2
+end
+redis.call('HINCRBY', KEYS[1], 'spent', ARGV[1])
+redis.call('PERSIST', KEYS[1])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+redis.call('ZADD', KEYS[3], 'NX', ARGV[2], ARGV[3])
+return remaining
+"""
+
+# KEYS reservation; ARGV reservation id, extra coins
+EXTEND_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'id', 'closing')
+if state[1] ~= ARGV[1] or state[2] == '1' then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'granted', ARGV[2])
+return 1
+"""
+
+# KEYS reservation, active, dirty; ARGV now, member
+CLOSE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+    return 0
+end
+redis.call('HSET', KEYS[1], 'closing', 1)
+redis.call('PERSIST', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZADD', KEYS[3], 'NX', ARGV[1], ARGV[2])
+return 1
+"""
+
+# KEYS reservation, dirty, room set; ARGV member, spent reported, user, release reported (1/0)
+ACK_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'spent', 'closing')
+if state[1] ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'settled', ARGV[2])
+if ARGV[4] == '1' then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[3], ARGV[3])
+elseif state[2] == '1' then
+    -- Closed while this settlement was in flight: the release is still owed
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class EscrowError(Exception):
+    """The main app couldn't be reached to reserve coins"""
+
+
+class InsufficientCoins(EscrowError):
+    pass
+
+
+class ReservationClosing(EscrowError):
+    """The user's previous reservation in this room is still being settled"""
+
+
+def _member(user_id, room_name):
+    return f'{user_id}|{room_name}'
+
+
+def _split(member):
+    user_id, _, room_name = decode(member).partition('|')
+    return user_id, room_name
+
+
+def _reservation_key(user_id, room_name):
+    return make_key('wallet', 'res', user_id, room_name)
+
+
+def _room_key(room_name):
+    return make_key('wallet', 'room', room_name)
+
+
+def get_reservation(user_id, room_name):
+    state = decode_hash(get_redis().hgetall(_reservation_key(user_id, room_name)))
+    if not state:
+        return None
+    granted, spent = int(state['granted']), int(state['spent'])
+    return {
+        'reservation_id': state['id'],
+        'granted': granted,
+        'spent': spent,
+        'remaining': granted - spent,
+        'closing': state.get('closing') == '1',
+    }
+
+
+def open_reservation(user_id, room_name, creator_id, amount=None, client=None):
+    """
+    Reserve an allowance for spending in a room, unless the user already
+    holds one there. Returns the reservation.
+    """
+    existing = get_reservation(user_id, room_name)
+    if existing:
+        if existing['closing']:
+            raise ReservationClosing('previous reservation is being settled, retry shortly')
+        return existing
+
+    client = client or MainAppClient()
+    reserved = client.reserve_user_coins(user_id, amount or ALLOWANCE, reference=room_name)
+    if reserved is None:
+        raise EscrowError('could not reserve coins')
+    granted = int(reserved.get('amount') or 0)
+    if granted <= 0:
+        raise InsufficientCoins('insufficient coins')
+
+    now = time.time()
+    fields = ['id', reserved['reservation_id'], 'granted', granted, 'spent', 0,
+              'settled', 0, 'creator', creator_id]
+    created = get_script(OPEN_SCRIPT)(
+        keys=[_reservation_key(user_id, room_name), ACTIVE_KEY, _room_key(room_name)],
+        args=[RESERVATION_TTL, now, _member(user_id, room_name), user_id, *fields],
+    )
+    if not created:
+        # A concurrent request won; hand this hold straight back
+        client.settle_reservations([{
+            'reservation_id': reserved['reservation_id'], 'user_id': user_id,
+            'creator_id': creator_id, 'spent': 0, 'release': True,
+        }])
+    return get_reservation(user_id, room_name)
+
+
+def _extend(user_id, room_name, reservation, amount, client):
+    extra = max(amount - reservation['remaining'], ALLOWANCE)
+    reserved = client.reserve_user_coins(
+        user_id, extra, reference=room_name, reservation_id=reservation['reservation_id']
+    )
+    if reserved is None:
+        raise EscrowError('could not reserve coins')
+    granted = int(reserved.get('amount') or 0)
+    if granted > 0:
+        # If the reservation closed meanwhile, its final settlement releases this too
+        get_script(EXTEND_SCRIPT)(
+            keys=[_reservation_key(user_id, room_name)],
+            args=[reservation['reservation_id'], granted],
+        )
+
+
+def _debit(user_id, room_name, amount):
+    member = _member(user_id, room_name)
+    return get_script(DEBIT_SCRIPT)(
+        keys=[_reservation_key(user_id, room_name), ACTIVE_KEY, DIRTY_KEY],
+        args=[amount, time.time(), member],
+    )
+
+
+def debit(user_id, room_name, creator_id, amount):
+    """
+    Spend `amount` coins from the user's reservation in a room, reserving
+    or topping up from the main app only when it can't cover the gift.
+    Returns the remaining allowance.
+    """
+    remaining = _debit(user_id, room_name, amount)
+    if remaining >= 0:
+        return remaining
+
+    client = MainAppClient()
+    if remaining == CLOSING:
+        raise ReservationClosing('previous reservation is being settled, retry shortly')
+    if remaining == NO_RESERVATION:
+        open_reservation(user_id, room_name, creator_id, max(amount, ALLOWANCE), client=client)
+    elif remaining == INSUFFICIENT:
+        reservation = get_reservation(user_id, room_name)
+        if reservation:
+            _extend(user_id, room_name, reservation, amount, client)
+
+    remaining = _debit(user_id, room_name, amount)
+    if remaining == CLOSING:
+        raise ReservationClosing('previous reservation is being settled, retry shortly')
+    if remaining < 0:
+        raise InsufficientCoins('insufficient coins')
+    return remaining
+
+
+def close_reservation(user_id, room_name):
+    """Stop spending; the next settlement releases what's left"""
+    return bool(get_script(CLOSE_SCRIPT)(
+        keys=[_reservation_key(user_id, room_name), ACTIVE_KEY, DIRTY_KEY],
+        args=[time.time(), _member(user_id, room_name)],
+    ))
+
+
+def close_room(room_name):
+    for user_id in get_redis().smembers(_room_key(room_name)):
+        close_reservation(decode(user_id), room_name)
+
+
+def close_idle(now=None):
+    cutoff = (now or time.time()) - IDLE_TIMEOUT
+    idle = get_redis().zrangebyscore(ACTIVE_KEY, '-inf', cutoff)
+    for member in idle:
+        close_reservation(*_split(member))
+    return len(idle)
+
+
+def settle(client=None):
+    """
+    Report unsettled spending to the main app, SETTLE_BATCH_SIZE
+    reservations per call. Returns the number of reservations settled.
+    """
+    client = client or MainAppClient()
+    r = get_redis()
+    settled_count = 0
+    offset = 0
+
+    while True:
+        members = r.zrange(DIRTY_KEY, offset, offset + SETTLE_BATCH_SIZE - 1)
+        if not members:
+            break
+
+        pipe = r.pipeline(transaction=False)
+        for member in members:
+            pipe.hgetall(_reservation_key(*_split(member)))
+        states = pipe.execute()
+
+        batch, gone = {}, []
+        for member, state in zip(members, states):
+            state = decode_hash(state)
+            if not state:
+                gone.append(member)
+                continue
+            batch[state['id']] = (member, state['spent'], {
+                'reservation_id': state['id'],
+                'user_id': _split(member)[0],
+                'creator_id': state['creator'],
+                'spent': int(state['spent']),
+                'release': state.get('closing') == '1',
+            })
+        if gone:
+            logger.error(f"Dropping {len(gone)} dirty reservations with no state left to settle")
+            r.zrem(DIRTY_KEY, *gone)
+
+        settled = client.settle_reservations([s for _, _, s in batch.values()]) if batch else set()
+        if settled is None:
+            break
+
+        acked = 0
+        for reservation_id, (member, spent, settlement) in batch.items():
+            if reservation_id not in settled:
+                continue
+            user_id, room_name = _split(member)
+            # Acknowledge what was reported, not the reservation's state now
+            acked += get_script(ACK_SCRIPT)(
+                keys=[_reservation_key(user_id, room_name), DIRTY_KEY, _room_key(room_name)],
+                args=[decode(member), spent, user_id, 1 if settlement['release'] else 0],
+            )
+        settled_count += len(settled)
+
+        # Entries still dirty (failed or debited again) stay ahead of the next page
+        offset += len(members) - len(gone) - acked
+        if len(members) < SETTLE_BATCH_SIZE:
+            break
+
+    return settled_count
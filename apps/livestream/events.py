@@ -0,0 +1,243 @@
+"""
+Room state change events, pushed to clients over Server-Sent Events.
+
+Publishing (sync, from webhook receivers) assigns each event a per-room
+sequence id, appends it to a short backlog sorted set and PUBLISHes it on
+the room's channel in one Lua call:
+
+    ev:<room>:seq       last event id
+    ev:<room>:backlog   zset id -> event JSON, capped at BACKLOG_SIZE
+    ev:<room>           pub/sub channel
+
+Streaming (async, ASGI only) goes through RoomEventHub: one pub/sub
+connection per process, one SUBSCRIBE per room with local listeners, and
+every event fanned out to each listener's queue. A client reconnecting
+with Last-Event-ID is replayed from the backlog first.
+"""
+
+import asyncio
+import json
+import logging
+from django.conf import settings
+from redis import asyncio as aioredis
+
+from apps.core.redis_client import decode, get_script, make_key
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CONFIG = getattr(settings, 'ROOM_EVENTS_CONFIG', {})
+HEARTBEAT_INTERVAL = EVENTS_CONFIG.get('HEARTBEAT_INTERVAL', 15)
+BACKLOG_SIZE = EVENTS_CONFIG.get('BACKLOG_SIZE', 500)
+BACKLOG_TTL = EVENTS_CONFIG.get('BACKLOG_TTL', 60 * 60)
+QUEUE_SIZE = EVENTS_CONFIG.get('QUEUE_SIZE', 256)
+# Django 4.2 doesn't notice client disconnects mid-stream, so streams are
+# closed periodically and the client reconnects with Last-Event-ID.
+MAX_STREAM_SECONDS = EVENTS_CONFIG.get('MAX_STREAM_SECONDS', 300)
+RETRY_MS = EVENTS_CONFIG.get('RETRY_MS', 3000)
+
+# KEYS seq, backlog; ARGV type, data JSON, backlog size, ttl, channel
+PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local payload = '{"id":' .. id .. ',"type":"' .. ARGV[1] .. '","data":' .. ARGV[2] .. '}'
+redis.call('ZADD', KEYS[2], id, payload)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[3]) + 1))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('PUBLISH', ARGV[5], payload)
+return id
+"""
+
+_OVERFLOW = object()
+
+
+def channel_name(room_name):
+    return make_key('ev', room_name)
+
+
+def _seq_key(room_name):
+    return make_key('ev', room_name, 'seq')
+
+
+def _backlog_key(room_name):
+    return make_key('ev', room_name, 'backlog')
+
+
+def publish(room_name, event_type, data):
+    """Publish a room event; returns its id"""
+    return get_script(PUBLISH_SCRIPT)(
+        keys=[_seq_key(room_name), _backlog_key(room_name)],
+        args=[event_type, json.dumps(data), BACKLOG_SIZE, BACKLOG_TTL, channel_name(room_name)],
+    )
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class Listener:
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class RoomEventHub:
+    """Per-process multiplexer of room channels onto local listeners"""
+
+    def __init__(self, redis_url):
+        self.redis_url = redis_url
+        self.client = None
+        self.pubsub = None
+        self.listeners = {}
+        self._reader = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, room_name):
+        listener = Listener()
+        async with self._lock:
+            await self._ensure_connected()
+            room_listeners = self.listeners.setdefault(room_name, set())
+            if not room_listeners:
+                await self.pubsub.subscribe(channel_name(room_name))
+            room_listeners.add(listener)
+            # Only now does the pubsub have a connection to read from
+            self._ensure_reader()
+        return listener
+
+    async def unsubscribe(self, room_name, listener):
+        async with self._lock:
+            room_listeners = self.listeners.get(room_name)
+            if room_listeners is None:
+                return
+            room_listeners.discard(listener)
+            if not room_listeners:
+                del self.listeners[room_name]
+                try:
+                    await self.pubsub.unsubscribe(channel_name(room_name))
+                except Exception as e:
+                    logger.warning(f"Unsubscribe from {room_name} failed: {e}")
+
+    async def replay(self, room_name, last_event_id):
+        """
+        Backlog events after last_event_id, and whether the backlog still
+        covers everything since then.
+        """
+        await self._ensure_connected()
+        pipe = self.client.pipeline()
+        pipe.get(_seq_key(room_name))
+        pipe.zrange(_backlog_key(room_name), 0, 0, withscores=True)
+        pipe.zrangebyscore(_backlog_key(room_name), f'({last_event_id}', '+inf')
+        seq, first, entries = await pipe.execute()
+
+        events = [json.loads(entry) for entry in entries]
+        seq = int(seq or 0)
+        oldest = int(first[0][1]) if first else seq + 1
+        # seq < last_event_id means the sequence expired and restarted
+        return events, oldest <= last_event_id + 1 and seq >= last_event_id
+
+    async def _ensure_connected(self):
+        if self.client is None:
+            self.client = aioredis.from_url(self.redis_url)
+            self.pubsub = self.client.pubsub()
+
+    def _ensure_reader(self):
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        prefix_length = len(channel_name(''))
+        while True:
+            if not self.pubsub.subscribed:
+                # Nothing subscribed (yet, or after a failed resubscribe): no connection to read
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Room event subscription failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+                await self._resubscribe()
+                continue
+
+            if message is None:
+                continue
+            room_name = decode(message['channel'])[prefix_length:]
+            event = json.loads(message['data'])
+            for listener in list(self.listeners.get(room_name, ())):
+                if not listener.deliver(event):
+                    # Too slow to keep up; end its stream so it resumes from the backlog
+                    self.listeners[room_name].discard(listener)
+                    listener.queue.get_nowait()
+                    listener.queue.put_nowait(_OVERFLOW)
+
+    async def _resubscribe(self):
+        async with self._lock:
+            try:
+                await self.pubsub.aclose()
+            except Exception:
+                pass
+            self.pubsub = self.client.pubsub()
+            channels = [channel_name(room) for room in self.listeners]
+            if channels:
+                try:
+                    await self.pubsub.subscribe(*channels)
+                except Exception as e:
+                    logger.error(f"Resubscribing to room events failed: {e}")
+
+
+_hub = None
+_hub_loop = None
+
+
+def get_hub():
+    """The hub for the running event loop"""
+    global _hub, _hub_loop
+    loop = asyncio.get_running_loop()
+    if _hub is None or _hub_loop is not loop:
+        redis_url = getattr(settings, 'REDIS_URL', None) or settings.CACHES['default']['LOCATION']
+        _hub, _hub_loop = RoomEventHub(redis_url), loop
+    return _hub
+
+
+async def stream_room_events(room_name, last_event_id=None):
+    """SSE frames for a room: backlog replay, then live events and heartbeats"""
+    hub = get_hub()
+    listener = await hub.subscribe(room_name)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+
+        sent = last_event_id or 0
+        if last_event_id is not None:
+            backlog, complete = await hub.replay(room_name, last_event_id)
+            if not complete:
+                # Events were missed; the client should reload full state
+                sent = 0
+                yield 'event: reset\ndata: {}\n\n'
+            for event in backlog:
+                sent = event['id']
+                yield format_event(event)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_STREAM_SECONDS
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(listener.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+
+            if event is _OVERFLOW:
+                break
+            if event['id'] <= sent:
+                continue
+            sent = event['id']
+            yield format_event(event)
+    finally:
+        await hub.unsubscribe(room_name, listener)
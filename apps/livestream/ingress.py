@@ -0,0 +1,283 @@
+"""
+Pool of pre-created LiveKit ingresses, so creators streaming from OBS go
+live without waiting on CreateIngress.
+
+    ing:pool:<node>:<input_type>   list of idle ingress ids, oldest first
+    ing:info                       hash ingress id -> JSON (url, stream_key, node, ...)
+    ing:rooms                      hash room -> leased ingress id
+    ing:retired                    list of ingress ids waiting to be deleted
+
+A beat task keeps POOL_SIZES[input_type] idle ingresses on every node.
+Going live pops one from the fullest pool and records the lease in a
+single Lua call, then binds it to the room and creator with UpdateIngress,
+which is one quick round trip. If every pool is empty the ingress is
+created on demand as before.
+
+An ingress's stream key is a credential, so a used ingress is never handed
+to another creator: release() retires it, and the next refill deletes it
+and creates a fresh one in its place. Refill also deletes pool ingresses
+LiveKit has but Redis doesn't know about (e.g. after a Redis flush).
+"""
+
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+from . import endpoints
+from .livekit import LIVEKIT_NODES, IngressServiceClient, LiveKitError
+
+logger = logging.getLogger(__name__)
+
+INGRESS_CONFIG = getattr(settings, 'INGRESS_CONFIG', {})
+# Idle ingresses kept per node, by LiveKit input type
+POOL_SIZES = INGRESS_CONFIG.get('POOL_SIZES', {'RTMP_INPUT': 2, 'WHIP_INPUT': 1})
+MAX_CONCURRENCY = INGRESS_CONFIG.get('MAX_CONCURRENCY', 4)
+LOCK_TIMEOUT = INGRESS_CONFIG.get('LOCK_TIMEOUT', 2 * 60)
+
+INPUT_TYPES = {'rtmp': 'RTMP_INPUT', 'whip': 'WHIP_INPUT'}
+DEFAULT_NODE = 'default'
+POOL_PREFIX = 'pool-'
+
+INFO_KEY = make_key('ing', 'info')
+ROOMS_KEY = make_key('ing', 'rooms')
+RETIRED_KEY = make_key('ing', 'retired')
+LOCK_KEY = make_key('ing', 'lock')
+
+# KEYS rooms, pool lists in order of preference; ARGV room
+# Returns {1, id} for a fresh lease, {0, id} if the room already had one, nil if all pools are empty
+LEASE_SCRIPT = """
+local leased = redis.call('HGET', KEYS[1], ARGV[1])
+if leased then
+    return {0, leased}
+end
+for i = 2, #KEYS do
+    local ingress_id = redis.call('RPOP', KEYS[i])
+    if ingress_id then
+        redis.call('HSET', KEYS[1], ARGV[1], ingress_id)
+        return {1, ingress_id}
+    end
+end
+return nil
+"""
+
+_clients = {}
+
+
+class IngressUnavailable(Exception):
+    """Raised when no ingress could be leased or created"""
+
+
+def pool_nodes():
+    """(pool name, Twirp URL) of every node ingresses are kept on"""
+    if LIVEKIT_NODES:
+        return [(node, node) for node in LIVEKIT_NODES]
+    return [(DEFAULT_NODE, endpoints.best()['http_url'])]
+
+
+def get_client(url):
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = IngressServiceClient(url, pool_size=MAX_CONCURRENCY + 1)
+    return client
+
+
+def _pool_key(node, input_type):
+    return make_key('ing', 'pool', node, input_type)
+
+
+def public(info, with_key=True):
+    """What a client sees of an ingress; the stream key is a publishing credential"""
+    keys = ('ingress_id', 'input_type', 'url', 'stream_key', 'room', 'identity')
+    return {key: info.get(key) for key in keys if with_key or key != 'stream_key'}
+
+
+def _register(r, node, url, input_type, created, room='', identity=''):
+    info = {
+        'ingress_id': created['ingress_id'],
+        'input_type': input_type,
+        'url': created.get('url', ''),
+        'stream_key': created.get('stream_key', ''),
+        'node': node,
+        'node_url': url,
+        'room': room,
+        'identity': identity,
+        'created_at': int(time.time()),
+    }
+    r.hset(INFO_KEY, info['ingress_id'], json.dumps(info))
+    return info
+
+
+def get_lease(room_name):
+    r = get_redis()
+    ingress_id = r.hget(ROOMS_KEY, room_name)
+    if ingress_id is None:
+        return None
+    raw = r.hget(INFO_KEY, ingress_id)
+    return json.loads(decode(raw)) if raw else None
+
+
+def lease(room_name, identity, name='', input_type='RTMP_INPUT', nodes=None):
+    """
+    Ingress for a creator going live in `room_name`: a pooled one when any
+    node has one idle, otherwise a new one. Returns (info, pooled).
+    """
+    nodes = nodes or pool_nodes()
+    r = get_redis()
+    pools = [node for node, _ in nodes]
+    pipe = r.pipeline()
+    for node in pools:
+        pipe.llen(_pool_key(node, input_type))
+    # Fullest pool first, which spreads go-lives across nodes
+    ordered = [node for _, node in sorted(zip(pipe.execute(), pools), key=lambda item: -item[0])]
+
+    for _ in range(len(ordered) + 1):
+        result = get_script(LEASE_SCRIPT)(
+            keys=[ROOMS_KEY, *[_pool_key(node, input_type) for node in ordered]], args=[room_name],
+        )
+        if result is None:
+            break
+        fresh, ingress_id = result[0], decode(result[1])
+        info = json.loads(decode(r.hget(INFO_KEY, ingress_id)) or 'null')
+        if info is None:
+            r.hdel(ROOMS_KEY, room_name)
+            continue
+        if not fresh:
+            return info, True
+        try:
+            get_client(info['node_url']).update_ingress(
+                ingress_id, room_name=room_name, participant_identity=identity,
+                participant_name=name or identity,
+            )
+        except LiveKitError as e:
+            logger.warning(f"Pooled ingress {ingress_id} on {info['node']} unusable, retiring it: {e}")
+            pipe = r.pipeline()
+            pipe.hdel(ROOMS_KEY, room_name)
+            pipe.rpush(RETIRED_KEY, ingress_id)
+            pipe.execute()
+            continue
+        info.update(room=room_name, identity=identity)
+        r.hset(INFO_KEY, ingress_id, json.dumps(info))
+        return info, True
+
+    logger.info(f"Ingress pool for {input_type} empty, creating one for {room_name}")
+    node, url = nodes[0]
+    try:
+        created = get_client(url).create_ingress(
+            input_type, f'live-{room_name}', room_name=room_name,
+            participant_identity=identity, participant_name=name or identity,
+        )
+    except LiveKitError as e:
+        raise IngressUnavailable(str(e))
+    info = _register(r, node, url, input_type, created, room=room_name, identity=identity)
+    if not r.hsetnx(ROOMS_KEY, room_name, info['ingress_id']):
+        # A concurrent go-live for the same room won; keep theirs
+        r.rpush(RETIRED_KEY, info['ingress_id'])
+        return get_lease(room_name), False
+    return info, False
+
+
+def release(room_name):
+    """Retire the room's ingress. Returns its id, or None if it had none."""
+    r = get_redis()
+    ingress_id = decode(r.hget(ROOMS_KEY, room_name))
+    if ingress_id is None:
+        return None
+    pipe = r.pipeline()
+    pipe.hdel(ROOMS_KEY, room_name)
+    pipe.rpush(RETIRED_KEY, ingress_id)
+    pipe.execute()
+    return ingress_id
+
+
+def _delete(r, ingress_id):
+    info = json.loads(decode(r.hget(INFO_KEY, ingress_id)) or 'null')
+    if info is not None:
+        get_client(info['node_url']).delete_ingress(ingress_id)
+    r.hdel(INFO_KEY, ingress_id)
+
+
+def _delete_orphan(url, ingress_id):
+    try:
+        get_client(url).delete_ingress(ingress_id)
+    except LiveKitError as e:
+        # Still unknown to Redis, so the next refill finds it again
+        logger.warning(f"Deleting orphaned ingress {ingress_id} failed: {e}")
+
+
+def _create(r, node, url, input_type):
+    created = get_client(url).create_ingress(input_type, f'{POOL_PREFIX}{uuid.uuid4().hex[:12]}')
+    _register(r, node, url, input_type, created)
+    r.lpush(_pool_key(node, input_type), created['ingress_id'])
+
+
+def _orphans(r, node, url):
+    known = {decode(i) for i in r.hkeys(INFO_KEY)}
+    return [
+        item['ingress_id'] for item in get_client(url).list_ingress()
+        if item.get('name', '').startswith(POOL_PREFIX) and item.get('ingress_id') not in known
+    ]
+
+
+def refill(nodes=None, sizes=None):
+    """
+    Delete retired and orphaned ingresses and top every pool back up.
+    Returns counts, or None if another refill holds the lock.
+    """
+    nodes = nodes or pool_nodes()
+    sizes = POOL_SIZES if sizes is None else sizes
+    r = get_redis()
+    if not r.set(LOCK_KEY, 1, nx=True, ex=LOCK_TIMEOUT):
+        return None
+
+    summary = {'deleted': 0, 'created': 0, 'failed': 0}
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+            retired = []
+            while True:
+                ingress_id = decode(r.lpop(RETIRED_KEY))
+                if ingress_id is None:
+                    break
+                retired.append((pool.submit(_delete, r, ingress_id), ingress_id))
+
+            jobs = []
+            for node, url in nodes:
+                try:
+                    orphans = _orphans(r, node, url)
+                except LiveKitError as e:
+                    logger.warning(f"Listing ingresses on {node} failed: {e}")
+                    continue
+                for ingress_id in orphans:
+                    logger.info(f"Deleting orphaned pool ingress {ingress_id} on {node}")
+                    retired.append((pool.submit(_delete_orphan, url, ingress_id), ingress_id))
+                for input_type, size in sizes.items():
+                    missing = size - r.llen(_pool_key(node, input_type))
+                    jobs += [pool.submit(_create, r, node, url, input_type) for _ in range(max(missing, 0))]
+                    # The pool size was lowered; drop the surplus
+                    for _ in range(max(-missing, 0)):
+                        ingress_id = decode(r.lpop(_pool_key(node, input_type)))
+                        if ingress_id is not None:
+                            retired.append((pool.submit(_delete, r, ingress_id), ingress_id))
+
+            for job, ingress_id in retired:
+                try:
+                    job.result()
+                    summary['deleted'] += 1
+                except LiveKitError as e:
+                    logger.warning(f"Deleting ingress {ingress_id} failed, will retry: {e}")
+                    r.rpush(RETIRED_KEY, ingress_id)
+            for job in jobs:
+                try:
+                    job.result()
+                    summary['created'] += 1
+                except LiveKitError as e:
+                    logger.warning(f"Creating a pooled ingress failed: {e}")
+                    summary['failed'] += 1
+    finally:
+        r.delete(LOCK_KEY)
+    return summary
+
@@ -0,0 +1,242 @@
+"""
+Gift leaderboards per room and per creator.
+
+Every gift bumps, in one MULTI:
+
+    lb:<scope>:total        zset user -> coins (whole stream for rooms,
+                            all time for creators)
+    lb:<scope>:m:<minute>   zset user -> coins in that minute, expiring
+                            shortly after RECENT_WINDOW
+    lb:<scope>:gifts        hash user -> number of gifts (rooms only)
+    lb:<scope>:meta         hash creator, started_at, coins, gifts (rooms only)
+
+with scope room:<room_name> or creator:<creator_id>. Top-N and rank reads
+are ZREVRANGE / ZREVRANK, O(log N + N). The recent board is a ZUNIONSTORE
+of the minute buckets, cached for UNION_TTL so hot rooms don't re-union
+on every read; it has minute granularity.
+
+When a room finishes its board is renamed aside (so a reused room name
+starts fresh) and a Celery task copies it to GiftLeaderboard in batches.
+"""
+
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+
+from apps.core.redis_client import decode, decode_hash, get_redis, get_script, make_key
+
+from .models import GiftLeaderboard, GiftLeaderboardEntry
+
+LEADERBOARD_CONFIG = getattr(settings, 'GIFT_LEADERBOARD_CONFIG', {})
+RECENT_WINDOW = LEADERBOARD_CONFIG.get('RECENT_WINDOW', 10 * 60)
+UNION_TTL = LEADERBOARD_CONFIG.get('UNION_TTL', 5)
+ROOM_TTL = LEADERBOARD_CONFIG.get('ROOM_TTL', 24 * 60 * 60)
+CLOSED_TTL = LEADERBOARD_CONFIG.get('CLOSED_TTL', 7 * 24 * 60 * 60)
+FLUSH_BATCH_SIZE = LEADERBOARD_CONFIG.get('FLUSH_BATCH_SIZE', 1000)
+# Closed boards still pending after this long are re-queued by the sweeper
+FLUSH_GRACE = LEADERBOARD_CONFIG.get('FLUSH_GRACE', 5 * 60)
+TOP_SIZE = LEADERBOARD_CONFIG.get('TOP_SIZE', 10)
+MAX_TOP_SIZE = LEADERBOARD_CONFIG.get('MAX_TOP_SIZE', 100)
+
+WINDOWS = ('stream', 'recent')
+BUCKET_SECONDS = 60
+
+PENDING_KEY = make_key('lb', 'pending')
+
+# KEYS union, buckets...; ARGV ttl
+UNION_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZUNIONSTORE', KEYS[1], #KEYS - 1, unpack(KEYS, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+# KEYS total, gifts, meta, closed total, closed gifts, closed meta, pending
+# ARGV closed ttl, pending member, closed at
+CLOSE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[2], KEYS[3])
+    return 0
+end
+for i = 1, 3 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('RENAME', KEYS[i], KEYS[i + 3])
+        redis.call('EXPIRE', KEYS[i + 3], ARGV[1])
+    end
+end
+redis.call('ZADD', KEYS[7], ARGV[3], ARGV[2])
+return 1
+"""
+
+
+def _scope(kind, owner):
+    return f'{kind}:{owner}'
+
+
+def _key(scope, *parts):
+    return make_key('lb', scope, *parts)
+
+
+def _bucket(now):
+    return int(now // BUCKET_SECONDS)
+
+
+def record_gift(room_name, creator_id, user_id, amount, now=None):
+    """Add a gift to the room's and creator's boards"""
+    now = now or time.time()
+    bucket = _bucket(now)
+    bucket_ttl = RECENT_WINDOW + 2 * BUCKET_SECONDS
+
+    room = _scope('room', room_name)
+    scopes = [room] + ([_scope('creator', creator_id)] if creator_id else [])
+
+    pipe = get_redis().pipeline()
+    for scope in scopes:
+        pipe.zincrby(_key(scope, 'total'), amount, user_id)
+        pipe.zincrby(_key(scope, 'm', bucket), amount, user_id)
+        pipe.expire(_key(scope, 'm', bucket), bucket_ttl)
+
+    meta = _key(room, 'meta')
+    pipe.hincrby(_key(room, 'gifts'), user_id, 1)
+    if creator_id:
+        pipe.hsetnx(meta, 'creator', creator_id)
+    pipe.hsetnx(meta, 'started_at', int(now))
+    pipe.hincrby(meta, 'coins', amount)
+    pipe.hincrby(meta, 'gifts', 1)
+    for part in ('total', 'gifts', 'meta'):
+        pipe.expire(_key(room, part), ROOM_TTL)
+    pipe.execute()
+
+
+def _board_key(scope, window, now=None):
+    if window == 'stream':
+        return _key(scope, 'total')
+    if window != 'recent':
+        raise ValueError(f'window must be one of {", ".join(WINDOWS)}')
+
+    current = _bucket(now or time.time())
+    count = max(1, RECENT_WINDOW // BUCKET_SECONDS)
+    union = _key(scope, 'recent', current)
+    buckets = [_key(scope, 'm', b) for b in range(current - count + 1, current + 1)]
+    get_script(UNION_SCRIPT)(keys=[union] + buckets, args=[UNION_TTL])
+    return union
+
+
+def leaderboard(kind, owner, window='stream', limit=None, user_id=None):
+    """
+    Top gifters for a room or creator, plus the rank of `user_id` if given
+    (None if they haven't gifted in that window).
+    """
+    limit = max(1, min(int(limit or TOP_SIZE), MAX_TOP_SIZE))
+    key = _board_key(_scope(kind, owner), window)
+
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    pipe.zcard(key)
+    if user_id:
+        pipe.zrevrank(key, user_id)
+        pipe.zscore(key, user_id)
+    results = pipe.execute()
+
+    board = {
+        'window': window,
+        'gifters': results[1],
+        'top': [
+            {'rank': i + 1, 'user_id': decode(member), 'coins': int(score)}
+            for i, (member, score) in enumerate(results[0])
+        ],
+    }
+    if window == 'recent':
+        board['window_seconds'] = RECENT_WINDOW
+    if user_id:
+        rank, score = results[2], results[3]
+        board['user'] = {
+            'user_id': user_id,
+            'rank': rank + 1 if rank is not None else None,
+            'coins': int(score or 0),
+        }
+    return board
+
+
+def _closed_keys(room_name, closed_at):
+    room = _scope('room', room_name)
+    return [_key(room, 'closed', closed_at, part) for part in ('total', 'gifts', 'meta')]
+
+
+def close_room(room_name, now=None):
+    """
+    Set a finished room's board aside for flushing. Returns the closing
+    timestamp (ms) identifying it, or None if nobody gifted.
+    """
+    closed_at = int((now or time.time()) * 1000)
+    room = _scope('room', room_name)
+    live = [_key(room, part) for part in ('total', 'gifts', 'meta')]
+    closed = get_script(CLOSE_SCRIPT)(
+        keys=live + _closed_keys(room_name, closed_at) + [PENDING_KEY],
+        args=[CLOSED_TTL, f'{room_name}|{closed_at}', closed_at],
+    )
+    return closed_at if closed else None
+
+
+def pending_boards(older_than=0):
+    """(room_name, closed_at) of closed boards not yet flushed"""
+    cutoff = int((time.time() - older_than) * 1000)
+    members = get_redis().zrangebyscore(PENDING_KEY, '-inf', cutoff)
+    boards = []
+    for member in members:
+        room_name, _, closed_at = decode(member).rpartition('|')
+        boards.append((room_name, int(closed_at)))
+    return boards
+
+
+def flush_room(room_name, closed_at):
+    """
+    Copy a closed board into Postgres, FLUSH_BATCH_SIZE entries at a time.
+    Safe to repeat: the board and its entries are unique per close.
+    Returns the number of entries written.
+    """
+    r = get_redis()
+    total_key, gifts_key, meta_key = _closed_keys(room_name, closed_at)
+    if not r.exists(total_key):
+        # Already flushed, or expired before anyone got to it
+        r.zrem(PENDING_KEY, f'{room_name}|{closed_at}')
+        return 0
+    meta = decode_hash(r.hgetall(meta_key))
+    started_at = int(meta.get('started_at') or 0)
+
+    board, _ = GiftLeaderboard.objects.get_or_create(
+        room=room_name,
+        finished_at=datetime.fromtimestamp(closed_at / 1000, tz=timezone.utc),
+        defaults={
+            'creator': meta.get('creator') or '',
+            'started_at': datetime.fromtimestamp(started_at, tz=timezone.utc) if started_at else None,
+            'total_coins': int(meta.get('coins') or 0),
+            'gift_count': int(meta.get('gifts') or 0),
+        },
+    )
+
+    written = 0
+    start = 0
+    while True:
+        entries = r.zrevrange(total_key, start, start + FLUSH_BATCH_SIZE - 1, withscores=True)
+        if not entries:
+            break
+        counts = r.hmget(gifts_key, [member for member, _ in entries])
+        GiftLeaderboardEntry.objects.bulk_create([
+            GiftLeaderboardEntry(
+                leaderboard=board, user_id=decode(member), rank=start + i + 1,
+                coins=int(score), gift_count=int(count or 0),
+            )
+            for i, ((member, score), count) in enumerate(zip(entries, counts))
+        ], ignore_conflicts=True)
+        written += len(entries)
+        start += FLUSH_BATCH_SIZE
+        if len(entries) < FLUSH_BATCH_SIZE:
+            break
+
+    pipe = r.pipeline()
+    pipe.delete(total_key, gifts_key, meta_key)
+    pipe.zrem(PENDING_KEY, f'{room_name}|{closed_at}')
+    pipe.execute()
+    return written
@@ -0,0 +1,277 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import jwt
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from apps.core.tracing import inject, start_span
+
+# LiveKit configuration from settings or fallback to your actual server
+LIVEKIT_API_KEY = getattr(settings, 'LIVEKIT_CONFIG', {}).get('API_KEY', '2f96aaaa91727f979ee756cfbd6f6e56')
+LIVEKIT_API_SECRET = getattr(settings, 'LIVEKIT_CONFIG', {}).get('API_SECRET', '2cff236bc97b877758be4e2e58dc71abf0791851762ef64d3f1587e43e872416')
+LIVEKIT_WS_URL = getattr(settings, 'LIVEKIT_CONFIG', {}).get('WS_URL', 'wss://livekit-server.boomsnap.com')
+LIVEKIT_HTTP_URL = getattr(settings, 'LIVEKIT_CONFIG', {}).get('HTTP_URL', 'https://livekit-server.boomsnap.com')
+
+# Fallback to IP if domain doesn't work
+LIVEKIT_IP_URL = "http://3.89.23.33:7880"
+
+# Every LiveKit node the service talks to, for jobs that must see all rooms.
+# Empty for a single server, which is reached through endpoints.best()
+LIVEKIT_NODES = getattr(settings, 'LIVEKIT_CONFIG', {}).get('NODES') or []
+
+
+class WebhookError(Exception):
+    """Raised when a LiveKit webhook can't be authenticated"""
+
+
+class LiveKitError(Exception):
+    """Raised when a LiveKit server API call fails"""
+
+
+def generate_access_token(identity, room_name, role="audience"):
+    """
+    Generate LiveKit access token for your actual server
+    """
+    try:
+        # Token payload
+        now = int(time.time())
+        exp = now + (24 * 60 * 60)  # 24 hours expiration
+
+        payload = {
+            "iss": LIVEKIT_API_KEY,
+            "sub": identity,
+            "iat": now,
+            "exp": exp,
+            "room": room_name,
+        }
+
+        # Add permissions based on role
+        if role == "host":
+            payload["video"] = {
+                "room": room_name,
+                "roomJoin": True,
+                "roomList": True,
+                "roomRecord": True,
+                "roomAdmin": True,
+                "roomCreate": True,
+                "canPublish": True,
+                "canSubscribe": True,
+                "canPublishData": True,
+            }
+        else:  # audience
+            payload["video"] = {
+                "room": room_name,
+                "roomJoin": True,
+                "canSubscribe": True,
+                "canPublishData": True,
+            }
+
+        # Generate JWT token
+        token = jwt.encode(payload, LIVEKIT_API_SECRET, algorithm="HS256")
+        return token
+
+    except Exception as e:
+        print(f"Token generation error: {e}")
+        raise e
+
+
+def verify_webhook(auth_header, body):
+    """
+    Validate a LiveKit webhook and return the decoded event.
+
+    LiveKit signs webhooks with a JWT in the Authorization header whose
+    `sha256` claim is the base64 SHA-256 of the raw request body.
+    """
+    if not auth_header:
+        raise WebhookError('missing authorization header')
+
+    token = auth_header.split(' ')[-1]
+    try:
+        claims = jwt.decode(token, LIVEKIT_API_SECRET, algorithms=['HS256'], issuer=LIVEKIT_API_KEY)
+    except jwt.InvalidTokenError as e:
+        raise WebhookError(f'invalid token: {e}')
+
+    digest = base64.b64encode(hashlib.sha256(body).digest()).decode()
+    if not hmac.compare_digest(digest, claims.get('sha256', '')):
+        raise WebhookError('body hash mismatch')
+
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError:
+        raise WebhookError('invalid JSON body')
+
+
+def get_field(obj, name, default=None):
+    """
+    Read a field from a LiveKit object by its proto (snake_case) name.
+    Twirp responses use snake_case, webhook payloads use camelCase.
+    """
+    if not obj:
+        return default
+    if name in obj:
+        return obj[name]
+    head, *rest = name.split('_')
+    camel = head + ''.join(part.title() for part in rest)
+    return obj.get(camel, default)
+
+
+def parse_metadata(value):
+    """Room/participant metadata is an opaque string; we store JSON in it"""
+    if not value:
+        return {}
+    try:
+        data = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def is_standard_participant(participant):
+    """False for ingress, egress, SIP and agent participants"""
+    return get_field(participant, 'kind') in (None, 0, 'STANDARD')
+
+
+class RoomServiceClient:
+    """
+    Twirp client for one LiveKit node's RoomService. Keeps a pooled
+    session and a cached admin token, so it is meant to be reused (and is
+    safe to share between threads).
+    """
+
+    SERVICE = 'livekit.RoomService'
+    # Video grants of the admin token; None uses generate_access_token's host grants
+    GRANTS = None
+    TOKEN_LIFETIME = 24 * 60 * 60
+
+    def __init__(self, base_url, timeout=10, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._token = None
+        self._token_expires = 0
+
+    def _new_token(self):
+        if self.GRANTS is None:
+            return generate_access_token('admin', '', 'host')
+        now = int(time.time())
+        payload = {
+            'iss': LIVEKIT_API_KEY,
+            'sub': 'admin',
+            'iat': now,
+            'exp': now + self.TOKEN_LIFETIME,
+            'video': self.GRANTS,
+        }
+        return jwt.encode(payload, LIVEKIT_API_SECRET, algorithm='HS256')
+
+    def _headers(self):
+        now = time.time()
+        if now > self._token_expires - 60:
+            self._token = self._new_token()
+            self._token_expires = now + self.TOKEN_LIFETIME
+        return inject({
+            'Authorization': f'Bearer {self._token}',
+            'Content-Type': 'application/json',
+        })
+
+    def call(self, method, payload=None):
+        with start_span(f'livekit.{method}', 'client', **{'http.url': self.base_url}) as span:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/twirp/{self.SERVICE}/{method}",
+                    json=payload or {}, headers=self._headers(), timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                raise LiveKitError(f'{method} on {self.base_url} failed: {e}')
+            span.set('http.status_code', response.status_code)
+            if response.status_code != 200:
+                raise LiveKitError(f'{method} on {self.base_url} returned {response.status_code}')
+            return response.json()
+
+    def stream(self, method, payload=None, timeout=None):
+        """
+        Like call(), but returns the unread requests response so large
+        bodies can be parsed as they arrive. The caller must close it.
+        """
+        with start_span(f'livekit.{method}', 'client', **{'http.url': self.base_url, 'stream': True}) as span:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/twirp/{self.SERVICE}/{method}",
+                    json=payload or {}, headers=self._headers(), timeout=timeout or self.timeout, stream=True,
+                )
+            except requests.RequestException as e:
+                raise LiveKitError(f'{method} on {self.base_url} failed: {e}')
+            span.set('http.status_code', response.status_code)
+            if response.status_code != 200:
+                response.close()
+                raise LiveKitError(f'{method} on {self.base_url} returned {response.status_code}')
+            return response
+
+    def list_rooms(self, names=None):
+        payload = {'names': list(names)} if names else {}
+        return self.call('ListRooms', payload).get('rooms', [])
+
+    def delete_room(self, room_name):
+        self.call('DeleteRoom', {'room': room_name})
+
+    def send_data(self, room_name, data, kind='RELIABLE', topic=None):
+        """Data packet to everyone in the room; `data` is bytes"""
+        payload = {'room': room_name, 'data': base64.b64encode(data).decode(), 'kind': kind}
+        if topic:
+            payload['topic'] = topic
+        self.call('SendData', payload)
+
+
+class IngressServiceClient(RoomServiceClient):
+    """Twirp client for one LiveKit node's Ingress service"""
+
+    SERVICE = 'livekit.Ingress'
+    GRANTS = {'ingressAdmin': True}
+
+    def create_ingress(self, input_type, name, room_name='', participant_identity='', participant_name=''):
+        return self.call('CreateIngress', {
+            'input_type': input_type,
+            'name': name,
+            'room_name': room_name,
+            'participant_identity': participant_identity,
+            'participant_name': participant_name,
+        })
+
+    def update_ingress(self, ingress_id, **fields):
+        return self.call('UpdateIngress', {'ingress_id': ingress_id, **fields})
+
+    def list_ingress(self, room_name=None):
+        payload = {'room_name': room_name} if room_name else {}
+        return self.call('ListIngress', payload).get('items', [])
+
+    def delete_ingress(self, ingress_id):
+        return self.call('DeleteIngress', {'ingress_id': ingress_id})
+
+
+class EgressServiceClient(RoomServiceClient):
+    """Twirp client for one LiveKit node's Egress service"""
+
+    SERVICE = 'livekit.Egress'
+    GRANTS = {'roomRecord': True}
+
+    def start_room_composite_egress(self, room_name, file_output, layout='speaker'):
+        return self.call('StartRoomCompositeEgress', {
+            'room_name': room_name,
+            'layout': layout,
+            'file_outputs': [file_output],
+        })
+
+    def list_egress(self, room_name=None, active=True):
+        payload = {'active': active}
+        if room_name:
+            payload['room_name'] = room_name
+        return self.call('ListEgress', payload).get('items', [])
+
+    def stop_egress(self, egress_id):
+        return self.call('StopEgress', {'egress_id': egress_id})
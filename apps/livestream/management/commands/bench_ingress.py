@@ -0,0 +1,113 @@
+"""
+Measure go-live latency with and without the pre-created ingress pool.
+
+Runs --go-lives leases against a local LiveKit stand-in whose
+CreateIngress takes --create-delay seconds (allocating an ingress is the
+slow part) and whose UpdateIngress takes --update-delay. On demand, every
+go-live creates its ingress; pooled, it takes one from a pool of
+--pool-size that is refilled between go-lives, as the background task
+would. Pools and leases live under a throwaway node name and are cleaned
+up afterwards.
+
+    python manage.py bench_ingress --go-lives 20 --create-delay 1.5 --update-delay 0.02
+"""
+
+import itertools
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarking import StubLiveKit, summarize
+from apps.livestream import ingress
+
+
+class StubIngress:
+    """Ingress Twirp endpoints for StubLiveKit, keeping created ingresses in memory"""
+
+    def __init__(self, create_delay, update_delay):
+        self.create_delay = create_delay
+        self.update_delay = update_delay
+        self.ingresses = {}
+        self._ids = itertools.count(1)
+
+    def install(self, stub):
+        for method in ('CreateIngress', 'UpdateIngress', 'ListIngress', 'DeleteIngress'):
+            stub.add_route(f'/twirp/livekit.Ingress/{method}', getattr(self, method.lower()))
+
+    def createingress(self, body):
+        time.sleep(self.create_delay)
+        ingress_id = f'IN_{next(self._ids):06d}'
+        self.ingresses[ingress_id] = {
+            **body,
+            'ingress_id': ingress_id,
+            'url': 'rtmp://127.0.0.1/live',
+            'stream_key': uuid.uuid4().hex,
+        }
+        return self.ingresses[ingress_id]
+
+    def updateingress(self, body):
+        time.sleep(self.update_delay)
+        self.ingresses[body['ingress_id']].update(body)
+        return self.ingresses[body['ingress_id']]
+
+    def listingress(self, body):
+        return {'items': list(self.ingresses.values())}
+
+    def deleteingress(self, body):
+        return self.ingresses.pop(body['ingress_id'], {})
+
+
+class Command(BaseCommand):
+    help = 'Benchmark creator go-live latency with on-demand vs pooled LiveKit ingresses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--go-lives', type=int, default=20)
+        parser.add_argument('--pool-size', type=int, default=3)
+        parser.add_argument('--create-delay', type=float, default=1.5)
+        parser.add_argument('--update-delay', type=float, default=0.02)
+
+    def handle(self, *args, **options):
+        fake = StubIngress(options['create_delay'], options['update_delay'])
+        results = {}
+        with StubLiveKit() as stub:
+            fake.install(stub)
+            for mode, pool_size in (('on-demand', 0), ('pooled', options['pool_size'])):
+                self.stdout.write(f'Running {mode}...')
+                results[mode] = self.run_mode(stub.url, pool_size, options['go_lives'])
+            leaked = len(fake.ingresses)
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"CreateIngress {options['create_delay'] * 1000:.0f}ms, "
+            f"UpdateIngress {options['update_delay'] * 1000:.0f}ms, {options['go_lives']} go-lives"
+        )
+        self.stdout.write(f"{'mode':<11}{'p50':>10}{'p95':>10}{'max':>10}{'from pool':>11}")
+        for mode, (r, pooled) in results.items():
+            self.stdout.write(
+                f"{mode:<11}{r['p50_ms']:>8.0f}ms{r['p95_ms']:>8.0f}ms{r['max_ms']:>8.0f}ms"
+                f"{pooled:>7}/{r['requests']}"
+            )
+        if leaked:
+            self.stderr.write(f'{leaked} ingresses were left behind on the stand-in')
+
+    def run_mode(self, url, pool_size, go_lives):
+        nodes = [(f'bench-{uuid.uuid4().hex[:8]}', url)]
+        sizes = {'RTMP_INPUT': pool_size}
+        rooms = [f'bench-room-{uuid.uuid4().hex[:8]}' for _ in range(go_lives)]
+        latencies, pooled = [], 0
+        started = time.monotonic()
+        try:
+            ingress.refill(nodes=nodes, sizes=sizes)
+            for room_name in rooms:
+                t0 = time.monotonic()
+                _, from_pool = ingress.lease(room_name, f'creator-{room_name}', nodes=nodes)
+                latencies.append(time.monotonic() - t0)
+                pooled += from_pool
+                # Stands in for the refill task kicked after each lease
+                ingress.refill(nodes=nodes, sizes=sizes)
+        finally:
+            for room_name in rooms:
+                ingress.release(room_name)
+            ingress.refill(nodes=nodes, sizes={'RTMP_INPUT': 0})
+        return summarize(latencies, time.monotonic() - started), pooled
@@ -0,0 +1,136 @@
+"""
+Compare peak memory and latency of listing a very large room's
+participants in full against the streamed, field-projected path.
+
+A local LiveKit stand-in serves a --participants room with realistic
+tracks and metadata. Each mode runs in a fresh child process (so peak RSS
+is its own) that fetches and renders the list --iterations times:
+
+    full        ListParticipants parsed with response.json() and re-serialized
+                whole, as the snapshot path does
+    projected   the body parsed as it arrives, keeping only --fields and
+                streaming the output (?fields=)
+
+    python manage.py bench_participants --participants 50000 --fields identity,name,joined_at
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+
+from apps.core.benchmarking import StubLiveKit, fake_participant, summarize
+from apps.livestream import participants
+from apps.livestream.livekit import RoomServiceClient
+
+MODES = ('full', 'projected')
+
+
+def heavy_participant(index):
+    participant = fake_participant(index)
+    participant['is_publisher'] = index % 500 == 0
+    participant['tracks'] = [
+        {
+            'sid': f'TR_{index:08d}_{kind}',
+            'type': kind.upper(),
+            'source': 'CAMERA' if kind == 'video' else 'MICROPHONE',
+            'mime_type': 'video/VP8' if kind == 'video' else 'audio/opus',
+            'muted': False,
+            'layers': [
+                {'quality': quality, 'width': width, 'height': width * 9 // 16, 'bitrate': width * 2000}
+                for quality, width in (('LOW', 320), ('MEDIUM', 640), ('HIGH', 1280))
+            ] if kind == 'video' else [],
+        }
+        for kind in ('audio', 'video')
+    ]
+    return participant
+
+
+def max_rss_mb():
+    # KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = 'Benchmark peak RSS and latency of full vs streamed, field-projected participant listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=50000)
+        parser.add_argument('--fields', default='identity,name,joined_at')
+        parser.add_argument('--iterations', type=int, default=3)
+        parser.add_argument('--modes', default=','.join(MODES))
+        # Internal: run one mode in this process against --url and print JSON
+        parser.add_argument('--child', choices=MODES, help='Run one mode in this process (used by the parent)')
+        parser.add_argument('--url', help='Stand-in URL for --child')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            result = self.run_child(options['child'], options['url'], options)
+            self.stdout.write(json.dumps(result))
+            return
+
+        modes = [m.strip() for m in options['modes'].split(',') if m.strip()]
+        for mode in modes:
+            if mode not in MODES:
+                raise CommandError(f'Unknown mode: {mode}')
+
+        body = {'participants': [heavy_participant(i) for i in range(options['participants'])]}
+        results = {}
+        with StubLiveKit() as stub:
+            stub.add_route('/twirp/livekit.RoomService/ListParticipants', lambda _: body)
+            upstream_mb = len(json.dumps(body)) / (1024 * 1024)
+            for mode in modes:
+                self.stdout.write(f'Running {mode}...')
+                results[mode] = self.run_mode(mode, stub.url, options)
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{options['participants']} participants, {upstream_mb:.1f}MB from LiveKit, "
+            f"fields {options['fields']}, {options['iterations']} iterations"
+        )
+        self.stdout.write(f"{'mode':<11}{'peak RSS':>12}{'p50':>10}{'max':>10}{'response':>12}")
+        for mode, r in results.items():
+            self.stdout.write(
+                f"{mode:<11}{r['peak_rss_mb'] - r['base_rss_mb']:>10.1f}MB"
+                f"{r['p50_ms']:>8.0f}ms{r['max_ms']:>8.0f}ms{r['response_mb']:>10.1f}MB"
+            )
+        self.stdout.write('(peak RSS is above the process baseline after startup)')
+
+    def run_mode(self, mode, url, options):
+        cmd = [
+            sys.executable, 'manage.py', 'bench_participants', '--child', mode, '--url', url,
+            '--fields', options['fields'], '--iterations', str(options['iterations']),
+        ]
+        proc = subprocess.run(cmd, cwd=settings.BASE_DIR, env=dict(os.environ), capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise CommandError(f'{mode} run failed: {proc.stderr.strip()[-500:]}')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def run_child(self, mode, url, options):
+        client = RoomServiceClient(url, timeout=120)
+        fields = participants.parse_fields(options['fields'])
+        base_rss = max_rss_mb()
+        latencies, response_bytes = [], 0
+        started = time.monotonic()
+        for _ in range(options['iterations']):
+            t0 = time.monotonic()
+            if mode == 'full':
+                fetched = client.call('ListParticipants', {'room': 'bench'}).get('participants', [])
+                response_bytes = len(JsonResponse({'participants': fetched, 'status': 'success'}).content)
+                del fetched
+            else:
+                upstream = client.stream('ListParticipants', {'room': 'bench'}, timeout=120)
+                response_bytes = sum(
+                    len(chunk) for chunk in participants.render_projected('bench', upstream, fields, url)
+                )
+            latencies.append(time.monotonic() - t0)
+        result = summarize(latencies, time.monotonic() - started)
+        result.update(base_rss_mb=base_rss, peak_rss_mb=max_rss_mb(), response_mb=response_bytes / (1024 * 1024))
+        return result
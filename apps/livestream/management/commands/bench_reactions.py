@@ -0,0 +1,144 @@
+"""
+Measure how many data-channel broadcasts the reaction aggregator sends for
+a given event rate.
+
+--producers threads record --rate reactions per second (one in
+--gift-every a gift) across --rooms rooms for --seconds, while a
+Broadcaster drains them into a local LiveKit stand-in's SendData. Reports
+events in against broadcasts out, bytes a viewer receives compared with
+one packet per event, pass latency, and checks that every recorded tap
+arrived in some packet. Bench rooms are mapped to the stand-in as their
+node and cleaned up afterwards.
+
+    python manage.py bench_reactions --rooms 20 --rate 5000 --seconds 10
+"""
+
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarking import StubLiveKit, percentile
+from apps.core.redis_client import get_redis
+from apps.livestream import admission, reactions
+
+GIFTS = ('rose', 'heart', 'crown', 'rocket', 'lion', 'galaxy')
+
+
+class TimedBroadcaster(reactions.Broadcaster):
+    """Broadcaster recording how long each pass takes"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pass_seconds = []
+
+    def run_once(self):
+        started = time.monotonic()
+        summary = super().run_once()
+        if summary['rooms']:
+            self.pass_seconds.append(time.monotonic() - started)
+        return summary
+
+
+class Command(BaseCommand):
+    help = 'Benchmark reaction events in versus aggregated data-channel broadcasts out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=20)
+        parser.add_argument('--rate', type=int, default=5000, help='Reactions per second across all rooms')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--producers', type=int, default=8)
+        parser.add_argument('--gift-every', type=int, default=50)
+        parser.add_argument('--window-ms', type=int, default=reactions.WINDOW_MS)
+        parser.add_argument('--send-delay', type=float, default=0.005, help='Seconds the stand-in takes per SendData')
+
+    def handle(self, *args, **options):
+        rooms = [f'bench-rx-{uuid.uuid4().hex[:8]}' for _ in range(options['rooms'])]
+        packets, lock = [], threading.Lock()
+
+        def send_data(body):
+            with lock:
+                packets.append((body['room'], base64.b64decode(body['data'])))
+            return {}
+
+        r = get_redis()
+        recorded = [0] * options['producers']
+        with StubLiveKit(delay=options['send_delay']) as stub:
+            stub.add_route('/twirp/livekit.RoomService/SendData', send_data)
+            r.hset(admission.NODES_KEY, mapping={room: stub.url for room in rooms})
+            broadcaster = TimedBroadcaster(options['window_ms'])
+            stopping = threading.Event()
+            runner = threading.Thread(target=broadcaster.run, args=(stopping.is_set,))
+            try:
+                runner.start()
+                started = time.monotonic()
+                producers = [
+                    threading.Thread(target=self.produce, args=(i, rooms, options, recorded))
+                    for i in range(options['producers'])
+                ]
+                for thread in producers:
+                    thread.start()
+                for thread in producers:
+                    thread.join()
+                elapsed = time.monotonic() - started
+                # Let the last window drain
+                time.sleep(broadcaster.max_window * 2)
+            finally:
+                stopping.set()
+                runner.join()
+                broadcaster.close()
+                r.hdel(admission.NODES_KEY, *rooms)
+                for room in rooms:
+                    reactions.discard(room)
+
+        events_in = sum(recorded)
+        delivered = sum(sum(json.loads(data)['counts'].values()) for _, data in packets)
+        packet_bytes = sum(len(data) for _, data in packets)
+        # One packet per event, as if each tap were forwarded on its own
+        naive_bytes = events_in * len(json.dumps({'type': 'reaction', 'kind': 'heart', 'identity': 'user-12345'}))
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{options['rooms']} rooms, {events_in} reactions in {elapsed:.1f}s "
+            f"({events_in / elapsed:.0f}/s), window {options['window_ms']}ms"
+        )
+        self.stdout.write(f"{'broadcasts out':<26}{len(packets):>10}")
+        self.stdout.write(f"{'events per broadcast':<26}{events_in / max(len(packets), 1):>10.1f}")
+        self.stdout.write(
+            f"{'broadcasts/s per room':<26}{len(packets) / elapsed / options['rooms']:>10.1f}"
+            f"  (vs {events_in / elapsed / options['rooms']:.0f} forwarding each event)"
+        )
+        self.stdout.write(
+            f"{'bytes per viewer':<26}{packet_bytes / options['rooms']:>10.0f}"
+            f"  (vs {naive_bytes / options['rooms']:.0f})"
+        )
+        self.stdout.write(
+            f"{'pass p50 / p95':<26}{percentile(broadcaster.pass_seconds, 50) * 1000:>8.1f}ms"
+            f" / {percentile(broadcaster.pass_seconds, 95) * 1000:.1f}ms"
+        )
+        if delivered != events_in:
+            self.stderr.write(f'{events_in - delivered} reactions were recorded but never broadcast')
+        else:
+            self.stdout.write(self.style.SUCCESS('Every reaction was delivered in an aggregate'))
+
+    def produce(self, index, rooms, options, recorded):
+        rate = options['rate'] / options['producers']
+        deadline = time.monotonic() + options['seconds']
+        rng = random.Random(index)
+        sent = 0
+        started = time.monotonic()
+        while time.monotonic() < deadline:
+            room = rng.choice(rooms)
+            if rng.randrange(options['gift_every']) == 0:
+                reactions.record(room, reactions.GIFT, item=rng.choice(GIFTS), coins=rng.choice((1, 5, 10, 100)))
+            else:
+                reactions.record(room, rng.choice(reactions.KINDS))
+            sent += 1
+            ahead = sent / rate - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+        recorded[index] = sent
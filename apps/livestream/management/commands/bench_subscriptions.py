@@ -0,0 +1,126 @@
+"""
+Compare subscription gating through the main app against the local
+subscriber bitmap index.
+
+A local stand-in for the main app answers the subscription check after
+--delay seconds and serves --subscribers random user IDs (below --id-space)
+as one creator's subscriber list. The command bulk-loads the index, then
+times --checks gating decisions each way for a subscriber-only room, and
+finally the "subscribers watching now" intersection with --viewers
+viewers in the room.
+
+    python manage.py bench_subscriptions --subscribers 200000 --id-space 50000000 --delay 0.02
+"""
+
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarking import StubLiveKit, summarize
+from apps.core.clients import MainAppClient
+from apps.core.redis_client import get_redis, make_key
+from apps.livestream import directory, subscriptions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark subscriber-only gating via the main app vs the local subscriber bitmaps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=200000)
+        parser.add_argument('--id-space', type=int, default=50000000, help='User IDs are drawn below this')
+        parser.add_argument('--viewers', type=int, default=20000)
+        parser.add_argument('--checks', type=int, default=2000)
+        parser.add_argument('--delay', type=float, default=0.02, help='Main app response delay (seconds)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(50)
+        subscribers = rng.sample(range(options['id_space']), options['subscribers'])
+        creator = f'bench-{uuid.uuid4().hex[:8]}'
+        room = f'bench-subs-{uuid.uuid4().hex[:8]}'
+
+        with StubLiveKit(delay=options['delay']) as stub:
+            stub.add_route(f'/api/internal/subscriptions/creators/{creator}/subscribers/',
+                           lambda _: {'user_ids': subscribers, 'next_cursor': None})
+            stub.add_route('/api/internal/subscriptions/check/', lambda _: {'is_subscribed': True})
+            base_url = settings.MAIN_APP_CONFIG['BASE_URL']
+            settings.MAIN_APP_CONFIG['BASE_URL'] = stub.url
+            try:
+                self.run(creator, room, subscribers, rng, options)
+            finally:
+                settings.MAIN_APP_CONFIG['BASE_URL'] = base_url
+                self.cleanup(creator, room)
+
+    def run(self, creator, room, subscribers, rng, options):
+        client = MainAppClient()
+        self.stdout.write(f"Loading {len(subscribers)} subscribers...")
+        started = time.monotonic()
+        count = subscriptions.load(creator, client)
+        load_seconds = time.monotonic() - started
+
+        # Payload sizes: bitmap bytes, and 2 bytes per intset entry
+        r = get_redis()
+        bitmaps = arrays = index_bytes = 0
+        for chunk in r.smembers(make_key('subs', creator, 'chunks')):
+            chunk = int(chunk)
+            size = r.strlen(make_key('subs', creator, chunk))
+            if size:
+                bitmaps += 1
+                index_bytes += size
+            else:
+                arrays += 1
+                index_bytes += 2 * r.scard(make_key('subs', creator, chunk, 'a'))
+        self.stdout.write(
+            f"index: {count} subscribers in {load_seconds:.2f}s, {arrays} intset and {bitmaps} bitmap chunks, "
+            f"~{index_bytes / 1024:.0f}KiB (a flat bitmap over {options['id_space']} IDs is "
+            f"{options['id_space'] / 8 / 1024:.0f}KiB)"
+        )
+
+        directory.register_room(room, creator=creator, subscribers_only=True)
+        users = [rng.choice(subscribers) if i % 2 else rng.randrange(options['id_space'])
+                 for i in range(options['checks'])]
+        results = {}
+        for mode in ('main app', 'bitmap'):
+            latencies = []
+            started = time.monotonic()
+            for user_id in users:
+                t0 = time.monotonic()
+                if mode == 'main app':
+                    client.verify_user_subscription(user_id, creator)
+                else:
+                    subscriptions.check(room, str(user_id))
+                latencies.append(time.monotonic() - t0)
+            results[mode] = summarize(latencies, time.monotonic() - started)
+
+        self.stdout.write('')
+        self.stdout.write(f"{options['checks']} gating checks, main app delay {options['delay'] * 1000:.0f}ms")
+        self.stdout.write(f"{'mode':<10}{'checks/s':>10}{'p50':>10}{'p99':>10}")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<10}{result['rps']:>10.0f}{result['p50_ms']:>8.2f}ms{result['p99_ms']:>8.2f}ms"
+            )
+
+        viewers = [rng.choice(subscribers) if i % 4 == 0 else rng.randrange(options['id_space'])
+                   for i in range(options['viewers'])]
+        for user_id in viewers:
+            subscriptions.viewer_joined(room, user_id)
+        expected = len(set(viewers) & set(subscribers))
+        started = time.monotonic()
+        live = subscriptions.live_subscribers(room, creator)
+        elapsed = time.monotonic() - started
+        self.stdout.write('')
+        self.stdout.write(
+            f"live subscribers among {len(set(viewers))} viewers: {live['count']} "
+            f"(expected {expected}) in {elapsed * 1000:.1f}ms"
+        )
+
+    def cleanup(self, creator, room):
+        r = get_redis()
+        subscriptions.clear_room(room)
+        directory.remove_room(room)
+        keys = list(r.scan_iter(make_key('subs', creator, '*')))
+        if keys:
+            r.delete(*keys)
+        r.zrem(subscriptions.INDEXED_KEY, creator)
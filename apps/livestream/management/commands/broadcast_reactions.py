@@ -0,0 +1,51 @@
+"""
+Run the reaction broadcaster: drain aggregated reactions and gifts once per
+window and send each active room one data packet. Meant to run under the
+process supervisor; extra copies wait on the leader lease as standbys.
+
+    python manage.py broadcast_reactions
+"""
+
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.livestream import reactions
+
+REPORT_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Broadcast windowed reaction and gift aggregates to LiveKit rooms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-ms', type=int, default=reactions.WINDOW_MS)
+        parser.add_argument('--max-window-ms', type=int, default=reactions.MAX_WINDOW_MS)
+
+    def handle(self, *args, **options):
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stopping.set())
+
+        broadcaster = reactions.Broadcaster(options['window_ms'], options['max_window_ms'])
+        reported = {'at': time.monotonic(), 'events': 0, 'sent': 0}
+
+        def should_stop():
+            now = time.monotonic()
+            if now - reported['at'] >= REPORT_INTERVAL:
+                totals = broadcaster.totals
+                self.stdout.write(
+                    f"{totals['events'] - reported['events']} reactions in, "
+                    f"{totals['sent'] - reported['sent']} broadcasts out, "
+                    f"window {broadcaster.window * 1000:.0f}ms"
+                )
+                reported.update(at=now, events=totals['events'], sent=totals['sent'])
+            return stopping.is_set()
+
+        self.stdout.write(f"Broadcasting reactions every {options['window_ms']}-{options['max_window_ms']}ms")
+        try:
+            broadcaster.run(should_stop)
+        finally:
+            broadcaster.close()
@@ -0,0 +1,34 @@
+"""
+Run one room reconciliation pass against LiveKit by hand.
+
+    python manage.py reconcile_rooms --dry-run
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.livestream import reaper
+
+
+class Command(BaseCommand):
+    help = 'Diff live rooms against LiveKit; close stale rooms and delete empty ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything')
+        parser.add_argument('--nodes', help='Comma-separated LiveKit URLs (default: LIVEKIT_NODES)')
+
+    def handle(self, *args, **options):
+        nodes = [n.strip() for n in (options['nodes'] or '').split(',') if n.strip()] or None
+        summary = reaper.reconcile(nodes=nodes, dry_run=options['dry_run'])
+        if summary is None:
+            raise CommandError('Another reconciliation is running')
+
+        self.stdout.write(
+            f"{summary['remote_rooms']} rooms in LiveKit across {summary['nodes']} node(s), "
+            f"{summary['local_rooms']} listed locally"
+        )
+        for node in summary['failed_nodes']:
+            self.stdout.write(self.style.WARNING(f'Could not list {node}; stale rooms not closed'))
+        verb = 'would' if options['dry_run'] else 'did'
+        for key, action in (('stale', 'close'), ('missing', 'add'), ('empty', 'delete')):
+            rooms = summary[key]
+            self.stdout.write(f"{verb} {action} {len(rooms)}: {', '.join(rooms[:20])}{' ...' if len(rooms) > 20 else ''}")
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(max_length=255)),
+                ('sent_at_ms', models.BigIntegerField()),
+                ('seq', models.PositiveIntegerField(default=0)),
+                ('identity', models.CharField(max_length=255)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('room', 'sent_at_ms', 'seq'), name='unique_chat_message'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livestream', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(blank=True, help_text='Creator ID, or blank for the global list', max_length=255, unique=True)),
+                ('masked_terms', models.JSONField(blank=True, default=list)),
+                ('blocked_terms', models.JSONField(blank=True, default=list)),
+                ('block_links', models.BooleanField(default=False)),
+                ('version', models.BigIntegerField(default=0, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
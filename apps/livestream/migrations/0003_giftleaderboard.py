@@ -0,0 +1,48 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livestream', '0002_moderationlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GiftLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(max_length=255)),
+                ('creator', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField()),
+                ('total_coins', models.BigIntegerField(default=0)),
+                ('gift_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GiftLeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.CharField(max_length=255)),
+                ('rank', models.PositiveIntegerField()),
+                ('coins', models.BigIntegerField()),
+                ('gift_count', models.PositiveIntegerField(default=0)),
+                ('leaderboard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='livestream.giftleaderboard')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='giftleaderboard',
+            constraint=models.UniqueConstraint(fields=('room', 'finished_at'), name='unique_gift_leaderboard'),
+        ),
+        migrations.AddConstraint(
+            model_name='giftleaderboardentry',
+            constraint=models.UniqueConstraint(fields=('leaderboard', 'user_id'), name='unique_gift_leaderboard_entry'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livestream', '0003_giftleaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledShow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_name', models.CharField(max_length=255, unique=True)),
+                ('creator_id', models.CharField(db_index=True, max_length=255)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('starts_at', models.DateTimeField(db_index=True)),
+                ('expected_viewers', models.PositiveIntegerField(default=0)),
+                ('max_participants', models.PositiveIntegerField(default=0, help_text='0 derives it from expected viewers')),
+                ('metadata', models.JSONField(blank=True, default=dict, help_text='Extra room metadata')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('prewarmed', 'Pre-warmed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='scheduled', max_length=16)),
+                ('metadata_synced', models.BooleanField(default=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('prewarmed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['starts_at'],
+            },
+        ),
+    ]
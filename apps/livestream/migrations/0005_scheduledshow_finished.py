@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livestream', '0004_scheduledshow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledshow',
+            name='sync_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='scheduledshow',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('prewarmed', 'Pre-warmed'), ('finished', 'Finished'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='scheduled', max_length=16),
+        ),
+    ]
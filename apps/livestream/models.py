@@ -1,3 +1,156 @@
+import time
 from django.db import models
 
-# Create your models here.
+
+class ChatMessage(models.Model):
+    """
+    Archived chat message. Recent history lives in a Redis Stream per room
+    (see chat.py); the archiver copies it here in batches.
+
+    (sent_at_ms, seq) is the Redis Stream entry ID, kept so scroll-back
+    cursors work the same against the stream and the archive.
+    """
+    room = models.CharField(max_length=255)
+    sent_at_ms = models.BigIntegerField()
+    seq = models.PositiveIntegerField(default=0)
+    identity = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, blank=True)
+    text = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'sent_at_ms', 'seq'], name='unique_chat_message'),
+        ]
+
+    def __str__(self):
+        return f"{self.room} {self.identity}: {self.text[:50]}"
+
+    @property
+    def message_id(self):
+        return f"{self.sent_at_ms}-{self.seq}"
+
+
+class ModerationList(models.Model):
+    """
+    Chat blocklist for one creator's rooms, or the global list when owner
+    is blank. Masked terms are starred out; blocked terms reject the
+    message. Saving bumps `version`, which invalidates compiled filters.
+    """
+    owner = models.CharField(max_length=255, blank=True, unique=True,
+                             help_text='Creator ID, or blank for the global list')
+    masked_terms = models.JSONField(default=list, blank=True)
+    blocked_terms = models.JSONField(default=list, blank=True)
+    block_links = models.BooleanField(default=False)
+    version = models.BigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Moderation list for {self.owner or 'all rooms'}"
+
+    def save(self, *args, **kwargs):
+        # Millisecond timestamps stay unique across delete and re-create
+        self.version = int(time.time() * 1000)
+        super().save(*args, **kwargs)
+
+
+class GiftLeaderboard(models.Model):
+    """Final gift leaderboard of one stream, flushed from Redis when the room finishes"""
+    room = models.CharField(max_length=255)
+    creator = models.CharField(max_length=255, blank=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField()
+    total_coins = models.BigIntegerField(default=0)
+    gift_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'finished_at'], name='unique_gift_leaderboard'),
+        ]
+
+    def __str__(self):
+        return f"{self.room} gifts ({self.finished_at:%Y-%m-%d %H:%M})"
+
+
+class GiftLeaderboardEntry(models.Model):
+    leaderboard = models.ForeignKey(GiftLeaderboard, on_delete=models.CASCADE, related_name='entries')
+    user_id = models.CharField(max_length=255)
+    rank = models.PositiveIntegerField()
+    coins = models.BigIntegerField()
+    gift_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['leaderboard', 'user_id'], name='unique_gift_leaderboard_entry'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.user_id}: {self.coins}"
+
+
+class ScheduledShow(models.Model):
+    """
+    A show with a known start time. Its LiveKit room is created shortly
+    before starts_at (see shows.py) so early joiners don't race the host.
+    Editing a pre-warmed show clears `metadata_synced`, and the next
+    scheduler pass pushes the new room metadata; moving its start puts it
+    back to scheduled so the room is created again for the new time. A
+    show is finished once its room finishes.
+    """
+    STATUS_SCHEDULED = 'scheduled'
+    STATUS_PREWARMED = 'prewarmed'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_SCHEDULED, 'Scheduled'),
+        (STATUS_PREWARMED, 'Pre-warmed'),
+        (STATUS_FINISHED, 'Finished'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    room_name = models.CharField(max_length=255, unique=True)
+    creator_id = models.CharField(max_length=255, db_index=True)
+    title = models.CharField(max_length=255, blank=True)
+    category = models.CharField(max_length=100, blank=True)
+    starts_at = models.DateTimeField(db_index=True)
+    expected_viewers = models.PositiveIntegerField(default=0)
+    max_participants = models.PositiveIntegerField(default=0, help_text='0 derives it from expected viewers')
+    metadata = models.JSONField(default=dict, blank=True, help_text='Extra room metadata')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_SCHEDULED, db_index=True)
+    metadata_synced = models.BooleanField(default=True)
+    attempts = models.PositiveIntegerField(default=0)
+    sync_attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    prewarmed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['starts_at']
+
+    def __str__(self):
+        return f"{self.title or self.room_name} at {self.starts_at:%Y-%m-%d %H:%M}"
+
+    def mark_edited(self, rescheduled=False):
+        """Queue a pre-warmed show's edit for the scheduler (before saving)"""
+        if self.status != self.STATUS_PREWARMED:
+            return
+        if rescheduled:
+            # The room's empty_timeout was computed from the old start
+            self.status, self.attempts, self.error, self.prewarmed_at = self.STATUS_SCHEDULED, 0, '', None
+            self.metadata_synced = True
+        else:
+            self.metadata_synced = False
+        self.sync_attempts = 0
+
+    def room_metadata(self):
+        """What goes in the LiveKit room's metadata (read back by the webhook receivers)"""
+        return {
+            **self.metadata,
+            'creator_id': self.creator_id,
+            'title': self.title,
+            'category': self.category,
+            'scheduled_start': int(self.starts_at.timestamp()),
+        }
@@ -0,0 +1,269 @@
+"""
+Chat moderation filter.
+
+Blocklists (one global, one per creator) are compiled into a single
+Aho-Corasick automaton per (creator, global version, creator version), so
+checking a message is one pass over its normalized text, linear in the
+message length however many terms are listed. Compiled automata are
+cached per process; list versions are re-read from Redis at most once per
+RELOAD_INTERVAL, so edits take effect without a restart.
+
+Text is normalized before matching: NFKD with combining marks removed,
+casefolded, common leetspeak substitutions undone and zero-width
+characters dropped. Blocklist terms go through the same normalization.
+Word boundaries are judged on the original text, where a leetspeak
+character only counts as a letter when a letter follows it outward, so
+"sh!t" is one word but "ass!" ends at the "!".
+"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from functools import lru_cache
+from django.conf import settings
+
+from apps.core.redis_client import decode, get_redis, make_key
+
+from .models import ModerationList
+
+MODERATION_CONFIG = getattr(settings, 'MODERATION_CONFIG', {})
+RELOAD_INTERVAL = MODERATION_CONFIG.get('RELOAD_INTERVAL', 1.0)
+CACHE_SIZE = MODERATION_CONFIG.get('CACHE_SIZE', 256)
+MASK_CHAR = MODERATION_CONFIG.get('MASK_CHAR', '*')
+
+GLOBAL_OWNER = ''
+
+MASK = 'mask'
+BLOCK = 'block'
+
+LEET_MAP = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's', '!': 'i', '|': 'l', '+': 't',
+}
+ZERO_WIDTH = {'\u200b', '\u200c', '\u200d', '\u2060', '\ufeff', '\u00ad'}
+LEET_TABLE = str.maketrans(LEET_MAP)
+
+LINK_RE = re.compile(
+    r'(?:https?://|www\.)\S+'
+    r'|\b[a-z0-9-]+\.(?:com|net|org|io|gg|ly|me|co|tv|xyz|app|link|info|biz)\b(?:/\S*)?',
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=4096)
+def _normalize_char(char):
+    if char in ZERO_WIDTH:
+        return ''
+    out = []
+    for c in unicodedata.normalize('NFKD', char):
+        if unicodedata.combining(c):
+            continue
+        for folded in c.casefold():
+            out.append(LEET_MAP.get(folded, folded))
+    return ''.join(out)
+
+
+def normalize(text):
+    """
+    Normalized text plus, for each normalized character, the index of the
+    original character it came from (for masking). Positions are None when
+    the mapping is one-to-one.
+    """
+    if text.isascii():
+        return text.lower().translate(LEET_TABLE), None
+
+    chars, positions = [], []
+    for index, char in enumerate(text):
+        for c in _normalize_char(char):
+            chars.append(c)
+            positions.append(index)
+    return ''.join(chars), positions
+
+
+def normalize_term(term):
+    return normalize(term.strip())[0]
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over normalized terms. Each term carries an
+    action (mask or block); matches must sit on word boundaries so that
+    blocking "ass" doesn't catch "class".
+    """
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.terms = []
+
+        for term, action in terms:
+            term = normalize_term(term)
+            if term:
+                self._add(term, action)
+        self._build()
+
+    def _add(self, term, action):
+        node = 0
+        for c in term:
+            nxt = self.goto[node].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = nxt
+        self.out[node] = self.out[node] + (len(self.terms),)
+        self.terms.append((term, action))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(c, 0)
+                self.fail[child] = target if target != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def find(self, text, on_boundaries):
+        """
+        Yield (start, end, term_index) for matches in normalized text for
+        which on_boundaries(start, end) is true
+        """
+        goto, fail, out, terms = self.goto, self.fail, self.out, self.terms
+        node = 0
+        for i, c in enumerate(text):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            for term_index in out[node]:
+                start = i - len(terms[term_index][0]) + 1
+                if on_boundaries(start, i + 1):
+                    yield start, i + 1, term_index
+
+
+def _ends_word(raw, index, step):
+    """
+    Whether raw[index], the character just outside a match, separates it
+    from the rest of the text. Walks past zero-width characters by `step`.
+    """
+    while 0 <= index < len(raw) and raw[index] in ZERO_WIDTH:
+        index += step
+    if index < 0 or index >= len(raw):
+        return True
+    char = raw[index]
+    if char in LEET_MAP:
+        following = index + step
+        return not (0 <= following < len(raw) and raw[following].isalpha())
+    return not char.isalnum()
+
+
+class Filter:
+    """Compiled moderation policy for one creator's room"""
+
+    def __init__(self, terms, block_links=False):
+        self.automaton = Automaton(terms)
+        self.block_links = block_links
+
+    def check(self, text):
+        """
+        Returns (allowed, text, matched_terms). Blocked messages come back
+        unchanged with allowed False; masked terms are starred out.
+        """
+        if self.block_links and LINK_RE.search(text):
+            return False, text, ['<link>']
+
+        normalized, positions = normalize(text)
+
+        def raw_span(start, end):
+            if positions is None:
+                return start, end
+            return positions[start], positions[end - 1] + 1
+
+        def on_boundaries(start, end):
+            start, end = raw_span(start, end)
+            return _ends_word(text, start - 1, -1) and _ends_word(text, end, 1)
+
+        spans, matched = [], []
+        for start, end, term_index in self.automaton.find(normalized, on_boundaries):
+            term, action = self.automaton.terms[term_index]
+            matched.append(term)
+            if action == BLOCK:
+                return False, text, matched
+            spans.append(raw_span(start, end))
+
+        if not spans:
+            return True, text, matched
+
+        chars = list(text)
+        for start, end in spans:
+            for i in range(start, end):
+                if not chars[i].isspace():
+                    chars[i] = MASK_CHAR
+        return True, ''.join(chars), matched
+
+
+def _version_key(owner):
+    return make_key('moderation', 'version', owner or 'global')
+
+
+def publish_version(owner, version):
+    get_redis().set(_version_key(owner), version)
+
+
+_versions = {}
+_filters = OrderedDict()
+
+
+def _current_version(owner):
+    """List version for an owner, re-read from Redis at most every RELOAD_INTERVAL"""
+    now = time.monotonic()
+    cached = _versions.get(owner)
+    if cached and now - cached[1] < RELOAD_INTERVAL:
+        return cached[0]
+
+    version = decode(get_redis().get(_version_key(owner)))
+    if version is None:
+        version = ModerationList.objects.filter(owner=owner).values_list('version', flat=True).first() or 0
+        publish_version(owner, version)
+    version = int(version)
+    _versions[owner] = (version, now)
+    return version
+
+
+def _compile(creator_id):
+    terms, block_links = [], False
+    for moderation_list in ModerationList.objects.filter(owner__in={GLOBAL_OWNER, creator_id}):
+        terms.extend((term, MASK) for term in moderation_list.masked_terms)
+        terms.extend((term, BLOCK) for term in moderation_list.blocked_terms)
+        block_links = block_links or moderation_list.block_links
+    return Filter(terms, block_links=block_links)
+
+
+def get_filter(creator_id=None):
+    """Compiled filter for a creator's rooms (global list only if None)"""
+    creator_id = creator_id or GLOBAL_OWNER
+    key = (creator_id, _current_version(GLOBAL_OWNER),
+           _current_version(creator_id) if creator_id else 0)
+
+    compiled = _filters.get(key)
+    if compiled is None:
+        compiled = _filters[key] = _compile(creator_id)
+        while len(_filters) > CACHE_SIZE:
+            _filters.popitem(last=False)
+    else:
+        _filters.move_to_end(key)
+    return compiled
+
+
+def check_message(text, creator_id=None):
+    return get_filter(creator_id).check(text)
@@ -0,0 +1,314 @@
+"""
+Versioned participant state per room, for cheap participant polling.
+
+Each room keeps in Redis:
+
+    pt:<room>:meta    hash    epoch, version, floor, refreshed_at, server_url
+    pt:<room>:state   hash    identity -> participant JSON
+    pt:<room>:log     zset    identity -> version of its latest change
+    pt:<room>:joined  hash    identity -> version it joined at
+    pt:<room>:left    zset    identity -> version it left at (tombstones)
+
+The change log is compacted by construction: it holds one entry per
+identity, the latest one. Once there are more than MAX_TOMBSTONES leaves,
+the oldest are dropped and `floor` moves up. A client asking for changes
+since a version below the floor gets a full snapshot instead.
+
+Versions restart at 0 when the state is cleared (room_finished, or
+STATE_TTL), so each incarnation of a room name gets a new `epoch`, the
+time its state was first written. Clients name a version as
+<epoch>:<version> (the ETag), and a version from another epoch always
+gets a snapshot.
+
+Clients that only need a few fields of a large room (?fields=identity,name)
+get just those fields streamed out: from the store while it is fresh, and
+otherwise from ListParticipants by whichever caller wins the refresh lock,
+which render_projected() parses as it arrives, so neither the upstream
+body nor the full list is ever held in memory. Callers that lose the lock
+get the stored (slightly stale) list, so a room costs at most one upstream
+stream per REFRESH_INTERVAL however many clients ask for fields.
+"""
+
+import json
+import time
+import requests
+from django.conf import settings
+
+from redis.exceptions import RedisError
+
+from apps.core.jsonstream import iter_array
+from apps.core.redis_client import decode, decode_hash, get_redis, get_script, make_key
+
+from .livekit import get_field
+
+PARTICIPANTS_CONFIG = getattr(settings, 'PARTICIPANTS_CONFIG', {})
+REFRESH_INTERVAL = PARTICIPANTS_CONFIG.get('REFRESH_INTERVAL', 2)
+MAX_TOMBSTONES = PARTICIPANTS_CONFIG.get('MAX_TOMBSTONES', 5000)
+STATE_TTL = PARTICIPANTS_CONFIG.get('STATE_TTL', 24 * 60 * 60)
+MAX_FIELDS = PARTICIPANTS_CONFIG.get('MAX_FIELDS', 10)
+# Bytes read from LiveKit, and written to the client, at a time when streaming
+READ_CHUNK_SIZE = PARTICIPANTS_CONFIG.get('READ_CHUNK_SIZE', 64 * 1024)
+WRITE_CHUNK_SIZE = PARTICIPANTS_CONFIG.get('WRITE_CHUNK_SIZE', 64 * 1024)
+# Participants read from the store per HSCAN when streaming it
+STORE_SCAN_COUNT = PARTICIPANTS_CONFIG.get('STORE_SCAN_COUNT', 1000)
+
+# KEYS meta, state, log, joined, left
+# ARGV[1] max tombstones, ARGV[2] ttl, ARGV[3] epoch for new state, then (op, identity, data) triples
+APPLY_SCRIPT = """
+redis.call('HSETNX', KEYS[1], 'epoch', ARGV[3])
+local version = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+local changed = 0
+for i = 4, #ARGV, 3 do
+    local op, identity, data = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if op == 'leave' then
+        if redis.call('HDEL', KEYS[2], identity) == 1 then
+            version = version + 1
+            redis.call('ZADD', KEYS[3], version, identity)
+            redis.call('HDEL', KEYS[4], identity)
+            redis.call('ZADD', KEYS[5], version, identity)
+            changed = changed + 1
+        end
+    else
+        local current = redis.call('HGET', KEYS[2], identity)
+        if current ~= data then
+            version = version + 1
+            if not current then
+                redis.call('HSET', KEYS[4], identity, version)
+                redis.call('ZREM', KEYS[5], identity)
+            end
+            redis.call('HSET', KEYS[2], identity, data)
+            redis.call('ZADD', KEYS[3], version, identity)
+            changed = changed + 1
+        end
+    end
+end
+if changed > 0 then
+    redis.call('HSET', KEYS[1], 'version', version)
+    local excess = redis.call('ZCARD', KEYS[5]) - tonumber(ARGV[1])
+    if excess > 0 then
+        local popped = redis.call('ZPOPMIN', KEYS[5], excess)
+        for j = 1, #popped, 2 do
+            redis.call('ZREM', KEYS[3], popped[j])
+        end
+        redis.call('HSET', KEYS[1], 'floor', popped[#popped])
+    end
+end
+for i = 1, #KEYS do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+return version
+"""
+
+# KEYS meta; ARGV refreshed_at
+# Only rooms already loaded: a missing refreshed_at means "never loaded"
+STALE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'refreshed_at') == 1 then
+    redis.call('HSET', KEYS[1], 'refreshed_at', ARGV[1])
+end
+"""
+
+
+def _keys(room_name):
+    return [make_key('pt', room_name, part) for part in ('meta', 'state', 'log', 'joined', 'left')]
+
+
+def _encode(participant):
+    return json.dumps(participant, sort_keys=True, separators=(',', ':'))
+
+
+def _apply(room_name, ops):
+    args = [MAX_TOMBSTONES, STATE_TTL, int(time.time() * 1000)]
+    for op, identity, data in ops:
+        args.extend([op, identity, data])
+    return get_script(APPLY_SCRIPT)(keys=_keys(room_name), args=args)
+
+
+def get_meta(room_name):
+    meta = decode_hash(get_redis().hgetall(_keys(room_name)[0]))
+    return {
+        'epoch': int(meta.get('epoch') or 0),
+        'version': int(meta.get('version') or 0),
+        'floor': int(meta.get('floor') or 0),
+        'refreshed_at': float(meta.get('refreshed_at') or 0),
+        'server_url': meta.get('server_url'),
+    }
+
+
+def needs_refresh(room_name, meta=None):
+    """
+    True if this caller should fetch from LiveKit. Only one caller per room
+    per REFRESH_INTERVAL gets True, even for a room never loaded yet.
+    """
+    meta = meta or get_meta(room_name)
+    if time.time() - meta['refreshed_at'] < REFRESH_INTERVAL:
+        return False
+    lock = make_key('pt', room_name, 'refreshing')
+    return bool(get_redis().set(lock, 1, nx=True, px=int(REFRESH_INTERVAL * 1000)))
+
+
+def wait_loaded(room_name, timeout=REFRESH_INTERVAL, poll=0.05):
+    """
+    Meta of a room once another caller's first load lands, waiting up to
+    `timeout` seconds; refreshed_at is still 0 if it didn't.
+    """
+    deadline = time.monotonic() + timeout
+    meta = get_meta(room_name)
+    while not meta['refreshed_at'] and time.monotonic() < deadline:
+        time.sleep(poll)
+        meta = get_meta(room_name)
+    return meta
+
+
+def apply_snapshot(room_name, participants, server_url=None):
+    """Diff a full ListParticipants result against the stored state"""
+    r = get_redis()
+    meta_key, state_key = _keys(room_name)[:2]
+
+    fetched = {p.get('identity'): p for p in participants if p.get('identity')}
+    known = {decode(i) for i in r.hkeys(state_key)}
+
+    ops = [('upsert', identity, _encode(p)) for identity, p in fetched.items()]
+    ops.extend(('leave', identity, '') for identity in known - fetched.keys())
+    version = _apply(room_name, ops)
+
+    fields = {'refreshed_at': time.time()}
+    if server_url:
+        fields['server_url'] = server_url
+    r.hset(meta_key, mapping=fields)
+    return version
+
+
+def participant_left(room_name, identity):
+    _apply(room_name, [('leave', identity, '')])
+
+
+def mark_stale(room_name):
+    """
+    Make the room due for a refresh. The refresh lock still admits one
+    caller per REFRESH_INTERVAL, so a join burst costs one fetch.
+    """
+    get_script(STALE_SCRIPT)(keys=_keys(room_name)[:1], args=[time.time() - REFRESH_INTERVAL])
+
+
+def clear_room(room_name):
+    r = get_redis()
+    r.delete(*_keys(room_name), make_key('pt', room_name, 'refreshing'))
+
+
+def snapshot(room_name):
+    state = get_redis().hgetall(_keys(room_name)[1])
+    return [json.loads(v) for v in state.values()]
+
+
+def parse_version(value):
+    """'<epoch>:<version>' -> (epoch, version); raises ValueError"""
+    epoch, _, version = value.strip().strip('"').partition(':')
+    return int(epoch), int(version)
+
+
+def changes_since(room_name, since, epoch):
+    """
+    Joins, updates and leaves after `since`, or None if `epoch` is an
+    earlier incarnation of the room or the compacted log no longer reaches
+    back that far, and a full snapshot is needed.
+    """
+    meta = get_meta(room_name)
+    if epoch != meta['epoch'] or since < meta['floor'] or since > meta['version']:
+        return None
+
+    r = get_redis()
+    _, state_key, log_key, joined_key, _ = _keys(room_name)
+    identities = r.zrangebyscore(log_key, f'({since}', '+inf')
+    if not identities:
+        return {'joined': [], 'updated': [], 'left': []}
+
+    pipe = r.pipeline()
+    pipe.hmget(state_key, identities)
+    pipe.hmget(joined_key, identities)
+    states, joined_at = pipe.execute()
+
+    changes = {'joined': [], 'updated': [], 'left': []}
+    for identity, data, joined_version in zip(identities, states, joined_at):
+        if data is None:
+            changes['left'].append(decode(identity))
+        elif int(joined_version or 0) > since:
+            changes['joined'].append(json.loads(data))
+        else:
+            changes['updated'].append(json.loads(data))
+    return changes
+
+
+def parse_fields(value):
+    """'identity,name' -> ['identity', 'name']; raises ValueError on bad names"""
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    if not fields:
+        raise ValueError('fields must name at least one participant field')
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f'at most {MAX_FIELDS} fields may be requested')
+    for field in fields:
+        if not field.replace('_', '').isalnum():
+            raise ValueError(f'invalid field: {field}')
+    return fields
+
+
+def project(participant, fields):
+    return {field: get_field(participant, field) for field in fields}
+
+
+def render_projected(room_name, response, fields, server_url=None, limit=None):
+    """
+    JSON body listing the room's participants with only `fields`, as byte
+    chunks, parsed from a streamed ListParticipants `response` (closed when
+    done). A body cut off upstream ends with status "error" rather than as
+    invalid JSON. `limit` keeps the first N in LiveKit's order; there is no
+    cursor, so has_more only says the list was cut.
+    """
+    head = {'room_name': room_name, 'fields': fields, 'server_url': server_url}
+    try:
+        yield from _render(
+            head, iter_array(response.iter_content(READ_CHUNK_SIZE), 'participants'), fields, limit,
+            (ValueError, requests.RequestException), 'participant list from LiveKit was cut off',
+        )
+    finally:
+        response.close()
+
+
+def render_stored(room_name, fields, meta, limit=None):
+    """
+    The same body as render_projected() from the store, scanned a chunk at
+    a time, with the `refreshed_at` of the room's `meta`. `limit` keeps the
+    first N in hash order.
+    """
+    head = {'room_name': room_name, 'fields': fields, 'server_url': meta['server_url'],
+            'refreshed_at': meta['refreshed_at']}
+    state = get_redis().hscan_iter(_keys(room_name)[1], count=STORE_SCAN_COUNT)
+    return _render(
+        head, (json.loads(value) for _, value in state), fields, limit,
+        (RedisError,), 'participant store read failed',
+    )
+
+
+def _render(head, source, fields, limit, errors, message):
+    head = json.dumps(head)
+    yield f'{head[:-1]}, "participants": ['.encode()
+
+    parts, size, count, has_more, error = [], 0, 0, False, None
+    try:
+        for participant in source:
+            if limit is not None and count >= limit:
+                has_more = True
+                break
+            encoded = json.dumps(project(participant, fields), separators=(',', ':'))
+            parts.append(encoded if not count else ',' + encoded)
+            size += len(parts[-1])
+            count += 1
+            if size >= WRITE_CHUNK_SIZE:
+                yield ''.join(parts).encode()
+                parts, size = [], 0
+    except errors as e:
+        error = str(e)
+
+    tail = {'count': count, 'has_more': has_more, 'status': 'success'}
+    if error:
+        tail.update(status='error', error=f'{message}: {error}')
+    yield (''.join(parts) + '], ' + json.dumps(tail)[1:]).encode()
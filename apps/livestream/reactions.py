@@ -0,0 +1,221 @@
+"""
+Windowed aggregation of reactions and gifts for data-channel broadcast.
+
+Hearts, likes and gift animations are not worth a packet each: a busy
+room produces thousands a second, and forwarding them one by one to
+SendData would swamp both LiveKit and the viewers' clients. Instead every
+event is folded into per-room counters in one MULTI round trip:
+
+    rx:<room>:counts   hash kind -> taps, plus 'coins' for gifts
+    rx:<room>:items    zset '<kind>:<item>' -> taps (gift types, emoji...)
+    rx:rooms           set of rooms with events since the last window
+
+A single broadcaster (the `broadcast_reactions` command, run as the
+`reactions` process in the Procfile and docker-compose; a leader lease in
+Redis keeps extra copies idle) drains every pending room once per window
+with one pipelined Lua call per room and sends each room one compact
+packet through a pooled RoomService client for its node:
+
+    {"type":"reactions","window_ms":150,"counts":{"heart":812},"coins":40,
+     "top":[{"kind":"gift","item":"rose","count":4}],"more":0}
+
+The window is WINDOW_MS at rest and stretches towards MAX_WINDOW_MS when a
+pass takes long, so the broadcaster never falls behind a burst. Packets
+are sent LOSSY by default: a missed window is an animation nobody notices.
+"""
+
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+from . import admission, endpoints
+from .livekit import LiveKitError, RoomServiceClient
+
+logger = logging.getLogger(__name__)
+
+REACTIONS_CONFIG = getattr(settings, 'REACTIONS_CONFIG', {})
+KINDS = REACTIONS_CONFIG.get('KINDS', ('heart', 'like', 'laugh', 'wow', 'fire', 'clap'))
+WINDOW_MS = REACTIONS_CONFIG.get('WINDOW_MS', 150)
+MAX_WINDOW_MS = REACTIONS_CONFIG.get('MAX_WINDOW_MS', 250)
+TOP_ITEMS = REACTIONS_CONFIG.get('TOP_ITEMS', 5)
+# Taps a client may report in one request (clients batch rapid taps)
+MAX_COUNT = REACTIONS_CONFIG.get('MAX_COUNT', 50)
+MAX_CONCURRENCY = REACTIONS_CONFIG.get('MAX_CONCURRENCY', 32)
+PACKET_KIND = REACTIONS_CONFIG.get('PACKET_KIND', 'LOSSY')
+TOPIC = REACTIONS_CONFIG.get('TOPIC', 'reactions')
+# Counters of a room nobody drains (broadcaster down) expire after this
+PENDING_TTL = REACTIONS_CONFIG.get('PENDING_TTL', 60)
+LEADER_TTL_MS = REACTIONS_CONFIG.get('LEADER_TTL_MS', 2000)
+
+GIFT = 'gift'
+ROOMS_KEY = make_key('rx', 'rooms')
+LEADER_KEY = make_key('rx', 'leader')
+
+# KEYS counts, items, rooms; ARGV room, top items
+DRAIN_SCRIPT = """
+local counts = redis.call('HGETALL', KEYS[1])
+local top = redis.call('ZREVRANGE', KEYS[2], 0, tonumber(ARGV[2]) - 1, 'WITHSCORES')
+local distinct = redis.call('ZCARD', KEYS[2])
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('SREM', KEYS[3], ARGV[1])
+return {counts, top, distinct}
+"""
+
+# KEYS leader; ARGV token, ttl ms
+LEADER_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# KEYS leader; ARGV token
+RESIGN_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_clients = {}
+
+
+def _keys(room_name):
+    return make_key('rx', room_name, 'counts'), make_key('rx', room_name, 'items')
+
+
+def record(room_name, kind, count=1, item='', coins=0):
+    """Fold `count` taps of `kind` (optionally of one item, e.g. a gift type) into the room's window"""
+    counts_key, items_key = _keys(room_name)
+    pipe = get_redis().pipeline()
+    pipe.hincrby(counts_key, kind, count)
+    if coins:
+        pipe.hincrby(counts_key, 'coins', coins)
+    if item:
+        pipe.zincrby(items_key, count, f'{kind}:{item}')
+        pipe.expire(items_key, PENDING_TTL)
+    pipe.expire(counts_key, PENDING_TTL)
+    pipe.sadd(ROOMS_KEY, room_name)
+    pipe.execute()
+
+
+def discard(room_name):
+    pipe = get_redis().pipeline()
+    pipe.delete(*_keys(room_name))
+    pipe.srem(ROOMS_KEY, room_name)
+    pipe.execute()
+
+
+def get_client(url):
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = RoomServiceClient(url, pool_size=MAX_CONCURRENCY)
+    return client
+
+
+def build_packet(counts, top, distinct, window_ms):
+    counts = {decode(counts[i]): int(counts[i + 1]) for i in range(0, len(counts), 2)}
+    coins = counts.pop('coins', 0)
+    items = []
+    for i in range(0, len(top), 2):
+        kind, _, item = decode(top[i]).partition(':')
+        items.append({'kind': kind, 'item': item, 'count': int(float(top[i + 1]))})
+    return {
+        'type': 'reactions',
+        'window_ms': window_ms,
+        'counts': counts,
+        'coins': coins,
+        'top': items,
+        'more': max(int(distinct) - len(items), 0),
+    }
+
+
+class Broadcaster:
+    """Drains pending rooms once per window and sends each one packet"""
+
+    def __init__(self, window_ms=None, max_window_ms=None, max_concurrency=None):
+        self.min_window = (window_ms or WINDOW_MS) / 1000
+        self.max_window = max((max_window_ms or MAX_WINDOW_MS) / 1000, self.min_window)
+        self.window = self.min_window
+        self.token = uuid.uuid4().hex
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency or MAX_CONCURRENCY)
+        self.totals = {'passes': 0, 'rooms': 0, 'events': 0, 'sent': 0, 'failed': 0}
+
+    def is_leader(self):
+        return bool(get_script(LEADER_SCRIPT)(keys=[LEADER_KEY], args=[self.token, LEADER_TTL_MS]))
+
+    def _send(self, url, room_name, packet):
+        get_client(url).send_data(
+            room_name, json.dumps(packet, separators=(',', ':')).encode(), kind=PACKET_KIND, topic=TOPIC,
+        )
+
+    def run_once(self):
+        """One window: drain every pending room and broadcast. Returns the pass's counts."""
+        r = get_redis()
+        rooms = [decode(room) for room in r.smembers(ROOMS_KEY)]
+        summary = {'rooms': len(rooms), 'events': 0, 'sent': 0, 'failed': 0}
+        if not rooms:
+            return summary
+
+        drain = get_script(DRAIN_SCRIPT)
+        pipe = r.pipeline(transaction=False)
+        pipe.hmget(admission.NODES_KEY, rooms)
+        for room_name in rooms:
+            drain(keys=[*_keys(room_name), ROOMS_KEY], args=[room_name, TOP_ITEMS], client=pipe)
+        nodes, *drained = pipe.execute()
+
+        default_url = None
+        window_ms = round(self.window * 1000)
+        futures = []
+        for room_name, node, (counts, top, distinct) in zip(rooms, nodes, drained):
+            packet = build_packet(counts, top, distinct, window_ms)
+            if not packet['counts']:
+                continue
+            summary['events'] += sum(packet['counts'].values())
+            url = decode(node)
+            if not url or url == admission.DEFAULT_NODE:
+                default_url = default_url or endpoints.best()['http_url']
+                url = default_url
+            futures.append((room_name, self.pool.submit(self._send, url, room_name, packet)))
+
+        for room_name, future in futures:
+            try:
+                future.result()
+                summary['sent'] += 1
+            except LiveKitError as e:
+                summary['failed'] += 1
+                logger.warning(f"Broadcasting reactions to {room_name} failed: {e}")
+        return summary
+
+    def run(self, should_stop=lambda: False):
+        while not should_stop():
+            started = time.monotonic()
+            if not self.is_leader():
+                time.sleep(LEADER_TTL_MS / 2000)
+                continue
+            try:
+                summary = self.run_once()
+            except Exception as e:
+                logger.error(f"Reaction broadcast pass failed: {e}")
+                time.sleep(self.max_window)
+                continue
+            self.totals['passes'] += 1
+            for key, value in summary.items():
+                self.totals[key] += value
+            elapsed = time.monotonic() - started
+            # Keep the broadcaster at most half busy, within the configured bounds
+            self.window = min(self.max_window, max(self.min_window, elapsed * 2))
+            time.sleep(max(self.window - elapsed, 0))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        get_script(RESIGN_SCRIPT)(keys=[LEADER_KEY], args=[self.token])
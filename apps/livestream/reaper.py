@@ -0,0 +1,170 @@
+"""
+Reconcile local room state against LiveKit.
+
+Webhooks get lost and rooms outlive their hosts, so a beat job
+periodically lists the rooms on every LiveKit node (concurrently, one
+ListRooms per node) and diffs them against the directory with set
+operations:
+
+    stale   = listed locally, gone from LiveKit  -> synthetic room_finished
+    missing = live in LiveKit, unknown locally   -> synthetic room_started
+    empty   = in LiveKit with nobody in it for
+              EMPTY_ROOM_TIMEOUT                 -> DeleteRoom
+
+A room's empty time runs from the first pass that saw it with nobody in
+it (reaper:empty_since, cleared once it has participants again), so a
+host who briefly drops out of an old room doesn't get it deleted. Empty
+rooms pre-warmed for a scheduled show (shows.py) are neither missing nor
+empty until their host is late by HOST_GRACE.
+
+Synthetic events go through the webhook_received signal, so every
+receiver (directory, participants, leaderboards, escrow, ...) cleans up
+exactly as it would for the real webhook. LiveKit calls and receiver
+fan-out run on a pool of MAX_CONCURRENCY threads, so a run costs roughly
+one ListRooms round trip plus (rooms to fix / MAX_CONCURRENCY) calls.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+
+from apps.core.redis_client import decode_hash, get_redis, make_key
+
+from . import admission, directory, endpoints, shows
+from .livekit import LIVEKIT_NODES, LiveKitError, RoomServiceClient, get_field, parse_metadata
+from .signals import webhook_received
+
+logger = logging.getLogger(__name__)
+
+REAPER_CONFIG = getattr(settings, 'ROOM_REAPER_CONFIG', {})
+MAX_CONCURRENCY = REAPER_CONFIG.get('MAX_CONCURRENCY', 8)
+# Rooms younger than this are left alone; their webhooks may be in flight
+GRACE_PERIOD = REAPER_CONFIG.get('GRACE_PERIOD', 120)
+EMPTY_ROOM_TIMEOUT = REAPER_CONFIG.get('EMPTY_ROOM_TIMEOUT', 10 * 60)
+MAX_DELETES = REAPER_CONFIG.get('MAX_DELETES', 500)
+LOCK_TIMEOUT = REAPER_CONFIG.get('LOCK_TIMEOUT', 5 * 60)
+
+LOCK_KEY = make_key('reaper', 'lock')
+# room -> time a pass first saw it empty
+EMPTY_SINCE_KEY = make_key('reaper', 'empty_since')
+
+_clients = {}
+
+
+def get_client(node):
+    client = _clients.get(node)
+    if client is None:
+        client = _clients[node] = RoomServiceClient(node, pool_size=MAX_CONCURRENCY)
+    return client
+
+
+def _run(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        # Receivers may touch the database from pool threads
+        connections.close_all()
+
+
+def _dispatch(event, room):
+    webhook_received.send_robust(
+        sender=reconcile, event=event, payload={'event': event, 'room': room, 'synthetic': True}
+    )
+
+
+def _delete(node, room_name):
+    get_client(node).delete_room(room_name)
+    _dispatch('room_finished', {'name': room_name})
+
+
+def reconcile(nodes=None, dry_run=False, now=None):
+    """
+    One reconciliation pass. Returns a summary dict, or None if another
+    pass holds the lock.
+    """
+    nodes = nodes or LIVEKIT_NODES or [endpoints.best()['http_url']]
+    now = now or time.time()
+    r = get_redis()
+    if not dry_run and not r.set(LOCK_KEY, 1, nx=True, ex=LOCK_TIMEOUT):
+        return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+            remote, failed = {}, []
+            for future, node in [(pool.submit(get_client(node).list_rooms), node) for node in nodes]:
+                try:
+                    rooms = future.result()
+                except LiveKitError as e:
+                    logger.warning(f"Room reconciliation could not list {node}: {e}")
+                    failed.append(node)
+                    continue
+                for room in rooms:
+                    remote[room['name']] = (node, room)
+
+            local = directory.live_rooms()
+            settled = {name for name, started_at in local.items() if now - started_at > GRACE_PERIOD}
+
+            # A room on an unreachable node would look stale; only close rooms
+            # when every node answered
+            stale = settled - remote.keys() if not failed else set()
+
+            empty_since = {name: float(ts) for name, ts in decode_hash(r.hgetall(EMPTY_SINCE_KEY)).items()}
+            empty, idle, waiting = [], set(), set()
+            for name, (node, room) in remote.items():
+                if get_field(room, 'num_participants'):
+                    continue
+                # Pre-warmed rooms wait for their host until the show's start + HOST_GRACE
+                if shows.holding(parse_metadata(get_field(room, 'metadata')), now):
+                    waiting.add(name)
+                    continue
+                idle.add(name)
+                if now - empty_since.get(name, now) > EMPTY_ROOM_TIMEOUT:
+                    empty.append((node, name))
+            empty = empty[:MAX_DELETES]
+            missing = remote.keys() - local.keys() - waiting - {name for _, name in empty}
+
+            summary = {
+                'nodes': len(nodes),
+                'failed_nodes': failed,
+                'remote_rooms': len(remote),
+                'local_rooms': len(local),
+                'stale': sorted(stale),
+                'missing': sorted(missing),
+                'empty': sorted(name for _, name in empty),
+            }
+            if dry_run:
+                return summary
+
+            # Rooms on a node that didn't answer keep their empty time
+            occupied = (empty_since.keys() - idle) & remote.keys() if failed else empty_since.keys() - idle
+            pipe = r.pipeline(transaction=False)
+            if occupied:
+                pipe.hdel(EMPTY_SINCE_KEY, *occupied)
+            for name in idle - empty_since.keys():
+                pipe.hset(EMPTY_SINCE_KEY, name, now)
+            pipe.execute()
+
+            if LIVEKIT_NODES:
+                admission.record_room_nodes({name: node for name, (node, _) in remote.items()})
+
+            jobs = [pool.submit(_run, _dispatch, 'room_finished', {'name': name}) for name in stale]
+            jobs += [pool.submit(_run, _dispatch, 'room_started', remote[name][1]) for name in missing]
+            deletes = [(pool.submit(_run, _delete, node, name), name) for node, name in empty]
+            for job in jobs:
+                job.result()
+
+            deleted = 0
+            for job, name in deletes:
+                try:
+                    job.result()
+                    r.hdel(EMPTY_SINCE_KEY, name)
+                    deleted += 1
+                except LiveKitError as e:
+                    logger.warning(f"Deleting empty room {name} failed: {e}")
+            summary['deleted'] = deleted
+            return summary
+    finally:
+        if not dry_run:
+            r.delete(LOCK_KEY)
@@ -0,0 +1,189 @@
+"""
+Signal receivers, connected in LivestreamConfig.ready().
+"""
+
+import logging
+import time
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import (
+    admission, directory, escrow, events, ingress, leaderboards, moderation, participants, reactions, shows,
+    subscriptions, tasks,
+)
+from .livekit import get_field, is_standard_participant, parse_metadata
+from .models import ModerationList
+from .signals import webhook_received
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(webhook_received)
+def update_room_directory(sender, event, payload, **kwargs):
+    room = payload.get('room') or {}
+    room_name = room.get('name')
+    if not room_name:
+        return
+
+    participant = payload.get('participant') or {}
+
+    if event == 'room_started':
+        metadata = parse_metadata(room.get('metadata'))
+        if shows.holding(metadata) and not get_field(room, 'num_participants'):
+            # Pre-warmed for a scheduled show; listed once the host joins
+            directory.register_room(room_name, creator=metadata.get('creator_id'),
+                                    category=metadata.get('category'), title=metadata.get('title'),
+                                    subscribers_only=metadata.get('subscribers_only'))
+            return
+        directory.room_started(
+            room_name,
+            started_at=get_field(room, 'creation_time'),
+            metadata=metadata,
+        )
+    elif event == 'room_finished':
+        directory.remove_room(room_name)
+    elif event == 'participant_joined' and is_standard_participant(participant):
+        metadata = parse_metadata(room.get('metadata'))
+        if metadata.get('scheduled_start') and participant.get('identity') == metadata.get('creator_id'):
+            directory.room_started(room_name, metadata=metadata)
+            events.publish(room_name, 'stream_status', {'status': 'live'})
+        viewers = directory.viewer_joined(room_name, participant.get('identity'))
+        if viewers is not None:
+            events.publish(room_name, 'viewers', {'count': viewers})
+    elif event == 'participant_left' and is_standard_participant(participant):
+        viewers = directory.viewer_left(room_name, participant.get('identity'))
+        if viewers is not None:
+            events.publish(room_name, 'viewers', {'count': viewers})
+
+
+@receiver(webhook_received)
+def update_participant_store(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    if event == 'participant_joined':
+        # Webhooks carry a partial participant; let the next poll fetch it
+        participants.mark_stale(room_name)
+    elif event == 'participant_left':
+        identity = (payload.get('participant') or {}).get('identity')
+        if identity:
+            participants.participant_left(room_name, identity)
+    elif event == 'room_finished':
+        participants.clear_room(room_name)
+
+
+@receiver(webhook_received)
+def publish_room_events(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    participant = payload.get('participant') or {}
+
+    if event == 'room_started':
+        room = payload.get('room') or {}
+        if not shows.holding(parse_metadata(room.get('metadata'))) or get_field(room, 'num_participants'):
+            events.publish(room_name, 'stream_status', {'status': 'live'})
+    elif event == 'room_finished':
+        events.publish(room_name, 'stream_status', {'status': 'ended'})
+    elif event in ('participant_joined', 'participant_left') and is_standard_participant(participant):
+        events.publish(room_name, event, {
+            'identity': participant.get('identity'),
+            'name': participant.get('name'),
+        })
+
+
+@receiver(webhook_received)
+def close_gift_leaderboard(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if event != 'room_finished' or not room_name:
+        return
+
+    closed_at = leaderboards.close_room(room_name)
+    if closed_at:
+        tasks.flush_gift_leaderboard.delay(room_name, closed_at)
+
+
+@receiver(webhook_received)
+def close_wallet_reservations(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    if event == 'participant_left':
+        identity = (payload.get('participant') or {}).get('identity')
+        if identity:
+            escrow.close_reservation(identity, room_name)
+    elif event == 'room_finished':
+        escrow.close_room(room_name)
+
+
+@receiver(webhook_received)
+def update_admission_leases(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    participant = payload.get('participant') or {}
+    identity = participant.get('identity')
+
+    if event == 'participant_joined' and identity and is_standard_participant(participant):
+        if identity != directory.get_room_creator(room_name):
+            admission.joined(room_name, identity)
+    elif event == 'participant_left' and identity:
+        admission.release(room_name, identity)
+    elif event == 'room_finished':
+        admission.close_room(room_name)
+
+
+@receiver(webhook_received)
+def recycle_room_ingress(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if event != 'room_finished' or not room_name:
+        return
+
+    if ingress.release(room_name):
+        tasks.refill_ingress_pools.delay()
+
+
+@receiver(webhook_received)
+def finish_scheduled_show(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if event == 'room_finished' and room_name:
+        shows.finish(room_name)
+
+
+@receiver(webhook_received)
+def discard_pending_reactions(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if event == 'room_finished' and room_name:
+        reactions.discard(room_name)
+
+
+@receiver(webhook_received)
+def track_live_subscribers(sender, event, payload, **kwargs):
+    room_name = (payload.get('room') or {}).get('name')
+    if not room_name:
+        return
+
+    participant = payload.get('participant') or {}
+
+    if event == 'participant_joined' and is_standard_participant(participant):
+        subscriptions.viewer_joined(room_name, participant.get('identity'))
+    elif event == 'participant_left':
+        subscriptions.viewer_left(room_name, participant.get('identity'))
+    elif event == 'room_finished':
+        subscriptions.clear_room(room_name)
+
+
+@receiver(post_save, sender=ModerationList)
+def publish_moderation_version(sender, instance, **kwargs):
+    transaction.on_commit(lambda: moderation.publish_version(instance.owner, instance.version))
+
+
+@receiver(post_delete, sender=ModerationList)
+def retire_moderation_version(sender, instance, **kwargs):
+    version = int(time.time() * 1000)
+    transaction.on_commit(lambda: moderation.publish_version(instance.owner, version))
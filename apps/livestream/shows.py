@@ -0,0 +1,182 @@
+"""
+Pre-warmed rooms for scheduled shows.
+
+A beat task looks for shows starting within PREWARM_LEAD and creates their
+rooms with RoomService.CreateRoom, MAX_CONCURRENCY calls at a time, so a
+slot with hundreds of simultaneous shows costs a few round trips rather
+than hundreds in a row. Each room gets
+
+    empty_timeout    = time until the start + HOST_GRACE
+    max_participants = the show's, or expected_viewers * PARTICIPANT_HEADROOM
+
+and the show's metadata with a `scheduled_start`. The receivers use it to
+keep a pre-warmed room out of the directory until its host joins, and the
+reaper uses it to leave the room alone while it waits for its host.
+
+Edits to pre-warmed shows are pushed the same way: update_metadata() sends
+UpdateRoomMetadata for a batch of rooms concurrently, giving up on a room
+after MAX_ATTEMPTS failed passes. CreateRoom returns the existing room if
+it is already there, so a retried show is harmless. When the room
+finishes the show is marked finished, so nothing is retried against a
+room that no longer exists.
+"""
+
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.redis_client import get_redis, make_key
+
+from . import endpoints
+from .livekit import LiveKitError
+from .models import ScheduledShow
+
+logger = logging.getLogger(__name__)
+
+SHOW_CONFIG = getattr(settings, 'SCHEDULED_SHOW_CONFIG', {})
+PREWARM_LEAD = SHOW_CONFIG.get('PREWARM_LEAD', 5 * 60)
+# How long a pre-warmed room waits for its host after the start time
+HOST_GRACE = SHOW_CONFIG.get('HOST_GRACE', 15 * 60)
+PARTICIPANT_HEADROOM = SHOW_CONFIG.get('PARTICIPANT_HEADROOM', 1.5)
+# For shows without an audience estimate; 0 is unlimited
+DEFAULT_MAX_PARTICIPANTS = SHOW_CONFIG.get('DEFAULT_MAX_PARTICIPANTS', 0)
+MAX_CONCURRENCY = SHOW_CONFIG.get('MAX_CONCURRENCY', 32)
+MAX_ATTEMPTS = SHOW_CONFIG.get('MAX_ATTEMPTS', 3)
+BATCH_SIZE = SHOW_CONFIG.get('BATCH_SIZE', 1000)
+LOCK_TIMEOUT = SHOW_CONFIG.get('LOCK_TIMEOUT', 2 * 60)
+
+LOCK_KEY = make_key('shows', 'lock')
+
+
+def holding(metadata, now=None):
+    """True while a pre-warmed room is waiting for its host"""
+    scheduled_start = metadata.get('scheduled_start')
+    if not scheduled_start:
+        return False
+    try:
+        return (now or time.time()) < float(scheduled_start) + HOST_GRACE
+    except (TypeError, ValueError):
+        return False
+
+
+def room_settings(show, now):
+    if show.max_participants:
+        max_participants = show.max_participants
+    elif show.expected_viewers:
+        max_participants = math.ceil(show.expected_viewers * PARTICIPANT_HEADROOM)
+    else:
+        max_participants = DEFAULT_MAX_PARTICIPANTS
+    return {
+        'name': show.room_name,
+        'empty_timeout': int(max(show.starts_at.timestamp() - now, 0) + HOST_GRACE),
+        'max_participants': max_participants,
+        'metadata': json.dumps(show.room_metadata()),
+    }
+
+
+def _batch(method, payloads):
+    """Call `method` once per payload, concurrently. Returns {index: error} for failures."""
+    def call(payload):
+        endpoints.call(method, payload)
+
+    failures = {}
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+        futures = [pool.submit(call, payload) for payload in payloads]
+        for i, future in enumerate(futures):
+            try:
+                future.result()
+            except LiveKitError as e:
+                failures[i] = str(e)
+    return failures
+
+
+def create_rooms(shows, now=None):
+    """CreateRoom for every show. Returns {room_name: error} for the ones that failed."""
+    now = now or time.time()
+    failures = _batch('CreateRoom', [room_settings(show, now) for show in shows])
+    return {shows[i].room_name: error for i, error in failures.items()}
+
+
+def update_metadata(updates):
+    """
+    Push room metadata for many rooms at once ({room_name: dict}).
+    Returns {room_name: error} for the ones that failed.
+    """
+    names = list(updates)
+    failures = _batch('UpdateRoomMetadata', [
+        {'room': name, 'metadata': json.dumps(updates[name])} for name in names
+    ])
+    return {names[i]: error for i, error in failures.items()}
+
+
+def finish(room_name):
+    """Mark the pre-warmed show using a room as finished. Returns True if there was one."""
+    return bool(ScheduledShow.objects.filter(
+        room_name=room_name, status=ScheduledShow.STATUS_PREWARMED,
+    ).update(status=ScheduledShow.STATUS_FINISHED))
+
+
+def prewarm(now=None):
+    """
+    One scheduler pass: create rooms for shows about to start and push
+    edited metadata. Returns a summary, or None if another pass holds the lock.
+    """
+    now = now or time.time()
+    r = get_redis()
+    if not r.set(LOCK_KEY, 1, nx=True, ex=LOCK_TIMEOUT):
+        return None
+
+    try:
+        current = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+        missed = ScheduledShow.objects.filter(
+            status=ScheduledShow.STATUS_SCHEDULED, starts_at__lt=current - timedelta(seconds=HOST_GRACE),
+        ).update(status=ScheduledShow.STATUS_FAILED, error='Start time passed before the room was created')
+
+        due = list(ScheduledShow.objects.filter(
+            status=ScheduledShow.STATUS_SCHEDULED, starts_at__lte=current + timedelta(seconds=PREWARM_LEAD),
+        )[:BATCH_SIZE])
+        failures = create_rooms(due, now) if due else {}
+        for show in due:
+            show.attempts += 1
+            if show.room_name in failures:
+                show.error = failures[show.room_name]
+                if show.attempts >= MAX_ATTEMPTS:
+                    show.status = ScheduledShow.STATUS_FAILED
+            else:
+                show.status = ScheduledShow.STATUS_PREWARMED
+                show.prewarmed_at = timezone.now()
+                show.metadata_synced = True
+                show.error = ''
+        ScheduledShow.objects.bulk_update(
+            due, ['status', 'attempts', 'error', 'prewarmed_at', 'metadata_synced'],
+        )
+        for room_name, error in failures.items():
+            logger.warning(f"Pre-warming room {room_name} failed: {error}")
+
+        edited = list(ScheduledShow.objects.filter(
+            status=ScheduledShow.STATUS_PREWARMED, metadata_synced=False, sync_attempts__lt=MAX_ATTEMPTS,
+        )[:BATCH_SIZE])
+        sync_failures = update_metadata({show.room_name: show.room_metadata() for show in edited}) if edited else {}
+        synced = [show.pk for show in edited if show.room_name not in sync_failures]
+        ScheduledShow.objects.filter(pk__in=synced).update(metadata_synced=True, sync_attempts=0)
+        unsynced = [show for show in edited if show.room_name in sync_failures]
+        for show in unsynced:
+            show.sync_attempts += 1
+            show.error = sync_failures[show.room_name]
+        ScheduledShow.objects.bulk_update(unsynced, ['sync_attempts', 'error'])
+        for room_name, error in sync_failures.items():
+            logger.warning(f"Updating metadata of {room_name} failed: {error}")
+    finally:
+        r.delete(LOCK_KEY)
+
+    return {
+        'prewarmed': len(due) - len(failures),
+        'failed': len(failures),
+        'missed': missed,
+        'metadata_synced': len(synced),
+    }
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent for every authenticated LiveKit webhook.
+# Arguments: event (e.g. "participant_joined"), payload (decoded JSON body)
+webhook_received = Signal()
+
+# Sent after an access token is issued.
+# Arguments: identity, room_name, role ("host" or "audience")
+token_issued = Signal()
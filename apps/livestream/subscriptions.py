@@ -0,0 +1,452 @@
+"""
+Local index of each creator's subscribers for gating subscriber-only rooms.
+
+A creator's subscribers are a compressed bitmap over integer user IDs,
+laid out like a roaring bitmap: IDs are split into chunks of CHUNK_BITS,
+and each chunk that holds anyone is one of two containers
+
+    subs:<creator>:<chunk>:a    set of offsets (Redis keeps small integer
+                                sets as a packed intset, 2 bytes per entry)
+    subs:<creator>:<chunk>      bitmap of CHUNK_BITS / 8 bytes, once the chunk
+                                has more than ARRAY_MAX members
+
+so a creator with a few thousand subscribers spread over tens of millions
+of user IDs costs kilobytes, and a dense range costs one bit per user.
+Alongside them:
+
+    subs:<creator>:chunks           set of chunk numbers present
+    subs:<creator>:meta             hash loaded_at, count
+    subs:<creator>:loading          token of the bulk load in progress
+    subs:<creator>:journal          events received during that load
+    subs:<creator>:load:...         the load's staging containers
+    subs:indexed                    zset creator -> loaded_at
+
+The index is bulk-loaded from the main app the first time a subscriber-only
+room of the creator needs it, then kept fresh by the subscribe/unsubscribe
+events the main app posts to us; REFRESH_INTERVAL reloads it in the
+background to repair any lost events. A load builds staging containers and
+swaps them in with one Lua call, replaying events that arrived while it
+ran, so readers never see a half-loaded index.
+
+Rooms keep the same structure for the users watching them
+(lvbits:<room>:...), so "subscribers currently watching" is a per-chunk
+intersection in one Lua call: BITOP AND for two bitmaps, membership tests
+for an intset.
+
+Checking a viewer at token issuance is one Lua call that reads the room's
+creator and subscribers_only flag from the directory and tests one bit.
+Keys are derived inside the scripts from ARGV prefixes; like the rest of
+the service they assume a single Redis, not a cluster.
+"""
+
+import time
+import uuid
+from django.conf import settings
+
+from apps.core.clients import MainAppClient
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+from . import directory
+
+SUBSCRIPTION_INDEX_CONFIG = getattr(settings, 'SUBSCRIPTION_INDEX_CONFIG', {})
+CHUNK_BITS = SUBSCRIPTION_INDEX_CONFIG.get('CHUNK_BITS', 65536)
+# Keep at or below Redis's set-max-intset-entries so small containers stay packed
+ARRAY_MAX = SUBSCRIPTION_INDEX_CONFIG.get('ARRAY_MAX', 512)
+LOAD_PAGE_SIZE = SUBSCRIPTION_INDEX_CONFIG.get('LOAD_PAGE_SIZE', 10000)
+LOAD_TTL = SUBSCRIPTION_INDEX_CONFIG.get('LOAD_TTL', 10 * 60)
+REFRESH_INTERVAL = SUBSCRIPTION_INDEX_CONFIG.get('REFRESH_INTERVAL', 6 * 60 * 60)
+MAX_EVENTS = SUBSCRIPTION_INDEX_CONFIG.get('MAX_EVENTS', 1000)
+MAX_LIVE_IDS = SUBSCRIPTION_INDEX_CONFIG.get('MAX_LIVE_IDS', 1000)
+VIEWER_TTL = SUBSCRIPTION_INDEX_CONFIG.get('VIEWER_TTL', 24 * 60 * 60)
+
+INDEXED_KEY = make_key('subs', 'indexed')
+
+SUBSCRIBED = 'subscribed'
+UNSUBSCRIBED = 'unsubscribed'
+EVENT_TYPES = (SUBSCRIBED, UNSUBSCRIBED)
+
+# check() results
+OPEN = 'open'  # not a subscriber-only room, or the viewer is its creator
+MEMBER = 'member'
+DENIED = 'denied'
+UNINDEXED = 'unindexed'  # the creator's index isn't loaded yet
+
+# Container helpers prepended to the scripts that read or change membership.
+# set_member returns the change in member count (-1, 0 or 1).
+CONTAINERS = """
+local function contains(base, chunk, offset)
+    local key = base .. ':' .. chunk
+    return redis.call('SISMEMBER', key .. ':a', offset) == 1 or redis.call('GETBIT', key, offset) == 1
+end
+
+local function set_member(base, chunk, offset, bit, array_max)
+    local key = base .. ':' .. chunk
+    if redis.call('EXISTS', key) == 1 then
+        return bit - redis.call('SETBIT', key, offset, bit)
+    end
+    if bit == 0 then
+        return -redis.call('SREM', key .. ':a', offset)
+    end
+    local added = redis.call('SADD', key .. ':a', offset)
+    if added == 1 and redis.call('SCARD', key .. ':a') > array_max then
+        for _, member in ipairs(redis.call('SMEMBERS', key .. ':a')) do
+            redis.call('SETBIT', key, member, 1)
+        end
+        redis.call('DEL', key .. ':a')
+    end
+    return added
+end
+"""
+
+# KEYS room hash; ARGV subscriber key prefix, identity, chunk, offset
+# Returns {result, creator}
+CHECK_SCRIPT = CONTAINERS + """
+local room = redis.call('HMGET', KEYS[1], 'creator', 'subscribers_only')
+local creator = room[1]
+if not creator or not room[2] or creator == ARGV[2] then
+    return {'open', creator or ''}
+end
+local base = ARGV[1] .. creator
+if redis.call('HEXISTS', base .. ':meta', 'loaded_at') == 0 then
+    return {'unindexed', creator}
+end
+if contains(base, ARGV[3], ARGV[4]) then
+    return {'member', creator}
+end
+return {'denied', creator}
+"""
+
+# KEYS chunks set, meta, loading, journal
+# ARGV base, chunk, offset, bit, array max, journal ttl
+# Returns the change in subscriber count, or false if the creator isn't indexed
+APPLY_SCRIPT = CONTAINERS + """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('RPUSH', KEYS[4], ARGV[2] .. ':' .. ARGV[3] .. ':' .. ARGV[4])
+    redis.call('EXPIRE', KEYS[4], ARGV[6])
+end
+if redis.call('HEXISTS', KEYS[2], 'loaded_at') == 0 then
+    return false
+end
+local bit = tonumber(ARGV[4])
+local delta = set_member(ARGV[1], ARGV[2], ARGV[3], bit, tonumber(ARGV[5]))
+if bit == 1 then
+    redis.call('SADD', KEYS[1], ARGV[2])
+end
+if delta ~= 0 then
+    redis.call('HINCRBY', KEYS[2], 'count', delta)
+end
+return delta
+"""
+
+# KEYS loading, journal, chunks set, staging chunks set, meta, indexed
+# ARGV token, base, staging base, now, count, creator, array max
+# Returns the subscriber count, or -1 if this load no longer holds the loading key
+SWAP_SCRIPT = CONTAINERS + """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return -1
+end
+local count = tonumber(ARGV[5])
+for _, entry in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    local chunk, offset, bit = string.match(entry, '^(%d+):(%d+):(%d)$')
+    count = count + set_member(ARGV[3], chunk, offset, tonumber(bit), tonumber(ARGV[7]))
+    redis.call('SADD', KEYS[4], chunk)
+end
+for _, chunk in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+    if redis.call('SISMEMBER', KEYS[4], chunk) == 0 then
+        redis.call('DEL', ARGV[2] .. ':' .. chunk, ARGV[2] .. ':' .. chunk .. ':a')
+    end
+end
+for _, chunk in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+    for _, suffix in ipairs({'', ':a'}) do
+        local staged, live = ARGV[3] .. ':' .. chunk .. suffix, ARGV[2] .. ':' .. chunk .. suffix
+        if redis.call('EXISTS', staged) == 1 then
+            redis.call('RENAME', staged, live)
+            redis.call('PERSIST', live)
+        else
+            redis.call('DEL', live)
+        end
+    end
+end
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('RENAME', KEYS[4], KEYS[3])
+    redis.call('PERSIST', KEYS[3])
+else
+    redis.call('DEL', KEYS[3])
+end
+redis.call('HSET', KEYS[5], 'loaded_at', ARGV[4], 'count', count)
+redis.call('ZADD', KEYS[6], ARGV[4], ARGV[6])
+redis.call('DEL', KEYS[1], KEYS[2])
+return count
+"""
+
+# KEYS chunks set; ARGV base, chunk, offset, bit, array max, ttl
+VIEWER_SCRIPT = CONTAINERS + """
+local key = ARGV[1] .. ':' .. ARGV[2]
+local delta = set_member(ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4]), tonumber(ARGV[5]))
+redis.call('EXPIRE', key, ARGV[6])
+redis.call('EXPIRE', key .. ':a', ARGV[6])
+if ARGV[4] == '1' then
+    redis.call('SADD', KEYS[1], ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[6])
+end
+return delta
+"""
+
+# KEYS chunks set a, chunks set b, scratch; ARGV base a, base b, with ids (1/0)
+# Returns {count, chunk, bitmap or offsets, chunk, ...}; chunks only with ids
+INTERSECT_SCRIPT = CONTAINERS + """
+local result = {0}
+local count = 0
+for _, chunk in ipairs(redis.call('SINTER', KEYS[1], KEYS[2])) do
+    local a, b = ARGV[1] .. ':' .. chunk, ARGV[2] .. ':' .. chunk
+    if redis.call('EXISTS', a) == 1 and redis.call('EXISTS', b) == 1 then
+        redis.call('BITOP', 'AND', KEYS[3], a, b)
+        local found = redis.call('BITCOUNT', KEYS[3])
+        count = count + found
+        if ARGV[3] == '1' and found > 0 then
+            table.insert(result, chunk)
+            table.insert(result, redis.call('GET', KEYS[3]))
+        end
+    else
+        local array, other = a .. ':a', ARGV[2]
+        if redis.call('EXISTS', array) == 0 then
+            array, other = b .. ':a', ARGV[1]
+        end
+        local offsets = {}
+        for _, offset in ipairs(redis.call('SMEMBERS', array)) do
+            if contains(other, chunk, offset) then
+                table.insert(offsets, tonumber(offset))
+            end
+        end
+        count = count + #offsets
+        if ARGV[3] == '1' and #offsets > 0 then
+            table.insert(result, chunk)
+            table.insert(result, offsets)
+        end
+    end
+end
+redis.call('DEL', KEYS[3])
+result[1] = count
+return result
+"""
+
+
+def _key(creator_id, *parts):
+    return make_key('subs', creator_id, *parts)
+
+
+def _viewer_key(room_name, *parts):
+    return make_key('lvbits', room_name, *parts)
+
+
+def user_bit(user_id):
+    """(chunk, offset) of an integer user ID, or None for identities that aren't one"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    if user_id < 0:
+        return None
+    return divmod(user_id, CHUNK_BITS)
+
+
+def check(room_name, identity):
+    """
+    Whether `identity` may watch `room_name`: (OPEN | MEMBER | DENIED |
+    UNINDEXED, creator_id). Identities that aren't user IDs can't be
+    subscribers.
+    """
+    position = user_bit(identity)
+    chunk, offset = position if position else (0, 0)
+    result, creator = get_script(CHECK_SCRIPT)(
+        keys=[directory.room_key(room_name)],
+        args=[make_key('subs', ''), identity, chunk, offset],
+    )
+    result, creator = decode(result), decode(creator) or None
+    if result == MEMBER and position is None:
+        result = DENIED
+    return result, creator
+
+
+def apply_events(events):
+    """
+    Apply subscribe/unsubscribe events ({'type', 'user_id', 'creator_id'})
+    in one round trip. Events for creators without an index are dropped;
+    their first load reads the current state. Returns how many changed it.
+    """
+    script = get_script(APPLY_SCRIPT)
+    pipe = get_redis().pipeline(transaction=False)
+    for event in events:
+        position = user_bit(event['user_id'])
+        if position is None:
+            continue
+        chunk, offset = position
+        creator_id = event['creator_id']
+        script(
+            keys=[
+                _key(creator_id, 'chunks'), _key(creator_id, 'meta'),
+                _key(creator_id, 'loading'), _key(creator_id, 'journal'),
+            ],
+            args=[_key(creator_id), chunk, offset, 1 if event['type'] == SUBSCRIBED else 0, ARRAY_MAX, LOAD_TTL],
+            client=pipe,
+        )
+    return sum(1 for delta in pipe.execute() if delta) if len(pipe) else 0
+
+
+def _offsets(bitmap, limit=None):
+    """Set bit positions of a Redis bitmap, ascending (bit 0 is the high bit of byte 0)"""
+    offsets = []
+    for index, byte in enumerate(bitmap):
+        if not byte:
+            continue
+        for bit in range(8):
+            if byte & (0x80 >> bit):
+                offsets.append(index * 8 + bit)
+                if limit is not None and len(offsets) >= limit:
+                    return offsets
+    return offsets
+
+
+def _fetch_bitmaps(creator_id, client):
+    """The creator's subscribers as {chunk: bytearray}, or None if a page failed"""
+    chunks = {}
+    cursor = None
+    while True:
+        page = client.get_creator_subscribers(creator_id, cursor=cursor, page_size=LOAD_PAGE_SIZE)
+        if page is None:
+            return None
+        for user_id in page.get('user_ids') or ():
+            position = user_bit(user_id)
+            if position is None:
+                continue
+            chunk, offset = position
+            bitmap = chunks.get(chunk)
+            if bitmap is None:
+                bitmap = chunks[chunk] = bytearray(CHUNK_BITS // 8)
+            bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+        cursor = page.get('next_cursor')
+        if not cursor:
+            return chunks
+
+
+def load(creator_id, client=None):
+    """
+    (Re)build a creator's index from the main app. Returns the subscriber
+    count, or None if another load is running or the main app failed.
+    """
+    r = get_redis()
+    token = uuid.uuid4().hex
+    if not r.set(_key(creator_id, 'loading'), token, nx=True, ex=LOAD_TTL):
+        return None
+
+    staging = _key(creator_id, 'load')
+    try:
+        _discard_staging(r, creator_id)
+        chunks = _fetch_bitmaps(creator_id, client or MainAppClient())
+        if chunks is None:
+            return None
+
+        count = 0
+        pipe = r.pipeline(transaction=False)
+        for chunk, bitmap in chunks.items():
+            members = int.from_bytes(bitmap, 'big').bit_count()
+            count += members
+            if members > ARRAY_MAX:
+                pipe.set(f'{staging}:{chunk}', bytes(bitmap), ex=LOAD_TTL)
+            else:
+                pipe.sadd(f'{staging}:{chunk}:a', *_offsets(bitmap))
+                pipe.expire(f'{staging}:{chunk}:a', LOAD_TTL)
+            pipe.sadd(f'{staging}:chunks', chunk)
+        pipe.expire(f'{staging}:chunks', LOAD_TTL)
+        pipe.execute()
+
+        count = get_script(SWAP_SCRIPT)(
+            keys=[
+                _key(creator_id, 'loading'), _key(creator_id, 'journal'), _key(creator_id, 'chunks'),
+                f'{staging}:chunks', _key(creator_id, 'meta'), INDEXED_KEY,
+            ],
+            args=[token, _key(creator_id), staging, int(time.time()), count, creator_id, ARRAY_MAX],
+        )
+        return count if count >= 0 else None
+    finally:
+        if decode(r.get(_key(creator_id, 'loading'))) == token:
+            _discard_staging(r, creator_id)
+            r.delete(_key(creator_id, 'loading'), _key(creator_id, 'journal'))
+
+
+def _chunk_keys(r, base):
+    keys = [f'{base}:chunks']
+    for chunk in r.smembers(f'{base}:chunks'):
+        chunk = decode(chunk)
+        keys += [f'{base}:{chunk}', f'{base}:{chunk}:a']
+    return keys
+
+
+def _discard_staging(r, creator_id):
+    r.delete(*_chunk_keys(r, _key(creator_id, 'load')))
+
+
+def claim_load(creator_id):
+    """True if the caller should queue a load: at most one is queued per LOAD_TTL"""
+    return bool(get_redis().set(_key(creator_id, 'load_queued'), 1, nx=True, ex=LOAD_TTL))
+
+
+def due_for_refresh(now=None):
+    """Indexed creators whose last load is older than REFRESH_INTERVAL"""
+    cutoff = (now or time.time()) - REFRESH_INTERVAL
+    return [decode(creator) for creator in get_redis().zrangebyscore(INDEXED_KEY, '-inf', cutoff)]
+
+
+def stats(creator_id):
+    meta = get_redis().hmget(_key(creator_id, 'meta'), 'loaded_at', 'count')
+    loaded_at, count = (decode(v) for v in meta)
+    return {
+        'indexed': loaded_at is not None,
+        'loaded_at': int(loaded_at) if loaded_at else None,
+        'subscribers': int(count or 0),
+    }
+
+
+def viewer_joined(room_name, identity):
+    _set_viewer(room_name, identity, 1)
+
+
+def viewer_left(room_name, identity):
+    _set_viewer(room_name, identity, 0)
+
+
+def _set_viewer(room_name, identity, bit):
+    position = user_bit(identity)
+    if position is None:
+        return
+    chunk, offset = position
+    get_script(VIEWER_SCRIPT)(
+        keys=[_viewer_key(room_name, 'chunks')],
+        args=[_viewer_key(room_name), chunk, offset, bit, ARRAY_MAX, VIEWER_TTL],
+    )
+
+
+def clear_room(room_name):
+    r = get_redis()
+    r.delete(*_chunk_keys(r, _viewer_key(room_name)))
+
+
+def live_subscribers(room_name, creator_id, with_ids=False, limit=MAX_LIVE_IDS):
+    """
+    Subscribers of `creator_id` watching `room_name` right now: {'count',
+    'user_ids'} (IDs only with `with_ids`, at most `limit`, ascending).
+    """
+    reply = get_script(INTERSECT_SCRIPT)(
+        keys=[_key(creator_id, 'chunks'), _viewer_key(room_name, 'chunks'), make_key('subs', 'and', uuid.uuid4().hex)],
+        args=[_key(creator_id), _viewer_key(room_name), 1 if with_ids else 0],
+    )
+    result = {'count': reply[0], 'user_ids': None}
+    if with_ids:
+        user_ids = []
+        for chunk, members in sorted(zip((int(c) for c in reply[1::2]), reply[2::2])):
+            if len(user_ids) >= limit:
+                break
+            offsets = _offsets(members, limit) if isinstance(members, bytes) else sorted(members)
+            user_ids += [chunk * CHUNK_BITS + offset for offset in offsets[:limit - len(user_ids)]]
+        result['user_ids'] = user_ids
+    return result
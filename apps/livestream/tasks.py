@@ -0,0 +1,125 @@
+import logging
+from celery import shared_task
+
+from . import chat, endpoints, escrow, ingress, leaderboards, reaper, shows, subscriptions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def archive_chat_history():
+    """Move chat from the per-room Redis Streams into Postgres"""
+    total = 0
+    for room_name in chat.rooms_with_history():
+        try:
+            total += chat.archive_room(room_name) or 0
+        except Exception as e:
+            logger.error(f"Archiving chat for {room_name} failed: {e}")
+    if total:
+        logger.info(f"Archived {total} chat messages")
+    return total
+
+
+@shared_task
+def archive_chat_room(room_name):
+    """Archive one room whose stream is over MAX_LENGTH before the next beat"""
+    return chat.archive_room(room_name)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def flush_gift_leaderboard(self, room_name, closed_at):
+    """Persist a finished room's gift leaderboard"""
+    try:
+        written = leaderboards.flush_room(room_name, closed_at)
+    except Exception as e:
+        logger.error(f"Flushing gift leaderboard for {room_name} failed: {e}")
+        raise self.retry(exc=e)
+    logger.info(f"Flushed {written} gift leaderboard entries for {room_name}")
+    return written
+
+
+@shared_task
+def flush_pending_gift_leaderboards():
+    """Pick up closed leaderboards whose flush task was lost"""
+    for room_name, closed_at in leaderboards.pending_boards(older_than=leaderboards.FLUSH_GRACE):
+        flush_gift_leaderboard.delay(room_name, closed_at)
+
+
+@shared_task
+def settle_wallet_reservations():
+    """Close idle gift allowances and report spending to the main app"""
+    idle = escrow.close_idle()
+    settled = escrow.settle()
+    if idle or settled:
+        logger.info(f"Closed {idle} idle wallet reservations, settled {settled}")
+    return settled
+
+
+@shared_task
+def reconcile_rooms():
+    """Close rooms LiveKit no longer has and delete long-empty ones"""
+    summary = reaper.reconcile()
+    if summary is None:
+        logger.info("Room reconciliation already running, skipped")
+        return None
+    if summary['stale'] or summary['missing'] or summary['deleted']:
+        logger.info(
+            f"Reconciled rooms: closed {len(summary['stale'])} stale, "
+            f"added {len(summary['missing'])} missing, deleted {summary['deleted']} empty"
+        )
+    return {key: summary[key] for key in ('remote_rooms', 'local_rooms', 'deleted')}
+
+
+@shared_task
+def probe_livekit_endpoints():
+    """Refresh the RTT/availability table used to pick a LiveKit endpoint"""
+    table = endpoints.probe_all()
+    down = [name for name, entry in table.items() if not entry['healthy']]
+    if down:
+        logger.warning(f"LiveKit endpoints unhealthy: {', '.join(down)}")
+    return {name: entry.get('ewma_rtt_ms') for name, entry in table.items()}
+
+
+@shared_task
+def refill_ingress_pools():
+    """Replace used ingresses and keep every node's pool of idle ones full"""
+    summary = ingress.refill()
+    if summary and (summary['created'] or summary['deleted'] or summary['failed']):
+        logger.info(
+            f"Ingress pools: created {summary['created']}, deleted {summary['deleted']}, "
+            f"{summary['failed']} creates failed"
+        )
+    return summary
+
+
+@shared_task
+def prewarm_scheduled_shows():
+    """Create rooms for shows about to start and push edited show metadata"""
+    summary = shows.prewarm()
+    if summary and any(summary.values()):
+        logger.info(
+            f"Scheduled shows: pre-warmed {summary['prewarmed']}, {summary['failed']} failed, "
+            f"{summary['missed']} missed, metadata synced for {summary['metadata_synced']}"
+        )
+    return summary
+
+
+@shared_task
+def load_subscriber_index(creator_id):
+    """Bulk-load a creator's subscriber bitmap from the main app"""
+    count = subscriptions.load(creator_id)
+    if count is None:
+        logger.warning(f"Subscriber index load for creator {creator_id} skipped or failed")
+    else:
+        logger.info(f"Loaded {count} subscribers of creator {creator_id}")
+    return count
+
+
+@shared_task
+def refresh_subscriber_indexes():
+    """Reload indexes older than REFRESH_INTERVAL to repair missed subscription events"""
+    creators = subscriptions.due_for_refresh()
+    for creator_id in creators:
+        if subscriptions.claim_load(creator_id):
+            load_subscriber_index.delay(creator_id)
+    return len(creators)
@@ -1,3 +1,263 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from apps.core.redis_client import make_key
+from apps.core.testing import RedisTestCase
+
+from . import admission, directory, escrow, subscriptions
+
+
+class FakeMainApp:
+    """Grants every reservation in full and acknowledges every settlement"""
+
+    def __init__(self):
+        self.reserved = []
+        self.settlements = []
+        self.during_settle = None
+
+    def reserve_user_coins(self, user_id, amount, reference=None, reservation_id=None):
+        self.reserved.append((user_id, amount, reservation_id))
+        return {'reservation_id': reservation_id or f'res-{len(self.reserved)}', 'amount': amount}
+
+    def settle_reservations(self, settlements):
+        self.settlements.append(settlements)
+        if self.during_settle:
+            self.during_settle()
+        return {s['reservation_id'] for s in settlements}
+
+
+class EscrowTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        self.main_app = FakeMainApp()
+        patcher = mock.patch.object(escrow, 'MainAppClient', return_value=self.main_app)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def dirty(self):
+        return {m.decode() for m in self.redis.zrange(escrow.DIRTY_KEY, 0, -1)}
+
+    def test_gifts_are_debited_from_one_reservation(self):
+        self.assertEqual(escrow.debit('u1', 'room', 'c1', 30), escrow.ALLOWANCE - 30)
+        self.assertEqual(escrow.debit('u1', 'room', 'c1', 20), escrow.ALLOWANCE - 50)
+
+        self.assertEqual(len(self.main_app.reserved), 1)
+        self.assertEqual(escrow.get_reservation('u1', 'room')['spent'], 50)
+        self.assertEqual(self.dirty(), {'u1|room'})
+
+    def test_debit_past_the_allowance_tops_up(self):
+        escrow.debit('u1', 'room', 'c1', escrow.ALLOWANCE - 10)
+        escrow.debit('u1', 'room', 'c1', 50)
+
+        reservation = escrow.get_reservation('u1', 'room')
+        self.assertEqual(reservation['spent'], escrow.ALLOWANCE + 40)
+        self.assertEqual(self.main_app.reserved[1][2], reservation['reservation_id'])
+
+    def test_debit_never_spends_past_what_was_granted(self):
+        escrow.open_reservation('u1', 'room', 'c1', amount=100, client=self.main_app)
+        self.main_app.reserve_user_coins = lambda *args, **kwargs: {'amount': 0}
+
+        with self.assertRaises(escrow.InsufficientCoins):
+            escrow.debit('u1', 'room', 'c1', 101)
+        self.assertEqual(escrow.get_reservation('u1', 'room')['spent'], 0)
+
+    def test_settle_reports_cumulative_spending_once(self):
+        escrow.debit('u1', 'room', 'c1', 30)
+        escrow.debit('u1', 'room', 'c1', 5)
+
+        self.assertEqual(escrow.settle(), 1)
+        [[settlement]] = self.main_app.settlements
+        self.assertEqual((settlement['spent'], settlement['release']), (35, False))
+        self.assertEqual(self.dirty(), set())
+        self.assertEqual(escrow.get_reservation('u1', 'room')['spent'], 35)
+
+        self.assertEqual(escrow.settle(), 0)
+        self.assertEqual(len(self.main_app.settlements), 1)
+
+    def test_closed_reservation_is_released_and_removed(self):
+        escrow.debit('u1', 'room', 'c1', 30)
+        escrow.close_room('room')
+
+        with self.assertRaises(escrow.ReservationClosing):
+            escrow.debit('u1', 'room', 'c1', 1)
+        escrow.settle()
+
+        [[settlement]] = self.main_app.settlements
+        self.assertEqual((settlement['spent'], settlement['release']), (30, True))
+        self.assertIsNone(escrow.get_reservation('u1', 'room'))
+        self.assertEqual(self.redis.smembers(make_key('wallet', 'room', 'room')), set())
+        self.assertEqual(self.dirty(), set())
+
+    def test_close_during_settlement_still_owes_the_release(self):
+        escrow.debit('u1', 'room', 'c1', 30)
+        self.main_app.during_settle = lambda: escrow.close_reservation('u1', 'room')
+        escrow.settle()
+
+        # That settlement didn't release, so the closed reservation stays dirty
+        self.assertTrue(escrow.get_reservation('u1', 'room')['closing'])
+        self.assertEqual(self.dirty(), {'u1|room'})
+
+        self.main_app.during_settle = None
+        escrow.settle()
+        released = self.main_app.settlements[-1][0]
+        self.assertEqual((released['spent'], released['release']), (30, True))
+        self.assertIsNone(escrow.get_reservation('u1', 'room'))
+        self.assertEqual(self.dirty(), set())
+
+    def test_debit_during_settlement_stays_dirty(self):
+        escrow.debit('u1', 'room', 'c1', 30)
+        self.main_app.during_settle = lambda: escrow.debit('u1', 'room', 'c1', 10)
+        escrow.settle()
+
+        self.assertEqual(self.dirty(), {'u1|room'})
+        self.main_app.during_settle = None
+        escrow.settle()
+        self.assertEqual(self.main_app.settlements[-1][0]['spent'], 40)
+        self.assertEqual(self.dirty(), set())
+
+
+class AdmissionTests(RedisTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, value in (('ROOM_LIMIT', 2), ('HLS_FALLBACK_URL', '')):
+            patcher = mock.patch.object(admission, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.now = time.time()
+
+    def admit(self, identity, after=0):
+        return admission.admit('room', identity, now=self.now + after)
+
+    def test_full_room_queues_viewers_in_arrival_order(self):
+        self.assertTrue(self.admit('a')['admitted'])
+        self.assertTrue(self.admit('b')['admitted'])
+
+        self.assertEqual(self.admit('c')['position'], 1)
+        self.assertEqual(self.admit('d', after=1)['position'], 2)
+        # Polling again keeps a viewer's place
+        self.assertEqual(self.admit('c', after=2)['position'], 1)
+
+    def test_freed_seat_goes_to_the_head_of_the_queue(self):
+        self.admit('a')
+        self.admit('b')
+        self.admit('c')
+        self.admit('d', after=1)
+        admission.release('room', 'a')
+
+        self.assertFalse(self.admit('d', after=2)['admitted'])
+        self.assertFalse(self.admit('e', after=2)['admitted'])
+        self.assertTrue(self.admit('c', after=3)['admitted'])
+
+        admission.release('room', 'b')
+        self.assertTrue(self.admit('d', after=4)['admitted'])
+
+    def test_waiters_who_stop_polling_lose_their_place(self):
+        self.admit('a')
+        self.admit('b')
+        self.admit('c')
+        self.admit('d', after=1)
+        admission.release('room', 'a')
+
+        # c hasn't polled for QUEUE_TTL, so d is next
+        self.assertTrue(self.admit('d', after=admission.QUEUE_TTL)['admitted'])
+        self.assertEqual(self.admit('c', after=admission.QUEUE_TTL + 2)['position'], 1)
+
+
+class FakeSubscriberSource:
+    """Pages of a creator's subscriber IDs, calling `during_load` after the first"""
+
+    def __init__(self, user_ids, page_size=2):
+        self.pages = [user_ids[i:i + page_size] for i in range(0, len(user_ids), page_size)] or [[]]
+        self.during_load = None
+
+    def get_creator_subscribers(self, creator_id, cursor=None, page_size=None):
+        index = int(cursor or 0)
+        if index == 1 and self.during_load:
+            self.during_load()
+        next_cursor = str(index + 1) if index + 1 < len(self.pages) else None
+        return {'user_ids': self.pages[index], 'next_cursor': next_cursor}
+
+
+class SubscriptionIndexTests(RedisTestCase):
+    creator = '42'
+
+    def setUp(self):
+        super().setUp()
+        for name, value in (('CHUNK_BITS', 1024), ('ARRAY_MAX', 3)):
+            patcher = mock.patch.object(subscriptions, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        directory.register_room('room', creator=self.creator, subscribers_only=True)
+
+    def load(self, user_ids, during_load=None):
+        source = FakeSubscriberSource(user_ids)
+        source.during_load = during_load
+        return subscriptions.load(self.creator, client=source)
+
+    def check(self, identity):
+        return subscriptions.check('room', identity)[0]
+
+    def event(self, kind, user_id):
+        return {'type': kind, 'user_id': user_id, 'creator_id': self.creator}
+
+    def test_unloaded_creator_is_unindexed(self):
+        self.assertEqual(self.check('5'), subscriptions.UNINDEXED)
+        self.assertEqual(self.check(self.creator), subscriptions.OPEN)
+
+    def test_sparse_chunks_are_sets_and_dense_chunks_bitmaps(self):
+        self.assertEqual(self.load([5, 7, 2000, 2001, 2002, 2003]), 6)
+
+        self.assertEqual(self.redis.type(subscriptions._key(self.creator, 0, 'a')), b'set')
+        self.assertEqual(self.redis.type(subscriptions._key(self.creator, 1)), b'string')
+        for user_id in ('5', '7', '2000', '2003'):
+            self.assertEqual(self.check(user_id), subscriptions.MEMBER)
+        for identity in ('6', '2004', 'guest'):
+            self.assertEqual(self.check(identity), subscriptions.DENIED)
+
+    def test_events_update_the_loaded_index(self):
+        self.load([5, 7])
+        changed = subscriptions.apply_events([
+            self.event(subscriptions.SUBSCRIBED, 8),
+            self.event(subscriptions.SUBSCRIBED, 9),
+            self.event(subscriptions.UNSUBSCRIBED, 5),
+            self.event(subscriptions.SUBSCRIBED, 7),
+        ])
+
+        self.assertEqual(changed, 3)
+        # The set outgrew ARRAY_MAX and became a bitmap
+        self.assertFalse(self.redis.exists(subscriptions._key(self.creator, 0, 'a')))
+        self.assertEqual(self.check('9'), subscriptions.MEMBER)
+        self.assertEqual(self.check('5'), subscriptions.DENIED)
+        self.assertEqual(subscriptions.stats(self.creator)['subscribers'], 3)
+
+    def test_events_during_a_load_are_replayed_over_it(self):
+        def events_arrive():
+            subscriptions.apply_events([
+                self.event(subscriptions.UNSUBSCRIBED, 5),
+                self.event(subscriptions.SUBSCRIBED, 3000),
+            ])
+
+        # 5 is in the page already fetched; the load would otherwise revive it
+        self.assertEqual(self.load([5, 7, 9], during_load=events_arrive), 3)
+
+        self.assertEqual(self.check('5'), subscriptions.DENIED)
+        self.assertEqual(self.check('3000'), subscriptions.MEMBER)
+        self.assertEqual(self.check('9'), subscriptions.MEMBER)
+        self.assertFalse(self.redis.exists(subscriptions._key(self.creator, 'journal')))
+
+    def test_reload_drops_chunks_that_emptied(self):
+        self.load([5, 2000])
+        self.load([5])
+
+        self.assertEqual(self.check('2000'), subscriptions.DENIED)
+        self.assertFalse(self.redis.exists(subscriptions._key(self.creator, 1, 'a')))
+        self.assertEqual(subscriptions.stats(self.creator)['subscribers'], 1)
+
+    def test_live_subscribers_intersects_viewers_with_the_index(self):
+        self.load([5, 7, 2000, 2001, 2002, 2003])
+        for identity in ('5', '6', '2001', '2002', '2005', 'guest'):
+            subscriptions.viewer_joined('room', identity)
+        subscriptions.viewer_left('room', '2002')
+
+        live = subscriptions.live_subscribers('room', self.creator, with_ids=True)
+        self.assertEqual(live, {'count': 2, 'user_ids': [5, 2001]})
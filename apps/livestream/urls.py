@@ -8,4 +8,18 @@ urlpatterns = [
     path('v1/livestream/test-connection/', views.test_connection, name='test_connection'),
     path('v1/livestream/rooms/', views.list_rooms, name='list_rooms'),
     path('v1/livestream/rooms/<str:room_name>/participants/', views.list_participants, name='list_participants'),
+    path('v1/livestream/rooms/<str:room_name>/events/', views.room_events, name='room_events'),
+    path('v1/livestream/rooms/<str:room_name>/chat/', views.room_chat, name='room_chat'),
+    path('v1/livestream/rooms/<str:room_name>/gifts/', views.send_gift, name='send_gift'),
+    path('v1/livestream/rooms/<str:room_name>/reactions/', views.send_reaction, name='send_reaction'),
+    path('v1/livestream/rooms/<str:room_name>/wallet/', views.room_wallet, name='room_wallet'),
+    path('v1/livestream/rooms/<str:room_name>/admission/', views.room_admission, name='room_admission'),
+    path('v1/livestream/rooms/<str:room_name>/ingress/', views.room_ingress, name='room_ingress'),
+    path('v1/livestream/rooms/<str:room_name>/subscribers/', views.room_subscribers, name='room_subscribers'),
+    path('v1/livestream/subscriptions/events/', views.subscription_events, name='subscription_events'),
+    path('v1/livestream/shows/', views.scheduled_shows, name='scheduled_shows'),
+    path('v1/livestream/rooms/<str:room_name>/leaderboard/', views.room_leaderboard, name='room_leaderboard'),
+    path('v1/livestream/creators/<str:creator_id>/leaderboard/', views.creator_leaderboard, name='creator_leaderboard'),
+    path('v1/livestream/directory/', views.room_directory, name='room_directory'),
+    path('v1/livestream/webhooks/livekit/', views.livekit_webhook, name='livekit_webhook'),
 ]
@@ -1,104 +1,349 @@
 import json
+import logging
+import math
 import time
-import jwt
-import requests
-from django.http import JsonResponse
+from datetime import datetime, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.http import HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.exceptions import AuthenticationFailed
 
-# LiveKit configuration from settings or fallback to your actual server
-LIVEKIT_API_KEY = getattr(settings, 'LIVEKIT_CONFIG', {}).get('API_KEY', '2f96aaaa91727f979ee756cfbd6f6e56')
-LIVEKIT_API_SECRET = getattr(settings, 'LIVEKIT_CONFIG', {}).get('API_SECRET', '2cff236bc97b877758be4e2e58dc71abf0791851762ef64d3f1587e43e872416')
-LIVEKIT_WS_URL = getattr(settings, 'LIVEKIT_CONFIG', {}).get('WS_URL', 'wss://livekit-server.boomsnap.com')
-LIVEKIT_HTTP_URL = getattr(settings, 'LIVEKIT_CONFIG', {}).get('HTTP_URL', 'https://livekit-server.boomsnap.com')
+from apps.core import fastjson
+from apps.core.authentication import ServiceTokenAuthentication, authenticate_user
+from apps.core.clients import MainAppClient
+from apps.core.fastjson import FastJsonResponse
+from apps.core.idempotency import idempotent
 
-# Fallback to IP if domain doesn't work
-LIVEKIT_IP_URL = "http://3.89.23.33:7880"
+from . import (
+    admission, chat, directory, endpoints, escrow, events, ingress, leaderboards, moderation, participants,
+    reactions, subscriptions, tasks,
+)
+from .models import ScheduledShow
+from .livekit import (
+    LIVEKIT_API_KEY, LIVEKIT_HTTP_URL, LIVEKIT_IP_URL,
+    LiveKitError, WebhookError, generate_access_token, verify_webhook,
+)
+from .signals import token_issued, webhook_received
 
-def generate_access_token(identity, room_name, role="audience"):
-    """
-    Generate LiveKit access token for your actual server
-    """
-    try:
-        # Token payload
-        now = int(time.time())
-        exp = now + (24 * 60 * 60)  # 24 hours expiration
-        
-        payload = {
-            "iss": LIVEKIT_API_KEY,
-            "sub": identity,
-            "iat": now,
-            "exp": exp,
-            "room": room_name,
-        }
-        
-        # Add permissions based on role
-        if role == "host":
-            payload["video"] = {
-                "room": room_name,
-                "roomJoin": True,
-                "roomList": True,
-                "roomRecord": True,
-                "roomAdmin": True,
-                "roomCreate": True,
-                "canPublish": True,
-                "canSubscribe": True,
-                "canPublishData": True,
-            }
-        else:  # audience
-            payload["video"] = {
-                "room": room_name,
-                "roomJoin": True,
-                "canSubscribe": True,
-                "canPublishData": True,
-            }
-        
-        # Generate JWT token
-        token = jwt.encode(payload, LIVEKIT_API_SECRET, algorithm="HS256")
-        return token
-        
-    except Exception as e:
-        print(f"Token generation error: {e}")
-        raise e
+logger = logging.getLogger(__name__)
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@idempotent
 def generate_token(request):
     """
-    API endpoint to generate LiveKit access tokens
+    API endpoint to generate LiveKit access tokens for the authenticated
+    user, whose ID is the token's identity (a body "identity" must match it)
     """
     try:
-        data = json.loads(request.body)
-        identity = data.get('identity')
+        data = fastjson.loads(request.body)
         room_name = data.get('room_name')
         role = data.get('role', 'audience')
         
-        if not identity or not room_name:
-            return JsonResponse({
-                'error': 'identity and room_name are required'
+        if not room_name:
+            return FastJsonResponse({
+                'error': 'room_name is required'
             }, status=400)
-        
+
+        # Room ownership, the subscriber gate and admission all go by the
+        # identity, so it must be the authenticated user's
+        identity, denied = _request_user(request)
+        if denied is not None:
+            return denied
+        mismatch = _check_claimed_user(identity, data.get('identity'))
+        if mismatch is not None:
+            return mismatch
+
+        try:
+            creator_id = directory.get_room_creator(room_name)
+        except RedisError as e:
+            logger.warning(f"Directory unavailable for {room_name}: {e}")
+            creator_id = None
+        is_creator = creator_id is not None and creator_id == str(identity)
+        if role == 'host' and creator_id is not None and not is_creator:
+            return FastJsonResponse({'error': "Only the room's creator can host it"}, status=403)
+
+        # Everyone but the room's creator (or the host registering a new
+        # room) goes through the subscriber gate and admission, whatever
+        # role they ask for
+        seat = None
+        if role != 'host' and not is_creator:
+            denied = _subscriber_gate(room_name, identity)
+            if denied is not None:
+                return denied
+            try:
+                seat = admission.admit(room_name, identity)
+            except RedisError as e:
+                # Admission protects the SFU; an outage shouldn't lock viewers out
+                logger.warning(f"Admission unavailable for {room_name}, admitting {identity}: {e}")
+                seat = {'admitted': True}
+            if not seat['admitted']:
+                return _overflow_response(room_name, identity, seat)
+
         # Generate token
         token = generate_access_token(identity, room_name, role)
+
+        if role == 'host':
+            try:
+                directory.register_room(room_name, creator=identity,
+                                        category=data.get('category'), title=data.get('title'),
+                                        subscribers_only=bool(data.get('subscribers_only')))
+            except Exception as e:
+                logger.warning(f"Could not register room {room_name} in directory: {e}")
+
+        for handler, result in token_issued.send_robust(
+            sender=generate_token, identity=identity, room_name=room_name, role=role
+        ):
+            if isinstance(result, Exception):
+                logger.warning(f"Token handler {handler.__name__} failed for {room_name}: {result}")
         
-        return JsonResponse({
+        endpoint = endpoints.best()
+        return FastJsonResponse({
             'token': token,
             'identity': identity,
             'room_name': room_name,
             'role': role,
-            'server_url': LIVEKIT_WS_URL,
+            'server_url': endpoint['ws_url'],
             'server_config': {
-                'ws_url': LIVEKIT_WS_URL,
-                'http_url': LIVEKIT_HTTP_URL,
+                'ws_url': endpoint['ws_url'],
+                'http_url': endpoint['http_url'],
                 'rtc_port': 7881,
                 'udp_range': '50000-60000'
             },
-            'expires_in': 24 * 60 * 60  # 24 hours
+            'expires_in': 24 * 60 * 60,  # 24 hours
+            # The seat is released if the viewer hasn't joined within lease_seconds
+            'admission': seat
         })
         
+    except json.JSONDecodeError:
+        return FastJsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def _subscriber_gate(room_name, identity):
+    """403 response if the room is subscriber-only and `identity` isn't a subscriber, else None"""
+    try:
+        result, creator_id = subscriptions.check(room_name, identity)
+    except RedisError as e:
+        # Like admission: the directory is down too, so we can't tell which rooms are gated
+        logger.warning(f"Subscriber index unavailable for {room_name}, admitting {identity}: {e}")
+        return None
+
+    if result == subscriptions.UNINDEXED:
+        if subscriptions.claim_load(creator_id):
+            tasks.load_subscriber_index.delay(creator_id)
+        subscribed = (subscriptions.user_bit(identity) is not None
+                      and MainAppClient().verify_user_subscription(identity, creator_id))
+        result = subscriptions.MEMBER if subscribed else subscriptions.DENIED
+
+    if result == subscriptions.DENIED:
+        return FastJsonResponse({
+            'error': 'This room is for subscribers only',
+            'identity': identity,
+            'room_name': room_name
+        }, status=403)
+    return None
+
+def _overflow_response(room_name, identity, seat):
+    if seat.get('hls_url'):
+        return FastJsonResponse({
+            'admitted': False,
+            'identity': identity,
+            'room_name': room_name,
+            'fallback': 'hls',
+            'hls_url': seat['hls_url'],
+            'status': 'overflow'
+        })
+    response = FastJsonResponse({
+        'admitted': False,
+        'identity': identity,
+        'room_name': room_name,
+        'fallback': 'queue',
+        'position': seat['position'],
+        'poll_interval': seat['poll_interval'],
+        'status': 'queued'
+    }, status=202)
+    response['Retry-After'] = str(seat['poll_interval'])
+    return response
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def room_admission(request, room_name):
+    """
+    GET: check a waiting viewer's place (?identity=). Once admitted, request
+    a token from generate-token within the lease to take the seat.
+    DELETE: leave the queue or give up a seat (?identity=)
+    """
+    try:
+        identity = request.GET.get('identity')
+        if not identity:
+            return JsonResponse({'error': 'identity is required'}, status=400)
+
+        if request.method == 'DELETE':
+            admission.release(room_name, identity)
+            return JsonResponse({'identity': identity, 'room_name': room_name, 'status': 'success'})
+
+        seat = admission.admit(room_name, identity)
+        if not seat['admitted']:
+            return _overflow_response(room_name, identity, seat)
+        return JsonResponse({
+            'admitted': True,
+            'identity': identity,
+            'room_name': room_name,
+            'lease_seconds': seat['lease_seconds'],
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST", "DELETE"])
+def room_ingress(request, room_name):
+    """
+    The room's RTMP/WHIP ingress, managed by the room's creator only.
+    GET: the ingress, without its stream key
+    POST: lease an ingress for the creator going live from OBS
+    ({"identity", "name", "input_type": "rtmp" | "whip"}; identity defaults
+    to the creator)
+    DELETE: retire the room's ingress
+    """
+    try:
+        user_id, denied = _request_user(request)
+        if denied is not None:
+            return denied
+        creator_id = directory.get_room_creator(room_name)
+        if not creator_id:
+            return JsonResponse({'error': 'Room is not registered'}, status=404)
+        if creator_id != user_id:
+            return JsonResponse({'error': "Only the room's creator can manage its ingress"}, status=403)
+
+        if request.method == 'GET':
+            info = ingress.get_lease(room_name)
+            if info is None:
+                return JsonResponse({'error': 'Room has no ingress'}, status=404)
+            return JsonResponse({'ingress': ingress.public(info, with_key=False), 'status': 'success'})
+
+        if request.method == 'DELETE':
+            ingress_id = ingress.release(room_name)
+            if ingress_id is None:
+                return JsonResponse({'error': 'Room has no ingress'}, status=404)
+            tasks.refill_ingress_pools.delay()
+            return JsonResponse({'ingress_id': ingress_id, 'status': 'success'})
+
+        data = json.loads(request.body)
+        identity = data.get('identity') or user_id
+        input_type = ingress.INPUT_TYPES.get(data.get('input_type', 'rtmp'))
+        if input_type is None:
+            return JsonResponse({'error': f"input_type must be one of {', '.join(ingress.INPUT_TYPES)}"}, status=400)
+
+        started = time.monotonic()
+        try:
+            info, pooled = ingress.lease(room_name, identity, name=data.get('name', ''), input_type=input_type)
+        except ingress.IngressUnavailable as e:
+            return JsonResponse({'error': f'Could not create an ingress: {e}'}, status=503)
+        if pooled:
+            tasks.refill_ingress_pools.delay()
+
+        return JsonResponse({
+            'ingress': ingress.public(info),
+            'pooled': pooled,
+            'lease_ms': round((time.monotonic() - started) * 1000, 1),
+            'status': 'success'
+        }, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _show_response(show):
+    return {
+        'room_name': show.room_name,
+        'creator_id': show.creator_id,
+        'title': show.title,
+        'category': show.category,
+        'starts_at': show.starts_at.isoformat(),
+        'expected_viewers': show.expected_viewers,
+        'status': show.status,
+    }
+
+def _parse_starts_at(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    starts_at = parse_datetime(value or '')
+    if starts_at is None:
+        raise ValueError('starts_at must be an ISO 8601 datetime or a unix timestamp')
+    return starts_at if timezone.is_aware(starts_at) else timezone.make_aware(starts_at, dt_timezone.utc)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def scheduled_shows(request):
+    """
+    GET: upcoming shows (?creator_id=)
+    POST: schedule a show as the authenticated creator, or update it if
+    room_name is already scheduled by them ({"room_name", "starts_at",
+    "title", "category", "expected_viewers"}). The main app's service token
+    may schedule for any creator by passing creator_id.
+    """
+    try:
+        if request.method == 'GET':
+            upcoming = ScheduledShow.objects.filter(
+                status__in=[ScheduledShow.STATUS_SCHEDULED, ScheduledShow.STATUS_PREWARMED],
+            )
+            if request.GET.get('creator_id'):
+                upcoming = upcoming.filter(creator_id=request.GET['creator_id'])
+            return JsonResponse({'shows': [_show_response(show) for show in upcoming[:100]], 'status': 'success'})
+
+        service = _service_call(request)
+        if not service:
+            user_id, denied = _request_user(request)
+            if denied is not None:
+                return denied
+
+        data = json.loads(request.body)
+        room_name = data.get('room_name')
+        creator_id = data.get('creator_id')
+        if not service:
+            mismatch = _check_claimed_user(user_id, creator_id)
+            if mismatch is not None:
+                return mismatch
+            creator_id = user_id
+        if not room_name or not creator_id:
+            return JsonResponse({'error': 'room_name and creator_id are required'}, status=400)
+
+        fields = {
+            'creator_id': str(creator_id),
+            'starts_at': _parse_starts_at(data.get('starts_at')),
+            'title': data.get('title', ''),
+            'category': data.get('category', ''),
+            'expected_viewers': int(data.get('expected_viewers') or 0),
+            'max_participants': int(data.get('max_participants') or 0),
+            'metadata': data.get('metadata') or {},
+        }
+        show, created = ScheduledShow.objects.get_or_create(room_name=room_name, defaults=fields)
+        if not created:
+            if not service and show.creator_id != creator_id:
+                return JsonResponse({'error': "Only the show's creator can edit it"}, status=403)
+            if show.status == ScheduledShow.STATUS_PREWARMED:
+                show.mark_edited(rescheduled=fields['starts_at'] != show.starts_at)
+            elif show.status != ScheduledShow.STATUS_SCHEDULED:
+                show.status, show.attempts, show.error = ScheduledShow.STATUS_SCHEDULED, 0, ''
+            for name, value in fields.items():
+                setattr(show, name, value)
+            show.save()
+
+        return JsonResponse({'show': _show_response(show), 'status': 'success'}, status=201 if created else 200)
+
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -107,52 +352,40 @@ def generate_token(request):
 def test_connection(request):
     """
     Test connection to your LiveKit server
+
+    Reports the background prober's endpoint table (see endpoints.py);
+    probes once inline only if the table is missing.
     """
     try:
-        # Test both domain and IP
+        table = endpoints.get_table() or endpoints.probe_all()
+        ranked = endpoints.ranked(table)
+
         test_results = {}
-        
-        # Test domain connection
-        try:
-            response = requests.get(f"{LIVEKIT_HTTP_URL}/", timeout=5)
-            test_results['domain'] = {
-                'status': 'connected' if response.status_code in [200, 404, 401] else 'failed',
-                'url': LIVEKIT_HTTP_URL,
-                'response_code': response.status_code
+        for endpoint in ranked:
+            entry = table.get(endpoint['name']) or {}
+            test_results[endpoint['name']] = {
+                'status': 'connected' if entry.get('healthy') else 'failed',
+                'url': endpoint['http_url'],
+                'response_code': entry.get('response_code'),
+                'error': entry.get('error'),
+                'rtt_ms': entry.get('last_rtt_ms'),
+                'ewma_rtt_ms': entry.get('ewma_rtt_ms'),
+                'availability': entry.get('availability'),
+                'checked_at': entry.get('checked_at'),
             }
-        except requests.exceptions.RequestException as e:
-            test_results['domain'] = {
-                'status': 'failed',
-                'url': LIVEKIT_HTTP_URL,
-                'error': str(e)
-            }
-        
-        # Test IP connection
-        try:
-            response = requests.get(f"{LIVEKIT_IP_URL}/", timeout=5)
-            test_results['ip'] = {
-                'status': 'connected' if response.status_code in [200, 404, 401] else 'failed',
-                'url': LIVEKIT_IP_URL,
-                'response_code': response.status_code
-            }
-        except requests.exceptions.RequestException as e:
-            test_results['ip'] = {
-                'status': 'failed',
-                'url': LIVEKIT_IP_URL,
-                'error': str(e)
-            }
-        
+
         return JsonResponse({
             'django_backend': {
                 'status': 'connected',
                 'timestamp': int(time.time())
             },
             'livekit_tests': test_results,
+            'selected_endpoint': ranked[0]['name'],
             'config': {
                 'api_key': LIVEKIT_API_KEY,
                 'domain_url': LIVEKIT_HTTP_URL,
                 'ip_url': LIVEKIT_IP_URL,
-                'ws_url': LIVEKIT_WS_URL,
+                'ws_url': ranked[0]['ws_url'],
                 'rtc_port': 7881,
                 'udp_range': '50000-60000'
             }
@@ -168,75 +401,601 @@ def list_rooms(request):
     List active rooms from your LiveKit server
     """
     try:
-        # Generate admin token for API access
-        admin_token = generate_access_token("admin", "", "host")
-        
-        headers = {
-            'Authorization': f'Bearer {admin_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        # Try domain first, fallback to IP
-        for url in [LIVEKIT_HTTP_URL, LIVEKIT_IP_URL]:
-            try:
-                response = requests.get(f"{url}/twirp/livekit.RoomService/ListRooms", 
-                                     headers=headers, timeout=10)
-                if response.status_code == 200:
-                    return JsonResponse({
-                        'rooms': response.json().get('rooms', []),
-                        'server_url': url,
-                        'status': 'success'
-                    })
-            except requests.exceptions.RequestException:
-                continue
-        
+        try:
+            response, url = endpoints.call('ListRooms')
+        except LiveKitError:
+            return JsonResponse({
+                'rooms': [],
+                'message': 'Could not connect to LiveKit server',
+                'status': 'error'
+            })
+
         return JsonResponse({
-            'rooms': [],
-            'message': 'Could not connect to LiveKit server',
-            'status': 'error'
+            'rooms': response.get('rooms', []),
+            'server_url': url,
+            'status': 'success'
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def fetch_participants(room_name):
+    """
+    Fetch the full participant list of a room from LiveKit.
+    Returns (participants, server_url), or (None, None) if unreachable.
+    """
+    try:
+        response, url = endpoints.call('ListParticipants', {'room': room_name})
+    except LiveKitError:
+        return None, None
+    return response.get('participants', []), url
+
+def _participants_unavailable(room_name):
+    return JsonResponse({
+        'participants': [],
+        'room_name': room_name,
+        'message': 'Could not connect to LiveKit server',
+        'status': 'error'
+    })
+
+async def _async_chunks(chunks):
+    """Serve a sync generator from ASGI without Django buffering all of it first"""
+    done = object()
+    try:
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=False)(chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        chunks.close()
+
+def _projected_participants(request, room_name):
+    try:
+        fields = participants.parse_fields(request.GET['fields'])
+        limit = request.GET.get('limit')
+        limit = max(int(limit), 0) if limit else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        meta = participants.get_meta(room_name)
+        refresh = participants.needs_refresh(room_name, meta)
+    except RedisError as e:
+        logger.warning(f"Participant store unavailable for {room_name}: {e}")
+        meta, refresh = None, True
+
+    upstream = None
+    if refresh:
+        try:
+            upstream, url = endpoints.stream('ListParticipants', {'room': room_name})
+        except LiveKitError:
+            pass
+
+    if upstream is not None:
+        body = participants.render_projected(room_name, upstream, fields, url, limit)
+    elif meta and meta['refreshed_at']:
+        body = participants.render_stored(room_name, fields, meta, limit)
+    elif refresh or meta is None:
+        return _participants_unavailable(room_name)
+    else:
+        # Another caller holds this interval's upstream stream and nothing is stored yet
+        response = JsonResponse({'error': 'Participant list is loading, retry shortly'}, status=503)
+        response['Retry-After'] = str(max(1, math.ceil(participants.REFRESH_INTERVAL)))
+        return response
+    if isinstance(request, ASGIRequest):
+        body = _async_chunks(body)
+    response = StreamingHttpResponse(body, content_type='application/json')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _matches_etag(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return any(tag.strip() in (etag, '*') for tag in header.split(',')) if header else False
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def list_participants(request, room_name):
     """
     List participants in a room
+
+    Responses carry an ETag of the room's participant version,
+    "<epoch>:<version>". Send it back in If-None-Match to get a 304 when
+    nothing changed, or pass ?since=<epoch>:<version> to get only joins,
+    updates and leaves after it.
+
+    ?fields=identity,name,joined_at streams just those fields instead, for
+    very large rooms: from LiveKit for at most one caller per room per
+    refresh interval, from the stored list for the rest. ?limit=N keeps only
+    the first N; there is no cursor to fetch the ones after them.
     """
     try:
-        # Generate admin token for API access
-        admin_token = generate_access_token("admin", room_name, "host")
-        
-        headers = {
-            'Authorization': f'Bearer {admin_token}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {'room': room_name}
-        
-        # Try domain first, fallback to IP
-        for url in [LIVEKIT_HTTP_URL, LIVEKIT_IP_URL]:
+        if request.GET.get('fields'):
+            return _projected_participants(request, room_name)
+
+        since = request.GET.get('since')
+        if since is not None:
             try:
-                response = requests.post(f"{url}/twirp/livekit.RoomService/ListParticipants", 
-                                       headers=headers, json=data, timeout=10)
-                if response.status_code == 200:
-                    return JsonResponse({
-                        'participants': response.json().get('participants', []),
-                        'room_name': room_name,
-                        'server_url': url,
-                        'status': 'success'
-                    })
-            except requests.exceptions.RequestException:
-                continue
-        
+                since_epoch, since = participants.parse_version(since)
+            except ValueError:
+                return JsonResponse({'error': 'since must be an <epoch>:<version> ETag value'}, status=400)
+
+        try:
+            meta = participants.get_meta(room_name)
+            if participants.needs_refresh(room_name, meta):
+                fetched, url = fetch_participants(room_name)
+                if fetched is not None:
+                    participants.apply_snapshot(room_name, fetched, url)
+                    meta = participants.get_meta(room_name)
+                elif not meta['refreshed_at']:
+                    return _participants_unavailable(room_name)
+            elif not meta['refreshed_at']:
+                # Another caller holds the first load; wait for it rather than join the herd
+                meta = participants.wait_loaded(room_name)
+                if not meta['refreshed_at']:
+                    return _participants_unavailable(room_name)
+        except RedisError as e:
+            # Versioning is an optimization; serve the plain list without it
+            logger.warning(f"Participant store unavailable for {room_name}: {e}")
+            fetched, url = fetch_participants(room_name)
+            if fetched is None:
+                return _participants_unavailable(room_name)
+            return JsonResponse({
+                'participants': fetched,
+                'room_name': room_name,
+                'server_url': url,
+                'status': 'success'
+            })
+
+        version = meta['version']
+        etag = f'"{meta["epoch"]}:{version}"'
+        if _matches_etag(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        changes = participants.changes_since(room_name, since, since_epoch) if since is not None else None
+        if changes is not None:
+            response = JsonResponse({
+                'room_name': room_name,
+                'epoch': meta['epoch'],
+                'version': version,
+                'since': since,
+                'mode': 'delta',
+                **changes,
+                'server_url': meta['server_url'],
+                'status': 'success'
+            })
+        else:
+            response = JsonResponse({
+                'participants': participants.snapshot(room_name),
+                'room_name': room_name,
+                'epoch': meta['epoch'],
+                'version': version,
+                'mode': 'snapshot',
+                'server_url': meta['server_url'],
+                'status': 'success'
+            })
+        response['ETag'] = etag
+        return response
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def room_directory(request):
+    """
+    Paginated directory of live rooms, sorted by viewers, gifts or recent
+    """
+    try:
+        rooms, next_cursor = directory.list_live_rooms(
+            sort=request.GET.get('sort', 'viewers'),
+            creator=request.GET.get('creator'),
+            category=request.GET.get('category'),
+            cursor=request.GET.get('cursor'),
+            limit=request.GET.get('limit'),
+        )
+
         return JsonResponse({
-            'participants': [],
+            'rooms': rooms,
+            'next_cursor': next_cursor,
+            'status': 'success'
+        })
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def livekit_webhook(request):
+    """
+    Receive LiveKit server webhooks and fan them out to receivers
+    """
+    try:
+        event = verify_webhook(request.headers.get('Authorization'), request.body)
+    except WebhookError as e:
+        logger.warning(f"Rejected LiveKit webhook: {e}")
+        return JsonResponse({'error': str(e)}, status=401)
+
+    responses = webhook_received.send_robust(
+        sender=livekit_webhook, event=event.get('event'), payload=event
+    )
+    for handler, result in responses:
+        if isinstance(result, Exception):
+            logger.error(f"Webhook handler {handler.__name__} failed for {event.get('event')}: {result}")
+
+    return JsonResponse({'status': 'ok'})
+
+async def room_events(request, room_name):
+    """
+    Server-Sent Events stream of a room's state changes (ASGI only).
+    Reconnecting clients send Last-Event-ID to resume where they left off.
+    """
+    # Django 4.2's csrf_exempt/require_http_methods aren't async-aware
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    if not isinstance(request, ASGIRequest):
+        # A sync worker would be pinned for the whole life of the stream
+        return JsonResponse({'error': 'event streams require the ASGI server'}, status=501)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=400)
+
+    response = StreamingHttpResponse(
+        events.stream_room_events(room_name, last_event_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def room_chat(request, room_name):
+    """
+    GET: chat history, newest first (?before=<message id> to scroll back)
+    POST: send a chat message as the authenticated user
+    """
+    try:
+        if request.method == 'GET':
+            messages, next_cursor = chat.history(
+                room_name,
+                before=request.GET.get('before'),
+                limit=request.GET.get('limit'),
+            )
+            return JsonResponse({
+                'messages': messages,
+                'room_name': room_name,
+                'next_cursor': next_cursor,
+                'status': 'success'
+            })
+
+        identity, denied = _request_user(request)
+        if denied is not None:
+            return denied
+
+        data = json.loads(request.body)
+        mismatch = _check_claimed_user(identity, data.get('identity'))
+        if mismatch is not None:
+            return mismatch
+        text = (data.get('message') or '').strip()
+
+        if not text:
+            return JsonResponse({'error': 'message is required'}, status=400)
+        if len(text) > chat.MAX_MESSAGE_LENGTH:
+            return JsonResponse({
+                'error': f'message is longer than {chat.MAX_MESSAGE_LENGTH} characters'
+            }, status=400)
+
+        allowed, text, _ = moderation.check_message(text, directory.get_room_creator(room_name))
+        if not allowed:
+            return JsonResponse({'error': 'message rejected by moderation'}, status=422)
+
+        message, archive_due = chat.append(room_name, identity, text, name=data.get('name', ''))
+        if archive_due:
+            tasks.archive_chat_room.delay(room_name)
+        events.publish(room_name, 'chat_message', message)
+
+        return JsonResponse({
+            'message': message,
             'room_name': room_name,
-            'message': 'Could not connect to LiveKit server',
-            'status': 'error'
+            'status': 'success'
+        }, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def send_reaction(request, room_name):
+    """
+    Send reactions ({kind, count?}); count batches rapid taps. Viewers get
+    them aggregated per window over the room's data channel.
+    """
+    try:
+        data = fastjson.loads(request.body)
+        kind = data.get('kind')
+        count = data.get('count', 1)
+
+        if kind not in reactions.KINDS:
+            return FastJsonResponse({'error': f"kind must be one of {', '.join(reactions.KINDS)}"}, status=400)
+        if not isinstance(count, int) or not 0 < count <= reactions.MAX_COUNT:
+            return FastJsonResponse({'error': f'count must be between 1 and {reactions.MAX_COUNT}'}, status=400)
+
+        reactions.record(room_name, kind, count)
+        return FastJsonResponse({'room_name': room_name, 'status': 'success'}, status=202)
+
+    except json.JSONDecodeError:
+        return FastJsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return FastJsonResponse({'error': str(e)}, status=500)
+
+def _request_user(request):
+    """
+    (user_id, None) for the authenticated user a request acts for, or
+    (None, 401 response)
+    """
+    try:
+        user_id = authenticate_user(request)
+    except AuthenticationFailed as e:
+        return None, JsonResponse({'error': str(e.detail)}, status=401)
+    if not user_id:
+        return None, JsonResponse({'error': 'Authentication required'}, status=401)
+    return user_id, None
+
+def _check_claimed_user(user_id, claimed):
+    """403 response if the request names a user other than the authenticated one"""
+    if claimed is not None and str(claimed) != user_id:
+        return JsonResponse({'error': 'user_id does not match the authenticated user'}, status=403)
+    return None
+
+def _service_call(request):
+    """True if the main app's service token made the request on its own behalf (no X-User-Id)"""
+    if request.headers.get('X-User-Id'):
+        return False
+    try:
+        return ServiceTokenAuthentication().authenticate(request) is not None
+    except AuthenticationFailed:
+        return False
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent
+def send_gift(request, room_name):
+    """
+    Send a gift to the host of a live room as the authenticated user
+    (a user token, or the main app's service token with X-User-Id). The
+    sender is charged against their escrowed allowance for the room; the
+    main app is only called when that needs opening or topping up.
+    """
+    try:
+        user_id, denied = _request_user(request)
+        if denied is not None:
+            return denied
+
+        data = json.loads(request.body)
+        amount = data.get('amount')
+        gift = data.get('gift', '')
+
+        denied = _check_claimed_user(user_id, data.get('user_id'))
+        if denied is not None:
+            return denied
+        if not isinstance(amount, int) or amount <= 0:
+            return JsonResponse({'error': 'amount must be a positive integer'}, status=400)
+
+        creator_id = directory.get_room_creator(room_name)
+        if not creator_id:
+            return JsonResponse({'error': 'Room is not live'}, status=404)
+        if user_id == creator_id:
+            return JsonResponse({'error': 'Cannot gift your own stream'}, status=400)
+
+        try:
+            remaining = escrow.debit(user_id, room_name, creator_id, amount)
+        except escrow.InsufficientCoins as e:
+            return JsonResponse({'error': str(e)}, status=402)
+        except escrow.ReservationClosing as e:
+            return JsonResponse({'error': str(e)}, status=409)
+        except escrow.EscrowError as e:
+            return JsonResponse({'error': str(e)}, status=503)
+
+        leaderboards.record_gift(room_name, creator_id, user_id, amount)
+        directory.record_gift(room_name, amount)
+        events.publish(room_name, 'gift', {'user_id': user_id, 'amount': amount, 'gift': gift})
+        reactions.record(room_name, reactions.GIFT, item=gift, coins=amount)
+
+        board = leaderboards.leaderboard('room', room_name, limit=1, user_id=user_id)
+        return JsonResponse({
+            'room_name': room_name,
+            'amount': amount,
+            'rank': board['user']['rank'],
+            'total_coins': board['user']['coins'],
+            'remaining_allowance': remaining,
+            'status': 'success'
+        }, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _leaderboard_response(request, kind, owner):
+    try:
+        board = leaderboards.leaderboard(
+            kind, owner,
+            window=request.GET.get('window', 'stream'),
+            limit=request.GET.get('limit'),
+            user_id=request.GET.get('user_id'),
+        )
+        board['status'] = 'success'
+        return JsonResponse(board)
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def room_leaderboard(request, room_name):
+    """
+    Top gifters in a room (?window=stream|recent, ?user_id= for their rank)
+    """
+    return _leaderboard_response(request, 'room', room_name)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def creator_leaderboard(request, creator_id):
+    """
+    Top gifters to a creator across all their streams (?window=stream|recent)
+    """
+    return _leaderboard_response(request, 'creator', creator_id)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST", "DELETE"])
+def room_wallet(request, room_name):
+    """
+    The authenticated user's spending allowance in a room.
+    GET: read it
+    POST: reserve an allowance on entering the room
+    DELETE: release it on leaving
+    """
+    try:
+        user_id, denied = _request_user(request)
+        if denied is not None:
+            return denied
+
+        if request.method == 'POST':
+            data = json.loads(request.body)
+            claimed = data.get('user_id')
+            amount = data.get('amount')
+        else:
+            claimed = request.GET.get('user_id')
+            amount = None
+
+        mismatch = _check_claimed_user(user_id, claimed)
+        if mismatch is not None:
+            return mismatch
+        if amount is not None and (not isinstance(amount, int) or amount <= 0):
+            return JsonResponse({'error': 'amount must be a positive integer'}, status=400)
+
+        if request.method == 'DELETE':
+            closed = escrow.close_reservation(user_id, room_name)
+            return JsonResponse({'released': closed, 'room_name': room_name, 'status': 'success'})
+
+        if request.method == 'GET':
+            reservation = escrow.get_reservation(user_id, room_name)
+            if reservation is None:
+                return JsonResponse({'error': 'No reservation in this room'}, status=404)
+        else:
+            creator_id = directory.get_room_creator(room_name)
+            if not creator_id:
+                return JsonResponse({'error': 'Room is not live'}, status=404)
+            try:
+                reservation = escrow.open_reservation(user_id, room_name, creator_id, amount)
+            except escrow.InsufficientCoins as e:
+                return JsonResponse({'error': str(e)}, status=402)
+            except escrow.ReservationClosing as e:
+                return JsonResponse({'error': str(e)}, status=409)
+            except escrow.EscrowError as e:
+                return JsonResponse({'error': str(e)}, status=503)
+
+        return JsonResponse({
+            'reservation': reservation,
+            'room_name': room_name,
+            'status': 'success'
         })
-        
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def room_subscribers(request, room_name):
+    """
+    Subscribers of the room's creator who are watching it now
+    (?ids=1 lists their user IDs, up to ?limit=). Only the room's creator
+    or the main app (service token) may ask.
+    """
+    try:
+        creator_id = directory.get_room_creator(room_name)
+        if not creator_id:
+            return JsonResponse({'error': 'Room is not live'}, status=404)
+        if not _service_call(request):
+            user_id, denied = _request_user(request)
+            if denied is not None:
+                return denied
+            if user_id != creator_id:
+                return JsonResponse({'error': "Only the room's creator can list its subscribers"}, status=403)
+
+        with_ids = request.GET.get('ids') in ('1', 'true')
+        limit = min(int(request.GET.get('limit', subscriptions.MAX_LIVE_IDS)), subscriptions.MAX_LIVE_IDS)
+        if limit <= 0:
+            raise ValueError('limit must be positive')
+
+        live = subscriptions.live_subscribers(room_name, creator_id, with_ids=with_ids, limit=limit)
+        body = {
+            'room_name': room_name,
+            'creator_id': creator_id,
+            'live_subscribers': live['count'],
+            'index': subscriptions.stats(creator_id),
+            'status': 'success'
+        }
+        if with_ids:
+            body['user_ids'] = live['user_ids']
+        return JsonResponse(body)
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def subscription_events(request):
+    """
+    Subscribe/unsubscribe events pushed by the main app (service token):
+    {"events": [{"type": "subscribed" | "unsubscribed", "user_id", "creator_id"}]}
+    """
+    try:
+        if ServiceTokenAuthentication().authenticate(request) is None:
+            return JsonResponse({'error': 'Service token required'}, status=401)
+    except AuthenticationFailed as e:
+        return JsonResponse({'error': str(e.detail)}, status=401)
+
+    try:
+        data = json.loads(request.body)
+        events = data.get('events') if isinstance(data, dict) else None
+        if not isinstance(events, list) or not events:
+            raise ValueError('events must be a non-empty list')
+        if len(events) > subscriptions.MAX_EVENTS:
+            raise ValueError(f'at most {subscriptions.MAX_EVENTS} events per request')
+        for event in events:
+            if not isinstance(event, dict) or event.get('type') not in subscriptions.EVENT_TYPES:
+                raise ValueError(f"type must be one of {', '.join(subscriptions.EVENT_TYPES)}")
+            if subscriptions.user_bit(event.get('user_id')) is None:
+                raise ValueError('user_id must be a non-negative integer')
+            if not event.get('creator_id'):
+                raise ValueError('creator_id is required')
+
+        changed = subscriptions.apply_events(events)
+        return JsonResponse({'received': len(events), 'changed': changed, 'status': 'success'})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
@@ -1,3 +1,35 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Clip, Recording, RecordingJob, TranscodeJob
+
+
+@admin.register(Recording)
+class RecordingAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'room', 'creator_id', 'duration_seconds', 'height', 'viewer_count', 'created_at')
+    search_fields = ('source_path', 'room', 'creator_id', 'egress_id')
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ('recording', 'status', 'attempts', 'speed', 'encode_seconds', 'worker', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('recording__source_path', 'recording__room')
+    readonly_fields = ('renditions', 'encode_seconds', 'speed', 'worker', 'error',
+                       'queued_at', 'started_at', 'finished_at')
+
+
+@admin.register(Clip)
+class ClipAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'recording', 'creator_id', 'start_seconds', 'end_seconds',
+                    'encoded_seconds', 'extract_seconds', 'created_at')
+    search_fields = ('title', 'creator_id', 'recording__room')
+    readonly_fields = ('path', 'size_bytes', 'copied_seconds', 'encoded_seconds', 'extract_seconds', 'completed_at')
+
+
+@admin.register(RecordingJob)
+class RecordingJobAdmin(admin.ModelAdmin):
+    list_display = ('room', 'creator_id', 'tier', 'status', 'node', 'attempts', 'requested_at', 'ended_at')
+    list_filter = ('status', 'tier')
+    search_fields = ('room', 'creator_id', 'egress_id')
+    readonly_fields = ('priority', 'node', 'egress_id', 'attempts', 'next_attempt_at', 'error', 'location',
+                       'recording', 'requested_at', 'started_at', 'ended_at')
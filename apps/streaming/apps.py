@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class StreamingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.streaming"
+
+    def ready(self):
+        from . import receivers  # noqa: F401
@@ -0,0 +1,245 @@
+"""
+Clip extraction and thumbnails via a per-recording keyframe index.
+
+The index is built once with a keyframe-only decode of the source
+(`-skip_frame nokey`, so even a 3-hour file takes seconds) and stored on
+the Recording along with the file's size and mtime, which invalidate it.
+
+A clip [start, end) is cut in up to three parts and joined with the
+concat demuxer:
+
+    start ---- k_in ================ k_out ---- end
+      re-encoded      stream copy        re-encoded
+
+k_in is the first keyframe at or after start and k_out the last one at
+or before end, so only the partial GOPs at the edges are decoded and
+encoded and the cost doesn't depend on the clip or source length. With
+snap=True the clip is widened to the surrounding keyframes and nothing is
+re-encoded. Edges are re-encoded to H.264/AAC, so sources with another
+video or audio codec are re-encoded whole. Every part carries its H.264 parameter sets in-band (x264
+repeat-headers for the edges, h264_mp4toannexb for the copied middle), so
+the re-encoded edges can sit next to copied source packets.
+
+Thumbnails seek to the keyframe at or before the requested time, which
+costs one frame decode, and are cached on disk per keyframe.
+
+Only the build_keyframe_index task builds an index; clips and thumbnails
+of a recording without a current one raise IndexNotReady.
+"""
+
+import bisect
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Clip
+from .transcoding import LOCAL_PATH, TranscodeError, ffmpeg_exe
+
+logger = logging.getLogger(__name__)
+
+CLIP_CONFIG = getattr(settings, 'CLIP_CONFIG', {})
+CLIPS_PATH = CLIP_CONFIG.get('CLIPS_PATH') or os.path.join(LOCAL_PATH, 'clips')
+THUMBNAILS_PATH = CLIP_CONFIG.get('THUMBNAILS_PATH') or os.path.join(LOCAL_PATH, 'thumbnails')
+MAX_CLIP_SECONDS = CLIP_CONFIG.get('MAX_CLIP_SECONDS', 3 * 60)
+EDGE_PRESET = CLIP_CONFIG.get('EDGE_PRESET', 'veryfast')
+EDGE_CRF = CLIP_CONFIG.get('EDGE_CRF', 18)
+THUMBNAIL_HEIGHT = CLIP_CONFIG.get('THUMBNAIL_HEIGHT', 360)
+FFMPEG_TIMEOUT = CLIP_CONFIG.get('FFMPEG_TIMEOUT', 60)
+INDEX_TIMEOUT = CLIP_CONFIG.get('INDEX_TIMEOUT', 10 * 60)
+
+# Edges shorter than this (about a frame) aren't worth a re-encode
+EPSILON = 0.02
+
+PTS_TIME = re.compile(r'pts_time:(-?[\d.]+)')
+DURATION = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+START = re.compile(r'start: (-?[\d.]+)')
+VIDEO_CODEC = re.compile(r'Video: (\w+)')
+AUDIO_CODEC = re.compile(r'Audio: (\w+)')
+
+
+class IndexNotReady(TranscodeError):
+    """The recording's keyframe index hasn't been built (or is stale)"""
+
+
+def _ffmpeg(*args, timeout=FFMPEG_TIMEOUT):
+    command = [ffmpeg_exe(), '-hide_banner', '-nostdin', '-y', *map(str, args)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f'ffmpeg timed out after {timeout}s')
+    if result.returncode != 0:
+        raise TranscodeError(f'ffmpeg failed: {result.stderr.strip()[-500:]}')
+    return result.stderr
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{int(stat.st_mtime)}'
+
+
+def build_index(path):
+    """Keyframe times (seconds from the start of the file), duration and codecs"""
+    output = _ffmpeg(
+        '-skip_frame', 'nokey', '-i', path, '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-',
+        timeout=INDEX_TIMEOUT,
+    )
+    start = float(START.search(output).group(1)) if START.search(output) else 0.0
+    match = DURATION.search(output)
+    duration = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3)) if match else None
+    codec = VIDEO_CODEC.search(output)
+    audio_codec = AUDIO_CODEC.search(output)
+    keyframes = sorted({round(float(t) - start, 3) for t in PTS_TIME.findall(output)})
+    return {
+        'keyframes': keyframes,
+        'duration': duration,
+        'video_codec': codec.group(1) if codec else None,
+        'audio_codec': audio_codec.group(1) if audio_codec else None,
+    }
+
+
+def current_index(recording):
+    """The recording's index; raises IndexNotReady if it's missing or stale"""
+    if not os.path.exists(recording.source_path):
+        raise TranscodeError(f'{recording.source_path} does not exist')
+
+    index = recording.keyframe_index
+    if not index or index.get('fingerprint') != _fingerprint(recording.source_path):
+        raise IndexNotReady('recording is still being indexed, retry shortly')
+    return index
+
+
+def keyframe_index(recording):
+    """The recording's index, building and saving it if missing or stale"""
+    try:
+        return current_index(recording)
+    except IndexNotReady:
+        pass
+
+    fingerprint = _fingerprint(recording.source_path)
+
+    started = time.monotonic()
+    index = build_index(recording.source_path)
+    index['fingerprint'] = fingerprint
+    recording.keyframe_index = index
+    recording.save(update_fields=['keyframe_index'])
+    logger.info(
+        f"Indexed {len(index['keyframes'])} keyframes of recording {recording.pk} "
+        f"in {time.monotonic() - started:.2f}s"
+    )
+    return index
+
+
+def plan(index, start, end, snap=False):
+    """
+    Split [start, end) into ('encode' | 'copy', from, to) parts around the
+    keyframes inside it. Returns the parts and the clip's actual bounds.
+    """
+    keyframes = index['keyframes']
+    if snap and keyframes:
+        before = bisect.bisect_right(keyframes, start + EPSILON) - 1
+        after = bisect.bisect_left(keyframes, end - EPSILON)
+        start = keyframes[max(before, 0)]
+        end = keyframes[after] if after < len(keyframes) else (index['duration'] or end)
+
+    first = bisect.bisect_left(keyframes, start - EPSILON)
+    last = bisect.bisect_right(keyframes, end + EPSILON) - 1
+    # Edges can only be spliced onto copied packets of the same codecs
+    # (indexes predating audio_codec count as unknown audio)
+    same_codecs = index.get('video_codec') == 'h264' and index.get('audio_codec', '?') in (None, 'aac')
+    if not same_codecs or first >= len(keyframes) or last < first:
+        return [('encode', start, end)], start, end
+
+    k_in, k_out = max(keyframes[first], start), min(keyframes[last], end)
+    parts = []
+    if k_in - start > EPSILON:
+        parts.append(('encode', start, k_in))
+    if k_out - k_in > EPSILON:
+        parts.append(('copy', k_in, k_out))
+    else:
+        k_out = k_in
+    if end - k_out > EPSILON:
+        parts.append(('encode', k_out, end))
+    return parts or [('encode', start, end)], start, end
+
+
+def _cut(source, kind, start, end, target):
+    streams = ['-map', '0:v:0', '-map', '0:a:0?']
+    if kind == 'copy':
+        # Input seeking lands exactly on the keyframe at `start`
+        codecs = ['-c', 'copy', '-bsf:v', 'h264_mp4toannexb']
+    else:
+        codecs = ['-c:v', 'libx264', '-preset', EDGE_PRESET, '-crf', EDGE_CRF,
+                  '-x264-params', 'repeat-headers=1', '-c:a', 'aac']
+    _ffmpeg('-ss', f'{start:.3f}', '-i', source, '-t', f'{end - start:.3f}', *streams, *codecs,
+            '-avoid_negative_ts', 'make_zero', target)
+
+
+def create_clip(recording, start, end, title='', creator_id='', snap=False):
+    """Cut a clip out of a recording and save it. Raises ValueError for bad bounds."""
+    index = current_index(recording)
+    duration = index['duration'] or recording.duration_seconds
+    if start < 0 or end <= start:
+        raise ValueError('start must be >= 0 and before end')
+    if duration and end > duration + EPSILON:
+        raise ValueError(f'end is past the end of the recording ({duration:.2f}s)')
+    if end - start > MAX_CLIP_SECONDS:
+        raise ValueError(f'clips are limited to {MAX_CLIP_SECONDS} seconds')
+
+    parts, start, end = plan(index, start, end, snap=snap)
+    started = time.monotonic()
+    clip = Clip.objects.create(
+        recording=recording, title=title, creator_id=creator_id or recording.creator_id,
+        start_seconds=start, end_seconds=end,
+    )
+    os.makedirs(CLIPS_PATH, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=f'clip-{clip.pk}-', dir=CLIPS_PATH)
+    try:
+        listing = []
+        for i, (kind, part_start, part_end) in enumerate(parts):
+            target = os.path.join(workdir, f'{i}.mp4')
+            _cut(recording.source_path, kind, part_start, part_end, target)
+            listing.append(f"file '{target}'")
+        with open(os.path.join(workdir, 'parts.txt'), 'w') as f:
+            f.write('\n'.join(listing) + '\n')
+
+        path = os.path.join(CLIPS_PATH, f'{clip.pk}.mp4')
+        _ffmpeg('-f', 'concat', '-safe', '0', '-i', os.path.join(workdir, 'parts.txt'),
+                '-c', 'copy', '-movflags', '+faststart', path)
+    except Exception:
+        clip.delete()
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    clip.path = path
+    clip.size_bytes = os.path.getsize(path)
+    clip.copied_seconds = round(sum(b - a for kind, a, b in parts if kind == 'copy'), 3)
+    clip.encoded_seconds = round(sum(b - a for kind, a, b in parts if kind == 'encode'), 3)
+    clip.extract_seconds = round(time.monotonic() - started, 3)
+    clip.completed_at = timezone.now()
+    clip.save(update_fields=['path', 'size_bytes', 'copied_seconds', 'encoded_seconds',
+                             'extract_seconds', 'completed_at'])
+    return clip
+
+
+def thumbnail(recording, at):
+    """Path of a JPEG of the keyframe at or before `at` seconds"""
+    index = current_index(recording)
+    keyframes = index['keyframes'] or [0.0]
+    keyframe = keyframes[max(bisect.bisect_right(keyframes, at) - 1, 0)]
+
+    directory = os.path.join(THUMBNAILS_PATH, str(recording.pk))
+    path = os.path.join(directory, f'{int(keyframe * 1000)}.jpg')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        partial = f'{path}.partial.jpg'
+        _ffmpeg('-ss', f'{keyframe:.3f}', '-i', recording.source_path, '-frames:v', 1,
+                '-vf', f'scale=-2:{THUMBNAIL_HEIGHT}', '-q:v', 3, partial)
+        os.replace(partial, path)
+    return path
@@ -0,0 +1,303 @@
+"""
+Scheduling of room recordings (LiveKit egress) across nodes.
+
+Recording requests become RecordingJobs queued on the node hosting the
+room, scored so paid creators go first without starving free ones:
+
+    score = requested_at - PRIORITY_BOOST[tier]
+
+    egress:queue:<node>     zset job id -> score
+    egress:running:<node>   zset job id -> start time (one slot each)
+    egress:delayed          zset job id -> time of the next attempt
+    egress:nodes            set of nodes with queues
+
+The dispatcher (beat, and kicked whenever a job is queued or a slot frees
+up) claims a job and a slot on its node in one Lua call, so no node runs
+more than its limit however many dispatchers overlap, and starts a room
+composite egress there. Egresses that fail to start, or end FAILED or
+ABORTED, are retried after BACKOFF_BASE * 2^(attempts - 1) seconds (capped at
+BACKOFF_MAX) up to MAX_ATTEMPTS.
+
+Job state follows the egress webhooks. Files are written according to
+RECORDING_CONFIG: under LOCAL_PATH on the egress host for local storage,
+where the egress_ended receiver registers them for transcoding, or
+straight to the S3 bucket. If an egress_ended webhook is lost, the
+dispatcher frees the slot once ListEgress no longer reports the egress.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+from apps.livestream import admission, endpoints
+from apps.livestream.livekit import EgressServiceClient, LiveKitError
+
+from .models import Recording, RecordingJob
+from .transcoding import LOCAL_PATH, RECORDING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+EGRESS_CONFIG = getattr(settings, 'EGRESS_CONFIG', {})
+MAX_PER_NODE = EGRESS_CONFIG.get('MAX_PER_NODE', 4)
+# Per-node overrides of MAX_PER_NODE, by node URL
+NODE_LIMITS = EGRESS_CONFIG.get('NODE_LIMITS', {})
+# Seconds of queue position a tier is given over a request made at the same time
+PRIORITY_BOOST = EGRESS_CONFIG.get('PRIORITY_BOOST', {RecordingJob.TIER_PAID: 60 * 60, RecordingJob.TIER_FREE: 0})
+MAX_ATTEMPTS = EGRESS_CONFIG.get('MAX_ATTEMPTS', 4)
+BACKOFF_BASE = EGRESS_CONFIG.get('BACKOFF_BASE', 30)
+BACKOFF_MAX = EGRESS_CONFIG.get('BACKOFF_MAX', 10 * 60)
+# A started egress missing from ListEgress for longer than this has ended
+LOST_AFTER = EGRESS_CONFIG.get('LOST_AFTER', 2 * 60)
+LAYOUT = EGRESS_CONFIG.get('LAYOUT', 'speaker')
+FILE_TYPE = EGRESS_CONFIG.get('FILE_TYPE', 'MP4')
+
+DELAYED_KEY = make_key('egress', 'delayed')
+NODES_KEY = make_key('egress', 'nodes')
+
+FINISHED = {'EGRESS_COMPLETE': 3, 'EGRESS_LIMIT_REACHED': 6}
+RETRYABLE = {'EGRESS_FAILED': 4, 'EGRESS_ABORTED': 5}
+
+# KEYS running, queue; ARGV now, capacity
+CLAIM_SCRIPT = """
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return false
+end
+local job = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+if not job then
+    return false
+end
+redis.call('ZREM', KEYS[2], job)
+redis.call('ZADD', KEYS[1], ARGV[1], job)
+return job
+"""
+
+_clients = {}
+
+
+def _queue_key(node):
+    return make_key('egress', 'queue', node)
+
+
+def _running_key(node):
+    return make_key('egress', 'running', node)
+
+
+def node_url(node):
+    return endpoints.best()['http_url'] if node == admission.DEFAULT_NODE else node
+
+
+def get_client(node):
+    url = node_url(node)
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = EgressServiceClient(url)
+    return client
+
+
+def capacity(node):
+    return NODE_LIMITS.get(node, MAX_PER_NODE)
+
+
+def priority(job):
+    return job.requested_at.timestamp() - PRIORITY_BOOST.get(job.tier, 0)
+
+
+def file_output(job):
+    """Egress file output for RECORDING_CONFIG's storage"""
+    filepath = f"{job.room}/{job.pk}-{{time}}.{FILE_TYPE.lower()}"
+    output = {'file_type': FILE_TYPE, 'filepath': filepath}
+    if RECORDING_CONFIG.get('STORAGE_TYPE', 'local') == 's3':
+        output['s3'] = {
+            'bucket': RECORDING_CONFIG.get('S3_BUCKET', ''),
+            'region': RECORDING_CONFIG.get('S3_REGION', ''),
+            'access_key': getattr(settings, 'AWS_ACCESS_KEY_ID', '') or '',
+            'secret': getattr(settings, 'AWS_SECRET_ACCESS_KEY', '') or '',
+        }
+    else:
+        output['filepath'] = f"{LOCAL_PATH.rstrip('/')}/{filepath}"
+    return output
+
+
+def enqueue(job):
+    """Queue a job on the node currently hosting its room"""
+    node = admission.room_node(job.room)
+    job.node = node
+    job.priority = priority(job)
+    job.status = RecordingJob.STATUS_QUEUED
+    job.save(update_fields=['node', 'priority', 'status'])
+    pipe = get_redis().pipeline()
+    pipe.sadd(NODES_KEY, node)
+    pipe.zadd(_queue_key(node), {job.pk: job.priority})
+    pipe.execute()
+    return job
+
+
+def request_recording(room, creator_id='', tier=RecordingJob.TIER_FREE):
+    """Queue a recording of `room` unless one is already queued or running"""
+    existing = RecordingJob.objects.filter(room=room, status__in=[
+        RecordingJob.STATUS_QUEUED, RecordingJob.STATUS_STARTING, RecordingJob.STATUS_ACTIVE,
+    ]).first()
+    if existing is not None:
+        return existing, False
+    job = RecordingJob.objects.create(room=room, creator_id=creator_id, tier=tier)
+    return enqueue(job), True
+
+
+def _release(job):
+    if job.node:
+        get_redis().zrem(_running_key(job.node), job.pk)
+
+
+def _retry(job, error, now):
+    _release(job)
+    job.error = error
+    job.egress_id = ''
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = RecordingJob.STATUS_FAILED
+        job.ended_at = timezone.now()
+        logger.warning(f"Recording of {job.room} failed after {job.attempts} attempts: {error}")
+    else:
+        delay = min(BACKOFF_BASE * 2 ** max(job.attempts - 1, 0), BACKOFF_MAX)
+        job.status = RecordingJob.STATUS_QUEUED
+        job.next_attempt_at = datetime.fromtimestamp(now + delay, tz=dt_timezone.utc)
+        get_redis().zadd(DELAYED_KEY, {job.pk: now + delay})
+        logger.info(f"Recording of {job.room} retries in {delay}s: {error}")
+    job.save(update_fields=['status', 'error', 'egress_id', 'next_attempt_at', 'ended_at'])
+
+
+def start(job, now=None):
+    """Start the egress for a job that holds a slot on job.node"""
+    now = now or time.time()
+    job.attempts += 1
+    try:
+        info = get_client(job.node).start_room_composite_egress(job.room, file_output(job), layout=LAYOUT)
+    except LiveKitError as e:
+        job.save(update_fields=['attempts'])
+        _retry(job, str(e), now)
+        return False
+    job.egress_id = info.get('egress_id', '')
+    job.status = RecordingJob.STATUS_STARTING
+    job.started_at = timezone.now()
+    job.error = ''
+    job.save(update_fields=['attempts', 'egress_id', 'status', 'started_at', 'error'])
+    return True
+
+
+def _requeue_due(r, now):
+    due = r.zrangebyscore(DELAYED_KEY, '-inf', now)
+    for member in due:
+        job_id = int(decode(member))
+        if not r.zrem(DELAYED_KEY, job_id):
+            continue
+        job = RecordingJob.objects.filter(pk=job_id, status=RecordingJob.STATUS_QUEUED).first()
+        if job is not None:
+            enqueue(job)
+
+
+def _free_lost(r, node, now):
+    """Release slots of egresses LiveKit no longer runs (their egress_ended was lost)"""
+    running = [int(decode(m)) for m in r.zrangebyscore(_running_key(node), '-inf', now - LOST_AFTER)]
+    if not running:
+        return 0
+    try:
+        active = {item.get('egress_id') for item in get_client(node).list_egress(active=True)}
+    except LiveKitError as e:
+        logger.warning(f"Listing egresses on {node} failed: {e}")
+        return 0
+    freed = 0
+    for job in RecordingJob.objects.filter(pk__in=running):
+        if job.egress_id and job.egress_id in active:
+            continue
+        r.zrem(_running_key(node), job.pk)
+        if job.status in (RecordingJob.STATUS_STARTING, RecordingJob.STATUS_ACTIVE):
+            job.status = RecordingJob.STATUS_FAILED
+            job.error = 'Egress disappeared without an egress_ended webhook'
+            job.ended_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'ended_at'])
+        freed += 1
+    return freed
+
+
+def dispatch(now=None):
+    """Start queued jobs wherever their node has a free slot. Returns how many started."""
+    now = now or time.time()
+    r = get_redis()
+    _requeue_due(r, now)
+
+    started = 0
+    for node in sorted(decode(n) for n in r.smembers(NODES_KEY)):
+        _free_lost(r, node, now)
+        while True:
+            job_id = get_script(CLAIM_SCRIPT)(
+                keys=[_running_key(node), _queue_key(node)], args=[now, capacity(node)],
+            )
+            if not job_id:
+                break
+            job = RecordingJob.objects.filter(pk=int(decode(job_id)), status=RecordingJob.STATUS_QUEUED).first()
+            if job is None:
+                r.zrem(_running_key(node), decode(job_id))
+                continue
+            started += start(job, now)
+    return started
+
+
+def cancel(job):
+    """Stop a running egress or drop a queued job"""
+    r = get_redis()
+    if job.status == RecordingJob.STATUS_QUEUED:
+        pipe = r.pipeline()
+        pipe.zrem(_queue_key(job.node), job.pk)
+        pipe.zrem(DELAYED_KEY, job.pk)
+        pipe.execute()
+        job.status = RecordingJob.STATUS_CANCELLED
+        job.ended_at = timezone.now()
+        job.save(update_fields=['status', 'ended_at'])
+    elif job.status in (RecordingJob.STATUS_STARTING, RecordingJob.STATUS_ACTIVE) and job.egress_id:
+        # The slot is freed by egress_ended, and the file handed on as usual
+        get_client(job.node).stop_egress(job.egress_id)
+
+
+def cancel_room(room):
+    for job in RecordingJob.objects.filter(room=room, status=RecordingJob.STATUS_QUEUED):
+        cancel(job)
+
+
+def _location(info, get_field):
+    files = get_field(info, 'file_results') or [get_field(info, 'file')]
+    for result in filter(None, files):
+        location = get_field(result, 'location') or get_field(result, 'filename')
+        if location:
+            return location
+    return ''
+
+
+def egress_updated(info, get_field, now=None):
+    """
+    Fold an egress webhook into its job. Returns True when a slot was freed.
+    `get_field` reads snake_case or camelCase fields (livekit.get_field).
+    """
+    egress_id = get_field(info, 'egress_id')
+    job = RecordingJob.objects.filter(egress_id=egress_id).first() if egress_id else None
+    if job is None:
+        return False
+
+    status = get_field(info, 'status')
+    if status in ('EGRESS_ACTIVE', 1) and job.status == RecordingJob.STATUS_STARTING:
+        job.status = RecordingJob.STATUS_ACTIVE
+        job.save(update_fields=['status'])
+        return False
+    if status in FINISHED.keys() | set(FINISHED.values()):
+        _release(job)
+        job.status = RecordingJob.STATUS_COMPLETE
+        job.location = _location(info, get_field)
+        job.recording = Recording.objects.filter(egress_id=egress_id).first()
+        job.ended_at = timezone.now()
+        job.save(update_fields=['status', 'location', 'recording', 'ended_at'])
+        return True
+    if status in RETRYABLE.keys() | set(RETRYABLE.values()):
+        _retry(job, get_field(info, 'error') or str(status), now or time.time())
+        return True
+    return False
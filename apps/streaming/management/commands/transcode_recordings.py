@@ -0,0 +1,47 @@
+"""
+Queue recordings already on disk for transcoding, and optionally run the
+queue in this process instead of on the transcode workers.
+
+    python manage.py transcode_recordings --scan
+    python manage.py transcode_recordings --scan --run
+"""
+
+import os
+from django.core.management.base import BaseCommand
+
+from apps.streaming import clips, tasks, transcoding
+from apps.streaming.models import TranscodeJob
+
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.flv', '.ts', '.ogg')
+
+
+class Command(BaseCommand):
+    help = 'Register recordings under LOCAL_PATH for HLS transcoding and report encode speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scan', action='store_true', help='Register unknown recordings under LOCAL_PATH')
+        parser.add_argument('--run', action='store_true', help='Transcode queued jobs here until the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['scan']:
+            registered = 0
+            # Our own output lives under LOCAL_PATH too
+            outputs = {os.path.abspath(p) for p in (transcoding.HLS_PATH, clips.CLIPS_PATH, clips.THUMBNAILS_PATH)}
+            for root, dirs, files in os.walk(transcoding.LOCAL_PATH):
+                dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in outputs]
+                for name in sorted(files):
+                    if name.lower().endswith(MEDIA_EXTENSIONS):
+                        registered += transcoding.register(os.path.join(root, name)) is not None
+            self.stdout.write(f'Registered {registered} new recording(s)')
+
+        if options['run']:
+            while transcoding.queued_count():
+                if not tasks.run_transcodes():
+                    self.stdout.write(self.style.WARNING('No free transcode slot on this host'))
+                    break
+        elif options['scan']:
+            tasks.dispatch_transcodes.delay()
+
+        for job in TranscodeJob.objects.select_related('recording').order_by('-queued_at')[:20]:
+            speed = f'{job.speed}x realtime' if job.speed else '-'
+            self.stdout.write(f'{job.recording}: {job.status}, {len(job.renditions)} rendition(s), {speed}')
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recording',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_path', models.CharField(max_length=1024, unique=True)),
+                ('egress_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('room', models.CharField(blank=True, max_length=255)),
+                ('creator_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('size_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('viewer_count', models.PositiveIntegerField(default=0)),
+                ('recorded_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TranscodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('priority', models.FloatField(default=0, help_text='Queue score; lower runs first')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('renditions', models.JSONField(blank=True, default=dict)),
+                ('encode_seconds', models.FloatField(blank=True, null=True)),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('recording', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transcode_job', to='streaming.recording')),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-19 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='keyframe_index',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='Clip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creator_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('start_seconds', models.FloatField()),
+                ('end_seconds', models.FloatField()),
+                ('path', models.CharField(blank=True, max_length=1024)),
+                ('size_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('copied_seconds', models.FloatField(default=0)),
+                ('encoded_seconds', models.FloatField(default=0)),
+                ('extract_seconds', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clips', to='streaming.recording')),
+            ],
+        ),
+    ]
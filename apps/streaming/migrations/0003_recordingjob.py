@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-19 13:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('streaming', '0002_clip'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room', models.CharField(db_index=True, max_length=255)),
+                ('creator_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('tier', models.CharField(choices=[('paid', 'Paid'), ('free', 'Free')], default='free', max_length=16)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('starting', 'Starting'), ('active', 'Active'), ('complete', 'Complete'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='queued', max_length=16)),
+                ('priority', models.FloatField(default=0, help_text='Queue score; lower starts first')),
+                ('node', models.CharField(blank=True, max_length=255)),
+                ('egress_id', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('location', models.CharField(blank=True, max_length=1024)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('recording', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='streaming.recording')),
+            ],
+        ),
+    ]
@@ -1,3 +1,141 @@
+import os
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
 
-# Create your models here.
+
+class Recording(models.Model):
+    """
+    A finished single-bitrate recording on local storage, registered from
+    LiveKit's egress_ended webhook or by scanning RECORDING_CONFIG['LOCAL_PATH'].
+    """
+    source_path = models.CharField(max_length=1024, unique=True)
+    egress_id = models.CharField(max_length=255, blank=True, db_index=True)
+    room = models.CharField(max_length=255, blank=True)
+    creator_id = models.CharField(max_length=255, blank=True, db_index=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    viewer_count = models.PositiveIntegerField(default=0)
+    # {'keyframes': [seconds...], 'duration', 'video_codec', 'audio_codec', 'fingerprint'}; see clips.py
+    keyframe_index = models.JSONField(null=True, blank=True, editable=False)
+    recorded_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return os.path.basename(self.source_path)
+
+    @property
+    def hls_url(self):
+        base_url = getattr(settings, 'RECORDING_CONFIG', {}).get('BASE_URL', '/media/recordings/')
+        return f"{base_url.rstrip('/')}/hls/{self.pk}/master.m3u8"
+
+    @property
+    def thumbnail_url(self):
+        return reverse('streaming:recording_thumbnail', args=[self.pk])
+
+
+class TranscodeJob(models.Model):
+    """
+    Transcoding of one recording into the HLS ladder. `renditions` maps
+    rendition name to what was produced, so a retry skips finished ones.
+    `speed` is media seconds encoded per wall-clock second (x realtime).
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    recording = models.OneToOneField(Recording, on_delete=models.CASCADE, related_name='transcode_job')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    priority = models.FloatField(default=0, help_text='Queue score; lower runs first')
+    attempts = models.PositiveIntegerField(default=0)
+    renditions = models.JSONField(default=dict, blank=True)
+    encode_seconds = models.FloatField(null=True, blank=True)
+    speed = models.FloatField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Transcode {self.recording} ({self.status})"
+
+
+class Clip(models.Model):
+    """
+    A highlight cut from a recording. The middle is stream-copied between
+    keyframes; only `encoded_seconds` at the edges were re-encoded.
+    """
+    recording = models.ForeignKey(Recording, on_delete=models.CASCADE, related_name='clips')
+    creator_id = models.CharField(max_length=255, blank=True, db_index=True)
+    title = models.CharField(max_length=255, blank=True)
+    start_seconds = models.FloatField()
+    end_seconds = models.FloatField()
+    path = models.CharField(max_length=1024, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    copied_seconds = models.FloatField(default=0)
+    encoded_seconds = models.FloatField(default=0)
+    extract_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.title or f"Clip {self.pk} of {self.recording}"
+
+    @property
+    def url(self):
+        base_url = getattr(settings, 'RECORDING_CONFIG', {}).get('BASE_URL', '/media/recordings/')
+        return f"{base_url.rstrip('/')}/clips/{self.pk}.mp4"
+
+
+class RecordingJob(models.Model):
+    """
+    A request to record a room with LiveKit egress, queued per node by
+    egress.py. `node` is where its slot is held; `location` is where the
+    egress wrote the file, and `recording` the Recording registered for it.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_STARTING = 'starting'
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_STARTING, 'Starting'),
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    TIER_PAID = 'paid'
+    TIER_FREE = 'free'
+    TIER_CHOICES = [(TIER_PAID, 'Paid'), (TIER_FREE, 'Free')]
+
+    room = models.CharField(max_length=255, db_index=True)
+    creator_id = models.CharField(max_length=255, blank=True, db_index=True)
+    tier = models.CharField(max_length=16, choices=TIER_CHOICES, default=TIER_FREE)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    priority = models.FloatField(default=0, help_text='Queue score; lower starts first')
+    node = models.CharField(max_length=255, blank=True)
+    egress_id = models.CharField(max_length=255, blank=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    location = models.CharField(max_length=1024, blank=True)
+    recording = models.ForeignKey(Recording, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Recording of {self.room} ({self.status})"
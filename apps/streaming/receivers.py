@@ -0,0 +1,82 @@
+"""
+Signal receivers, connected in StreamingConfig.ready().
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from django.dispatch import receiver
+
+from apps.analytics.models import ViewerSession
+from apps.livestream import directory
+from apps.livestream.livekit import get_field
+from apps.livestream.signals import webhook_received
+
+from . import egress, tasks, transcoding
+
+logger = logging.getLogger(__name__)
+
+# Egresses whose files are final (one stopped by its time limit still wrote a recording)
+EGRESS_FINISHED = (*egress.FINISHED, *egress.FINISHED.values())
+
+
+def _from_ns(value):
+    return datetime.fromtimestamp(int(value) / 1e9, tz=timezone.utc) if value else None
+
+
+def _viewer_count(room_name, started, ended):
+    if not (room_name and started and ended):
+        return 0
+    return ViewerSession.objects.filter(
+        room=room_name, started_at__range=(started, ended),
+    ).values('identity').distinct().count()
+
+
+@receiver(webhook_received)
+def register_recording(sender, event, payload, **kwargs):
+    info = get_field(payload, 'egress_info') or {}
+    if event != 'egress_ended' or get_field(info, 'status') not in EGRESS_FINISHED:
+        return
+    if transcoding.RECORDING_CONFIG.get('STORAGE_TYPE', 'local') != 'local':
+        return
+
+    room_name = get_field(info, 'room_name') or ''
+    started = _from_ns(get_field(info, 'started_at'))
+    ended = _from_ns(get_field(info, 'ended_at'))
+    files = get_field(info, 'file_results') or [get_field(info, 'file')]
+
+    queued = False
+    for result in filter(None, files):
+        filename = get_field(result, 'filename') or get_field(result, 'location')
+        if not filename:
+            continue
+        duration = get_field(result, 'duration')
+        job = transcoding.register(
+            os.path.join(transcoding.LOCAL_PATH, filename),
+            room=room_name,
+            creator_id=directory.get_room_creator(room_name) or '',
+            egress_id=get_field(info, 'egress_id') or '',
+            duration=int(duration) / 1e9 if duration else None,
+            recorded_at=started,
+            viewer_count=_viewer_count(room_name, started, ended),
+        )
+        if job is not None:
+            queued = True
+            tasks.build_keyframe_index.delay(job.recording_id)
+
+    if queued:
+        tasks.run_transcodes.delay()
+
+
+@receiver(webhook_received)
+def track_egress_jobs(sender, event, payload, **kwargs):
+    if event == 'room_finished':
+        room_name = get_field(get_field(payload, 'room') or {}, 'name')
+        if room_name:
+            egress.cancel_room(room_name)
+        return
+    if event not in ('egress_started', 'egress_updated', 'egress_ended'):
+        return
+    # Runs after register_recording, so a finished job can link its Recording
+    if egress.egress_updated(get_field(payload, 'egress_info') or {}, get_field):
+        tasks.dispatch_egress.delay()
@@ -0,0 +1,56 @@
+import logging
+from celery import shared_task
+
+from . import clips, egress, transcoding
+from .models import Recording
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_transcodes():
+    """Transcode queued recordings while this host has a free ffmpeg slot"""
+    done = 0
+    while True:
+        recording_id = transcoding.claim()
+        if recording_id is None:
+            break
+        try:
+            transcoding.run_job(recording_id)
+        finally:
+            transcoding.release(recording_id)
+        done += 1
+    return done
+
+
+@shared_task
+def dispatch_transcodes():
+    """Requeue abandoned transcodes and wake the transcode workers"""
+    requeued = transcoding.requeue_expired()
+    if requeued:
+        logger.warning(f"Requeued {requeued} abandoned transcode jobs")
+    # Workers without a free slot return at once, so over-asking is cheap
+    for _ in range(min(transcoding.queued_count(), transcoding.DISPATCH_BATCH)):
+        run_transcodes.delay()
+
+
+@shared_task
+def build_keyframe_index(recording_id):
+    """Index a new recording's keyframes ahead of the first clip or thumbnail"""
+    recording = Recording.objects.filter(pk=recording_id).first()
+    if recording is None:
+        return 0
+    try:
+        return len(clips.keyframe_index(recording)['keyframes'])
+    except Exception as e:
+        logger.error(f"Indexing keyframes of recording {recording_id} failed: {e}")
+        return 0
+
+
+@shared_task
+def dispatch_egress():
+    """Start queued recordings on nodes with a free egress slot"""
+    started = egress.dispatch()
+    if started:
+        logger.info(f"Started {started} recording egresses")
+    return started
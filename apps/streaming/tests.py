@@ -1,3 +1,40 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from . import clips
+
+
+class ClipPlanTests(SimpleTestCase):
+    index = {'keyframes': [0.0, 2.0, 4.0, 6.0, 8.0], 'duration': 10.0,
+             'video_codec': 'h264', 'audio_codec': 'aac'}
+
+    def plan(self, start, end, snap=False, **index):
+        return clips.plan({**self.index, **index}, start, end, snap=snap)
+
+    def test_only_the_partial_gops_are_encoded(self):
+        parts, start, end = self.plan(1.0, 7.0)
+        self.assertEqual(parts, [('encode', 1.0, 2.0), ('copy', 2.0, 6.0), ('encode', 6.0, 7.0)])
+        self.assertEqual((start, end), (1.0, 7.0))
+
+    def test_snap_widens_to_keyframes_and_copies_everything(self):
+        parts, start, end = self.plan(1.0, 7.0, snap=True)
+        self.assertEqual(parts, [('copy', 0.0, 8.0)])
+        self.assertEqual((start, end), (0.0, 8.0))
+
+    def test_clip_inside_one_gop_is_encoded(self):
+        parts, _, _ = self.plan(2.5, 3.5)
+        self.assertEqual(parts, [('encode', 2.5, 3.5)])
+
+    def test_other_codecs_are_encoded_whole(self):
+        for codecs in ({'video_codec': 'hevc'}, {'audio_codec': 'opus'}):
+            parts, _, _ = self.plan(1.0, 7.0, **codecs)
+            self.assertEqual(parts, [('encode', 1.0, 7.0)], codecs)
+
+    def test_silent_sources_can_be_spliced(self):
+        parts, _, _ = self.plan(1.0, 7.0, audio_codec=None)
+        self.assertIn(('copy', 2.0, 6.0), parts)
+
+    def test_index_without_an_audio_codec_is_encoded_whole(self):
+        index = dict(self.index)
+        del index['audio_codec']
+        parts, _, _ = clips.plan(index, 1.0, 7.0)
+        self.assertEqual(parts, [('encode', 1.0, 7.0)])
@@ -0,0 +1,349 @@
+"""
+Transcoding of finished recordings into an HLS adaptive bitrate ladder.
+
+Jobs wait in a Redis sorted set scored so that short and popular
+recordings run first, without starving long ones:
+
+    score = queued_at + DURATION_WEIGHT * duration
+                      - POPULARITY_WEIGHT * log2(1 + viewers)
+
+Workers on the `transcode` Celery queue claim a job and an ffmpeg slot on
+their host in one Lua call. Each host runs at most
+max(1, cpu_count * JOBS_PER_CORE) ffmpeg processes however many worker
+processes it has, and each ffmpeg gets an equal share of the cores:
+
+    transcode:queue          zset recording id -> score
+    transcode:running        zset recording id -> lease expiry
+    transcode:slots:<host>   zset recording id -> lease expiry
+
+Each rendition is encoded into <name>.partial/ and renamed into place
+when ffmpeg exits cleanly, so a retry keeps every rendition that made it.
+Keyframes are forced every SEGMENT_SECONDS in every rendition, which keeps
+segment boundaries aligned across the ladder for switching.
+"""
+
+import logging
+import math
+import os
+import shutil
+import socket
+import subprocess
+import time
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.redis_client import decode, get_redis, get_script, make_key
+
+from .models import Recording, TranscodeJob
+
+logger = logging.getLogger(__name__)
+
+RECORDING_CONFIG = getattr(settings, 'RECORDING_CONFIG', {})
+LOCAL_PATH = RECORDING_CONFIG.get('LOCAL_PATH', '/var/recordings/')
+
+TRANSCODE_CONFIG = getattr(settings, 'TRANSCODE_CONFIG', {})
+HLS_PATH = TRANSCODE_CONFIG.get('HLS_PATH') or os.path.join(LOCAL_PATH, 'hls')
+LADDER = TRANSCODE_CONFIG.get('LADDER', [
+    {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 128},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+    {'name': '480p', 'height': 480, 'video_bitrate': 1400, 'audio_bitrate': 96},
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+    {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+])
+SEGMENT_SECONDS = TRANSCODE_CONFIG.get('SEGMENT_SECONDS', 6)
+PRESET = TRANSCODE_CONFIG.get('PRESET', 'veryfast')
+JOBS_PER_CORE = TRANSCODE_CONFIG.get('JOBS_PER_CORE', 0.5)
+JOB_TIMEOUT = TRANSCODE_CONFIG.get('JOB_TIMEOUT', 6 * 60 * 60)
+MAX_ATTEMPTS = TRANSCODE_CONFIG.get('MAX_ATTEMPTS', 3)
+# Added to a failed job's score per attempt, so fresh jobs go ahead of retries
+RETRY_PENALTY = TRANSCODE_CONFIG.get('RETRY_PENALTY', 10 * 60)
+DURATION_WEIGHT = TRANSCODE_CONFIG.get('DURATION_WEIGHT', 1.0)
+POPULARITY_WEIGHT = TRANSCODE_CONFIG.get('POPULARITY_WEIGHT', 600)
+DISPATCH_BATCH = TRANSCODE_CONFIG.get('DISPATCH_BATCH', 16)
+
+QUEUE_KEY = make_key('transcode', 'queue')
+RUNNING_KEY = make_key('transcode', 'running')
+
+# KEYS slots, queue, running; ARGV now, capacity, lease expiry
+CLAIM_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return false
+end
+local job = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+if not job then
+    return false
+end
+redis.call('ZREM', KEYS[2], job)
+redis.call('ZADD', KEYS[1], ARGV[3], job)
+redis.call('ZADD', KEYS[3], ARGV[3], job)
+return job
+"""
+
+
+class TranscodeError(Exception):
+    """ffmpeg failed or the source can't be read"""
+
+
+def ffmpeg_exe():
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def slot_capacity():
+    return max(1, int((os.cpu_count() or 1) * JOBS_PER_CORE))
+
+
+def threads_per_job():
+    return max(1, (os.cpu_count() or 1) // slot_capacity())
+
+
+def _slots_key():
+    return make_key('transcode', 'slots', socket.gethostname())
+
+
+def probe(path):
+    """Duration and frame size of a media file"""
+    import imageio_ffmpeg
+    reader = imageio_ffmpeg.read_frames(path)
+    try:
+        meta = next(reader)
+    except Exception as e:
+        raise TranscodeError(f'cannot read {path}: {e}')
+    finally:
+        reader.close()
+    width, height = meta.get('size') or (None, None)
+    return {'duration': meta.get('duration'), 'width': width, 'height': height}
+
+
+def ladder_for(height):
+    """Rungs no taller than the source; the smallest one always applies"""
+    rungs = [rung for rung in LADDER if not height or rung['height'] <= height]
+    return rungs or [min(LADDER, key=lambda rung: rung['height'])]
+
+
+def output_dir(recording):
+    return os.path.join(HLS_PATH, str(recording.pk))
+
+
+def priority(recording, now=None):
+    duration = recording.duration_seconds or 0
+    return ((now or time.time())
+            + DURATION_WEIGHT * duration
+            - POPULARITY_WEIGHT * math.log2(1 + recording.viewer_count))
+
+
+def register(source_path, room='', creator_id='', egress_id='', duration=None,
+             recorded_at=None, viewer_count=0):
+    """
+    Record a finished recording and queue it for transcoding, once.
+    Returns the job, or None if it was already registered.
+    """
+    recording, created = Recording.objects.get_or_create(
+        source_path=source_path,
+        defaults={
+            'room': room, 'creator_id': creator_id, 'egress_id': egress_id,
+            'duration_seconds': duration, 'recorded_at': recorded_at,
+            'viewer_count': viewer_count,
+        },
+    )
+    if not created:
+        return None
+    job = TranscodeJob.objects.create(recording=recording, priority=priority(recording))
+    enqueue(job)
+    return job
+
+
+def enqueue(job, penalty=0):
+    get_redis().zadd(QUEUE_KEY, {job.recording_id: job.priority + penalty})
+
+
+def claim(now=None):
+    """
+    Take the best queued job if this host has a free ffmpeg slot.
+    Returns its recording id or None.
+    """
+    now = now or time.time()
+    job = get_script(CLAIM_SCRIPT)(
+        keys=[_slots_key(), QUEUE_KEY, RUNNING_KEY],
+        args=[now, slot_capacity(), now + JOB_TIMEOUT],
+    )
+    return int(decode(job)) if job else None
+
+
+def release(recording_id):
+    pipe = get_redis().pipeline()
+    pipe.zrem(_slots_key(), recording_id)
+    pipe.zrem(RUNNING_KEY, recording_id)
+    pipe.execute()
+
+
+def requeue_expired(now=None):
+    """Put back jobs whose worker died without releasing them"""
+    r = get_redis()
+    expired = r.zrangebyscore(RUNNING_KEY, '-inf', now or time.time())
+    requeued = 0
+    for member in expired:
+        recording_id = int(decode(member))
+        if not r.zrem(RUNNING_KEY, recording_id):
+            continue
+        job = TranscodeJob.objects.filter(recording_id=recording_id).first()
+        if job and job.status in (TranscodeJob.STATUS_QUEUED, TranscodeJob.STATUS_RUNNING):
+            enqueue(job)
+            requeued += 1
+    return requeued
+
+
+def queued_count():
+    return get_redis().zcard(QUEUE_KEY)
+
+
+def _complete(directory):
+    playlist = os.path.join(directory, 'index.m3u8')
+    if not os.path.exists(playlist):
+        return False
+    with open(playlist) as f:
+        return '#EXT-X-ENDLIST' in f.read()
+
+
+def _encode(source, target, rung, threads, timeout):
+    partial = f'{target}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    video_bitrate = rung['video_bitrate']
+    command = [
+        ffmpeg_exe(), '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+        '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f"scale=-2:{rung['height']}",
+        '-c:v', 'libx264', '-preset', PRESET, '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_bitrate}k', '-maxrate', f'{int(video_bitrate * 1.07)}k',
+        '-bufsize', f'{video_bitrate * 2}k',
+        '-force_key_frames', f'expr:gte(t,n_forced*{SEGMENT_SECONDS})', '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', f"{rung['audio_bitrate']}k", '-ac', '2',
+        '-threads', str(threads),
+        '-f', 'hls', '-hls_time', str(SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(partial, 'seg_%05d.ts'),
+        os.path.join(partial, 'index.m3u8'),
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"{rung['name']} timed out after {int(timeout)}s")
+    if result.returncode != 0:
+        raise TranscodeError(f"{rung['name']} failed: {result.stderr.strip()[-500:]}")
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(partial, target)
+
+
+def _write_master(directory, rungs, width, height):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rung in sorted(rungs, key=lambda rung: rung['height'], reverse=True):
+        bandwidth = (rung['video_bitrate'] + rung['audio_bitrate']) * 1000
+        info = f'BANDWIDTH={int(bandwidth * 1.1)},AVERAGE-BANDWIDTH={bandwidth}'
+        if width and height:
+            scaled = round(width * rung['height'] / height)
+            scaled -= scaled % 2
+            info += f",RESOLUTION={scaled}x{rung['height']}"
+        lines += [f'#EXT-X-STREAM-INF:{info}', f"{rung['name']}/index.m3u8"]
+
+    path = os.path.join(directory, 'master.m3u8')
+    with open(f'{path}.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(f'{path}.tmp', path)
+
+
+def transcode(job):
+    """
+    Encode every missing rendition of a job's recording and write the
+    master playlist. Progress is saved after each rendition.
+    """
+    recording = job.recording
+    if not os.path.exists(recording.source_path):
+        raise TranscodeError(f'{recording.source_path} does not exist')
+
+    meta = probe(recording.source_path)
+    recording.duration_seconds = meta['duration'] or recording.duration_seconds
+    recording.width, recording.height = meta['width'], meta['height']
+    recording.size_bytes = os.path.getsize(recording.source_path)
+    recording.save(update_fields=['duration_seconds', 'width', 'height', 'size_bytes'])
+
+    directory = output_dir(recording)
+    os.makedirs(directory, exist_ok=True)
+    rungs = ladder_for(recording.height)
+    threads = threads_per_job()
+    deadline = time.monotonic() + JOB_TIMEOUT
+    duration = recording.duration_seconds or 0
+
+    renditions = dict(job.renditions or {})
+    encoded_seconds = 0.0
+    for rung in rungs:
+        target = os.path.join(directory, rung['name'])
+        if _complete(target):
+            renditions.setdefault(rung['name'], {'height': rung['height']})['reused'] = True
+            continue
+
+        started = time.monotonic()
+        _encode(recording.source_path, target, rung, threads, deadline - started)
+        elapsed = time.monotonic() - started
+        encoded_seconds += elapsed
+        renditions[rung['name']] = {
+            'height': rung['height'],
+            'video_bitrate': rung['video_bitrate'],
+            'encode_seconds': round(elapsed, 2),
+            'speed': round(duration / elapsed, 2) if elapsed else None,
+            'reused': False,
+        }
+        job.renditions = renditions
+        job.save(update_fields=['renditions'])
+
+    _write_master(directory, rungs, recording.width, recording.height)
+
+    encoded = sum(1 for r in renditions.values() if not r.get('reused'))
+    job.renditions = renditions
+    job.encode_seconds = round(encoded_seconds, 2)
+    job.speed = round(duration * encoded / encoded_seconds, 2) if encoded_seconds else None
+    return job
+
+
+def run_job(recording_id):
+    """
+    Run a claimed job to completion, or schedule a retry on failure.
+    The caller releases the claim.
+    """
+    job = TranscodeJob.objects.select_related('recording').filter(recording_id=recording_id).first()
+    if job is None or job.status == TranscodeJob.STATUS_DONE:
+        return job
+
+    job.status = TranscodeJob.STATUS_RUNNING
+    job.attempts += 1
+    job.worker = socket.gethostname()
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'worker', 'started_at'])
+
+    try:
+        transcode(job)
+    except Exception as e:
+        job.error = str(e)
+        if job.attempts < MAX_ATTEMPTS:
+            job.status = TranscodeJob.STATUS_QUEUED
+            enqueue(job, penalty=RETRY_PENALTY * job.attempts)
+        else:
+            job.status = TranscodeJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        logger.error(f"Transcoding recording {recording_id} failed (attempt {job.attempts}): {e}")
+        return job
+
+    job.status = TranscodeJob.STATUS_DONE
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'renditions', 'encode_seconds', 'speed'])
+    encoded = sum(1 for r in job.renditions.values() if not r.get('reused'))
+    logger.info(
+        f"Transcoded recording {recording_id}: encoded {encoded} of {len(job.renditions)} renditions "
+        f"in {job.encode_seconds}s ({job.speed or '-'}x realtime)"
+    )
+    return job
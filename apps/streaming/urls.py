@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'streaming'
+
+urlpatterns = [
+    path('v1/recordings/<int:recording_id>/', views.recording_detail, name='recording_detail'),
+    path('v1/recordings/<int:recording_id>/clips/', views.recording_clips, name='recording_clips'),
+    path('v1/recordings/<int:recording_id>/thumbnail/', views.recording_thumbnail, name='recording_thumbnail'),
+    path('v1/recordings/jobs/', views.recording_jobs, name='recording_jobs'),
+    path('v1/recordings/jobs/<int:job_id>/', views.recording_job, name='recording_job'),
+]
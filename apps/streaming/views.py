@@ -1,3 +1,270 @@
-from django.shortcuts import render
+import json
+import logging
+from django.http import FileResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
 
-# Create your views here.
+from apps.core.authentication import ServiceTokenAuthentication, authenticate_user
+from apps.core.idempotency import idempotent
+from apps.livestream import directory
+from apps.livestream.livekit import LiveKitError
+
+from . import clips, egress, tasks
+from .models import Recording, RecordingJob, TranscodeJob
+from .transcoding import TranscodeError
+
+logger = logging.getLogger(__name__)
+
+
+def _clip_data(clip):
+    return {
+        'id': clip.pk,
+        'recording_id': clip.recording_id,
+        'title': clip.title,
+        'creator_id': clip.creator_id,
+        'start_seconds': clip.start_seconds,
+        'end_seconds': clip.end_seconds,
+        'url': clip.url,
+        'size_bytes': clip.size_bytes,
+        'copied_seconds': clip.copied_seconds,
+        'encoded_seconds': clip.encoded_seconds,
+        'extract_seconds': clip.extract_seconds,
+        'created_at': clip.created_at.isoformat(),
+    }
+
+
+def _job_data(job):
+    return {
+        'id': job.pk,
+        'room_name': job.room,
+        'creator_id': job.creator_id,
+        'tier': job.tier,
+        'status': job.status,
+        'node': job.node,
+        'egress_id': job.egress_id,
+        'attempts': job.attempts,
+        'next_attempt_at': job.next_attempt_at.isoformat() if job.next_attempt_at else None,
+        'error': job.error,
+        'location': job.location,
+        'recording_id': job.recording_id,
+        'requested_at': job.requested_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'ended_at': job.ended_at.isoformat() if job.ended_at else None,
+    }
+
+
+def _room_manager(request, creator_id):
+    """
+    (True, None) for the main app's own service calls, (False, None) for
+    the creator named, or (False, 401/403/404 response)
+    """
+    try:
+        if not request.headers.get('X-User-Id') and ServiceTokenAuthentication().authenticate(request) is not None:
+            return True, None
+        user_id = authenticate_user(request)
+    except AuthenticationFailed as e:
+        return False, JsonResponse({'error': str(e.detail)}, status=401)
+    if not user_id:
+        return False, JsonResponse({'error': 'Authentication required'}, status=401)
+    if not creator_id:
+        return False, JsonResponse({'error': 'Room is not registered'}, status=404)
+    if creator_id != user_id:
+        return False, JsonResponse({'error': "Only the room's creator can manage its recordings"}, status=403)
+    return False, None
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def recording_detail(request, recording_id):
+    """
+    A recording with its transcode status and playback URLs
+    """
+    try:
+        recording = Recording.objects.select_related('transcode_job').filter(pk=recording_id).first()
+        if recording is None:
+            return JsonResponse({'error': 'Recording not found'}, status=404)
+
+        job = getattr(recording, 'transcode_job', None)
+        ready = job is not None and job.status == TranscodeJob.STATUS_DONE
+        return JsonResponse({
+            'id': recording.pk,
+            'room': recording.room,
+            'creator_id': recording.creator_id,
+            'duration_seconds': recording.duration_seconds,
+            'recorded_at': recording.recorded_at.isoformat() if recording.recorded_at else None,
+            'transcode_status': job.status if job else None,
+            'renditions': sorted(job.renditions) if ready else [],
+            'hls_url': recording.hls_url if ready else None,
+            'thumbnail_url': recording.thumbnail_url,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def recording_clips(request, recording_id):
+    """
+    GET: clips cut from a recording
+    POST: cut a clip as the authenticated user ({start, end, title?, snap?};
+    seconds). snap=true widens the clip to the nearest keyframes so nothing
+    is re-encoded. 409 until the recording's keyframe index is built.
+    """
+    try:
+        recording = Recording.objects.filter(pk=recording_id).first()
+        if recording is None:
+            return JsonResponse({'error': 'Recording not found'}, status=404)
+
+        if request.method == 'GET':
+            return JsonResponse({
+                'clips': [_clip_data(clip) for clip in recording.clips.exclude(completed_at=None).order_by('-created_at')],
+                'status': 'success'
+            })
+
+        try:
+            user_id = authenticate_user(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({'error': str(e.detail)}, status=401)
+        if not user_id:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+
+        data = json.loads(request.body)
+        if data.get('creator_id') is not None and str(data['creator_id']) != user_id:
+            return JsonResponse({'error': 'creator_id does not match the authenticated user'}, status=403)
+        try:
+            start, end = float(data['start']), float(data['end'])
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'error': 'start and end (seconds) are required'}, status=400)
+
+        try:
+            clip = clips.create_clip(
+                recording, start, end,
+                title=str(data.get('title') or '')[:255],
+                creator_id=user_id,
+                snap=bool(data.get('snap')),
+            )
+        except clips.IndexNotReady as e:
+            return JsonResponse({'error': str(e)}, status=409)
+        except TranscodeError as e:
+            logger.error(f"Clipping recording {recording_id} failed: {e}")
+            return JsonResponse({'error': str(e)}, status=422)
+
+        return JsonResponse({'clip': _clip_data(clip), 'status': 'success'}, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def recording_thumbnail(request, recording_id):
+    """
+    JPEG of the keyframe at or before ?t= seconds; 409 until the
+    recording's keyframe index is built
+    """
+    try:
+        recording = Recording.objects.filter(pk=recording_id).first()
+        if recording is None:
+            return JsonResponse({'error': 'Recording not found'}, status=404)
+        try:
+            at = max(0.0, float(request.GET.get('t', 0)))
+        except ValueError:
+            return JsonResponse({'error': 't must be a number of seconds'}, status=400)
+
+        try:
+            path = clips.thumbnail(recording, at)
+        except clips.IndexNotReady as e:
+            return JsonResponse({'error': str(e)}, status=409)
+        except TranscodeError as e:
+            return JsonResponse({'error': str(e)}, status=422)
+
+        response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+        response['Cache-Control'] = 'public, max-age=86400'
+        return response
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@idempotent
+def recording_jobs(request):
+    """
+    GET: recording jobs, newest first (?room=, ?status=)
+    POST: record a room ({room_name, tier?: paid|free}) as its creator; paid
+    creators are started first. Only the main app (service token) may ask
+    for the paid tier or pass creator_id.
+    """
+    try:
+        if request.method == 'GET':
+            jobs = RecordingJob.objects.order_by('-requested_at')
+            if request.GET.get('room'):
+                jobs = jobs.filter(room=request.GET['room'])
+            if request.GET.get('status'):
+                jobs = jobs.filter(status=request.GET['status'])
+            return JsonResponse({'jobs': [_job_data(job) for job in jobs[:100]], 'status': 'success'})
+
+        data = json.loads(request.body)
+        room_name = data.get('room_name')
+        if not room_name:
+            return JsonResponse({'error': 'room_name is required'}, status=400)
+        creator_id = directory.get_room_creator(room_name)
+        trusted, denied = _room_manager(request, creator_id)
+        if denied is not None:
+            return denied
+        if trusted:
+            creator_id = str(data.get('creator_id') or creator_id or '')
+        tier = data.get('tier', RecordingJob.TIER_FREE)
+        if tier not in dict(RecordingJob.TIER_CHOICES):
+            return JsonResponse({'error': 'tier must be paid or free'}, status=400)
+        if tier != RecordingJob.TIER_FREE and not trusted:
+            return JsonResponse({'error': 'Only the main app can request the paid tier'}, status=403)
+
+        job, created = egress.request_recording(room_name, creator_id, tier)
+        if created:
+            tasks.dispatch_egress.delay()
+        return JsonResponse({'job': _job_data(job), 'status': 'success'}, status=201 if created else 200)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def recording_job(request, job_id):
+    """
+    GET: a recording job
+    DELETE: drop it from the queue, or stop its egress if it is running
+    (the room's creator or the main app only)
+    """
+    try:
+        job = RecordingJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return JsonResponse({'error': 'Recording job not found'}, status=404)
+
+        if request.method == 'DELETE':
+            _, denied = _room_manager(request, job.creator_id or directory.get_room_creator(job.room))
+            if denied is not None:
+                return denied
+            try:
+                egress.cancel(job)
+            except LiveKitError as e:
+                logger.error(f"Stopping egress {job.egress_id} failed: {e}")
+                return JsonResponse({'error': str(e)}, status=502)
+
+        return JsonResponse({'job': _job_data(job), 'status': 'success'})
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration for the livestream web process.
+
+    gunicorn -c livestream_project/gunicorn_conf.py livestream_project.wsgi:application
+
+Worker class and pool sizes follow SERVING_MODE (see serving.py):
+    sync   - WEB_CONCURRENCY processes, one request at a time each
+    gevent - fewer processes, each multiplexing GEVENT_WORKER_CONNECTIONS
+             greenlets so blocking LiveKit/main app calls don't pin a process
+"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from livestream_project import serving  # noqa: E402
+
+# Patch as early as possible: the config file is loaded by the master before
+# the application is imported (including with --preload).
+if serving.is_gevent():
+    serving.patch_gevent()
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+if serving.is_gevent():
+    worker_class = 'gevent'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count))
+    # Each greenlet that touches the ORM holds its own DB connection, so
+    # workers * worker_connections is the upper bound on Postgres connections.
+    worker_connections = int(os.environ.get('GEVENT_WORKER_CONNECTIONS', '100'))
+else:
+    worker_class = 'sync'
+    workers = int(os.environ.get('WEB_CONCURRENCY', '3'))
+
+
+def when_ready(server):
+    """Close DB connections opened while preloading, before workers fork."""
+    if 'django.db' in sys.modules:
+        from django.db import connections
+        connections.close_all()
@@ -0,0 +1,69 @@
+"""
+Serving mode helpers shared by wsgi.py and the gunicorn config.
+
+SERVING_MODE selects how the web process is run:
+    sync   - plain gunicorn sync workers (default)
+    gevent - gunicorn gevent workers, cooperative I/O for upstream calls
+    asgi   - daphne serving livestream_project.asgi:application
+
+Nothing in this module may import Django at module level: patch_gevent()
+has to run before Django, requests or psycopg2 create any sockets or locks.
+"""
+
+import os
+
+SERVING_MODES = ('sync', 'gevent', 'asgi')
+
+SERVING_MODE = os.environ.get('SERVING_MODE', 'sync').lower()
+if SERVING_MODE not in SERVING_MODES:
+    SERVING_MODE = 'sync'
+
+_patched = False
+
+
+def is_gevent():
+    return SERVING_MODE == 'gevent'
+
+
+def patch_gevent():
+    """
+    Monkey-patch the stdlib and make psycopg2 cooperative.
+    Safe to call more than once; only the first call does anything.
+    """
+    global _patched
+    if _patched:
+        return
+
+    from gevent import monkey
+    monkey.patch_all()
+    make_psycopg_green()
+    _patched = True
+
+
+def make_psycopg_green():
+    """
+    Register a gevent-aware wait callback so psycopg2 yields to the hub
+    while waiting on Postgres instead of blocking the whole worker.
+    """
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return
+
+    extensions.set_wait_callback(_gevent_wait_callback)
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions, OperationalError
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state}")
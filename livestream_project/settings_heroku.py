@@ -12,7 +12,7 @@ if 'DATABASE_URL' in os.environ:
     DATABASES = {
         'default': dj_database_url.config(
             default='sqlite:///db.sqlite3',
-            conn_max_age=600,
+            conn_max_age=0 if SERVING_MODE == 'gevent' else 600,
             conn_health_checks=True,
         )
     }
@@ -23,10 +23,11 @@ if 'REDIS_URL' in os.environ:
     
     CACHES = {
         'default': {
-            'BACKEND': 'django_redis.cache.RedisCache',
+            'BACKEND': CACHES['default']['BACKEND'],
             'LOCATION': REDIS_URL,
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'LOCAL_CACHE': CACHES['default']['OPTIONS']['LOCAL_CACHE'],
             }
         }
     }
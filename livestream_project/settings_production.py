@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.profiling.ProfilingMiddleware',
+    'apps.core.tracing.TracingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,6 +64,22 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Reduced middleware chains by URL prefix (apps.core.fastlane, used by wsgi.py
+# and asgi.py). The livestream API is stateless JSON behind csrf_exempt views,
+# so it skips sessions, CSRF, auth, messages and X-Frame-Options.
+FAST_LANE_CONFIG = {
+    'ENABLED': os.environ.get('FAST_LANE_ENABLED', 'True').lower() == 'true',
+    'LANES': {
+        '/api/v1/livestream/': [
+            'apps.core.profiling.ProfilingMiddleware',
+            'apps.core.tracing.TracingMiddleware',
+            'corsheaders.middleware.CorsMiddleware',
+            'django.middleware.security.SecurityMiddleware',
+            'django.middleware.common.CommonMiddleware',
+        ],
+    },
+}
+
 ROOT_URLCONF = 'livestream_project.urls'
 
 TEMPLATES = [
@@ -97,6 +115,7 @@ if os.environ.get('LIVESTREAM_DB_HOST'):
                 'connect_timeout': 20,
             },
             'CONN_MAX_AGE': 300,  # Keep connections alive
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 else:
@@ -108,6 +127,15 @@ else:
         }
     }
 
+# Serving mode (sync / gevent / asgi), see livestream_project/serving.py
+from livestream_project.serving import SERVING_MODE
+
+if SERVING_MODE == 'gevent':
+    # Every greenlet gets its own connection object. Persistent connections
+    # would outlive the greenlet that opened them and leak until GC, so close
+    # them at the end of each request instead.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -185,16 +213,26 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redis Configuration with fallback
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+# Two-tier cache: an in-process LRU in front of Redis, kept coherent across
+# workers by pub/sub invalidation (see apps/core/cache.py)
+CACHE_LOCAL_TIER = os.environ.get('CACHE_LOCAL_TIER', 'True').lower() == 'true'
+
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'apps.core.cache.TwoTierRedisCache' if CACHE_LOCAL_TIER else 'django_redis.cache.RedisCache',
         'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             'CONNECTION_POOL_KWARGS': {
                 'max_connections': 50,
                 'retry_on_timeout': True,
-            }
+            },
+            'LOCAL_CACHE': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', '5000')),
+                'TIMEOUT': int(os.environ.get('CACHE_LOCAL_TIMEOUT', '30')),  # max staleness if an invalidation is lost
+                # Hot, read-mostly keys (LiveKit endpoint table, room metadata); empty: every key
+                'KEY_PREFIXES': ['livekit:', 'room:'],
+            },
         },
         'TIMEOUT': 300,
         'KEY_PREFIX': 'livestream',
@@ -215,6 +253,62 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# ffmpeg work gets its own workers: celery -A livestream_project worker -Q transcode
+CELERY_TASK_ROUTES = {
+    'apps.streaming.tasks.run_transcodes': {'queue': 'transcode'},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'archive-chat-history': {
+        'task': 'apps.livestream.tasks.archive_chat_history',
+        'schedule': 30.0,
+    },
+    'settle-wallet-reservations': {
+        'task': 'apps.livestream.tasks.settle_wallet_reservations',
+        'schedule': 15.0,
+    },
+    'probe-livekit-endpoints': {
+        'task': 'apps.livestream.tasks.probe_livekit_endpoints',
+        'schedule': 10.0,
+    },
+    'prewarm-scheduled-shows': {
+        'task': 'apps.livestream.tasks.prewarm_scheduled_shows',
+        'schedule': 30.0,
+    },
+    'refill-ingress-pools': {
+        'task': 'apps.livestream.tasks.refill_ingress_pools',
+        'schedule': 30.0,
+    },
+    'reconcile-rooms': {
+        'task': 'apps.livestream.tasks.reconcile_rooms',
+        'schedule': 60.0,
+    },
+    'flush-viewer-sessions': {
+        'task': 'apps.analytics.tasks.flush_viewer_sessions',
+        'schedule': 10.0,
+    },
+    'maintain-viewer-sessions': {
+        'task': 'apps.analytics.tasks.maintain_viewer_sessions',
+        'schedule': 60.0 * 60,
+    },
+    'dispatch-transcodes': {
+        'task': 'apps.streaming.tasks.dispatch_transcodes',
+        'schedule': 30.0,
+    },
+    'dispatch-egress': {
+        'task': 'apps.streaming.tasks.dispatch_egress',
+        'schedule': 10.0,
+    },
+    'refresh-subscriber-indexes': {
+        'task': 'apps.livestream.tasks.refresh_subscriber_indexes',
+        'schedule': 10.0 * 60,
+    },
+    'flush-pending-gift-leaderboards': {
+        'task': 'apps.livestream.tasks.flush_pending_gift_leaderboards',
+        'schedule': 300.0,
+    },
+}
+
 # Django Channels
 CHANNEL_LAYERS = {
     'default': {
@@ -255,6 +349,8 @@ MAIN_APP_CONFIG = {
     'BASE_URL': os.environ.get('MAIN_APP_URL', 'https://your-main-app.com'),
     'TOKEN': os.environ.get('MAIN_APP_TOKEN', ''),
     'TIMEOUT': 30,
+    # Signs end-user tokens (Authorization: Bearer); SECRET_KEY if unset
+    'USER_TOKEN_SECRET': os.environ.get('MAIN_APP_USER_TOKEN_SECRET', ''),
 }
 
 # LiveKit Configuration
@@ -264,6 +360,203 @@ LIVEKIT_CONFIG = {
     'API_KEY': os.environ.get('LIVEKIT_API_KEY', 'devkey'),
     'API_SECRET': os.environ.get('LIVEKIT_API_SECRET', 'secret'),
     'WEBHOOK_SECRET': os.environ.get('LIVEKIT_WEBHOOK_SECRET', ''),
+    # Comma-separated HTTP URLs of every LiveKit node; defaults to HTTP_URL
+    'NODES': [url.strip() for url in os.environ.get('LIVEKIT_NODES', '').split(',') if url.strip()],
+    # Addresses of the same server to choose between, as
+    # [{'name', 'http_url', 'ws_url'}]; defaults to HTTP_URL/WS_URL and the fallback IP
+    'ENDPOINTS': [],
+}
+
+# Background RTT/availability probes of the LiveKit endpoints (see apps/livestream/endpoints.py)
+LIVEKIT_PROBE_CONFIG = {
+    'TIMEOUT': 2,  # seconds per probe
+    'ALPHA': 0.3,  # EWMA weight of the newest probe
+    'FAILURE_THRESHOLD': 2,  # consecutive failed probes before an endpoint is skipped
+    'TABLE_TTL': 60,  # seconds the table is trusted without a fresh probe
+}
+
+# Live room directory
+ROOM_DIRECTORY_CONFIG = {
+    'GIFT_HALF_LIFE': int(os.environ.get('DIRECTORY_GIFT_HALF_LIFE', '300')),  # seconds
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    'PENDING_TTL': 24 * 60 * 60,  # unstarted host registrations
+}
+
+# Versioned participant polling
+PARTICIPANTS_CONFIG = {
+    'REFRESH_INTERVAL': float(os.environ.get('PARTICIPANTS_REFRESH_INTERVAL', '2')),  # seconds
+    'MAX_TOMBSTONES': 5000,  # leaves kept before delta clients fall back to snapshots
+    'STATE_TTL': 24 * 60 * 60,
+    'MAX_FIELDS': 10,  # per ?fields= request
+    'READ_CHUNK_SIZE': 64 * 1024,
+    'WRITE_CHUNK_SIZE': 64 * 1024,
+    'STORE_SCAN_COUNT': 1000,  # participants per HSCAN when ?fields= reads the store
+}
+
+# Sampling profiler for requests with a signed X-Profile header
+# (manage.py profiles --token) or picked at SAMPLE_RATE. Not available
+# under SERVING_MODE=gevent (greenlet stacks can't be sampled from a thread).
+PROFILING_CONFIG = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'HEADER_ENABLED': os.environ.get('PROFILING_HEADER_ENABLED', 'True').lower() == 'true',
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'MIN_DURATION_MS': int(os.environ.get('PROFILING_MIN_DURATION_MS', '100')),  # for sampled requests
+    'TOKEN_MAX_AGE': 60 * 60,
+    'STORAGE': 'media' if USE_S3 else 'local',
+    'LOCAL_PATH': os.environ.get('PROFILING_LOCAL_PATH', str(BASE_DIR / 'profiles')),
+}
+
+# Distributed tracing of requests and Celery tasks (W3C traceparent propagation)
+TRACING_CONFIG = {
+    'ENABLED': os.environ.get('TRACING_ENABLED', 'False').lower() == 'true',
+    'SAMPLE_RATE': float(os.environ.get('TRACING_SAMPLE_RATE', '0.01')),
+    'MAX_TRACES_PER_SECOND': int(os.environ.get('TRACING_MAX_TRACES_PER_SECOND', '10')),  # per process
+    'MAX_SPANS_PER_TRACE': 500,
+    # Any class with export(spans); JsonFileExporter appends JSON lines locally
+    'EXPORTER': os.environ.get('TRACING_EXPORTER', 'apps.core.tracing.JsonFileExporter'),
+    'EXPORTER_OPTIONS': {'path': os.environ.get('TRACING_FILE', str(BASE_DIR / 'traces.jsonl'))},
+    'QUEUE_SIZE': 1000,
+    'SERVICE_NAME': 'livestream_service',
+}
+
+# Replay of POST responses for retried requests carrying an Idempotency-Key header
+IDEMPOTENCY_CONFIG = {
+    'TTL': 24 * 60 * 60,  # how long a completed response is replayed
+    'LOCK_TTL': 60,  # longest a request holds its key while running
+    'WAIT_TIMEOUT': 10,  # how long a duplicate waits for the in-flight request
+    'POLL_INTERVAL': 0.05,
+}
+
+# Rooms created ahead of scheduled shows
+SCHEDULED_SHOW_CONFIG = {
+    'PREWARM_LEAD': 5 * 60,  # create the room this long before the start
+    'HOST_GRACE': 15 * 60,  # how long past the start the room waits for its host
+    'PARTICIPANT_HEADROOM': 1.5,  # max_participants = expected viewers * headroom
+    'DEFAULT_MAX_PARTICIPANTS': 0,  # unlimited when there's no estimate
+    'MAX_CONCURRENCY': 32,  # concurrent CreateRoom / UpdateRoomMetadata calls
+    'MAX_ATTEMPTS': 3,
+    'BATCH_SIZE': 1000,
+}
+
+# Pre-created LiveKit ingresses for creators going live from OBS
+INGRESS_CONFIG = {
+    # Idle ingresses kept warm on every LiveKit node, per input type
+    'POOL_SIZES': {
+        'RTMP_INPUT': int(os.environ.get('INGRESS_POOL_RTMP', '2')),
+        'WHIP_INPUT': int(os.environ.get('INGRESS_POOL_WHIP', '1')),
+    },
+    'MAX_CONCURRENCY': 4,
+    'LOCK_TIMEOUT': 2 * 60,
+}
+
+# Viewer admission at token issuance (per-room and per-LiveKit-node seat limits)
+ADMISSION_CONFIG = {
+    'ROOM_LIMIT': int(os.environ.get('ADMISSION_ROOM_LIMIT', '1000')),  # concurrent viewers per room
+    'NODE_LIMIT': int(os.environ.get('ADMISSION_NODE_LIMIT', '5000')),  # concurrent viewers per LiveKit node
+    'JOIN_TTL': 60,  # seconds an unused token holds its seat
+    'SESSION_TTL': 6 * 60 * 60,  # seat lifetime after joining, in case the leave webhook is lost
+    'QUEUE_TTL': 30,  # seconds a waiting viewer keeps their place without polling
+    'POLL_INTERVAL': 5,
+    # Overflow viewers get this HLS URL ({room_name} is filled in) instead of queueing
+    'HLS_FALLBACK_URL': os.environ.get('ADMISSION_HLS_FALLBACK_URL', ''),
+}
+
+# Server-Sent Events stream of room state (served by the ASGI server)
+ROOM_EVENTS_CONFIG = {
+    'HEARTBEAT_INTERVAL': 15,  # seconds
+    'BACKLOG_SIZE': 500,  # events kept per room for Last-Event-ID resume
+    'BACKLOG_TTL': 60 * 60,
+    'QUEUE_SIZE': 256,  # per listener before a slow client is cut off
+    'MAX_STREAM_SECONDS': 300,
+}
+
+# Reactions and gifts aggregated per room and broadcast once per window
+# over the LiveKit data channel by `manage.py broadcast_reactions` (the
+# `reactions` process); without it pending events just expire after PENDING_TTL
+REACTIONS_CONFIG = {
+    'KINDS': ('heart', 'like', 'laugh', 'wow', 'fire', 'clap'),
+    'WINDOW_MS': 150,
+    'MAX_WINDOW_MS': 250,  # the window stretches up to this while passes run long
+    'TOP_ITEMS': 5,  # gift types named in each packet
+    'MAX_COUNT': 50,  # taps per request
+    'MAX_CONCURRENCY': 32,  # SendData calls in flight
+    'PACKET_KIND': 'LOSSY',
+    'TOPIC': 'reactions',
+    'PENDING_TTL': 60,
+    'LEADER_TTL_MS': 2000,
+}
+
+# Per-creator subscriber bitmaps gating subscriber-only rooms at token issuance
+SUBSCRIPTION_INDEX_CONFIG = {
+    'CHUNK_BITS': 65536,  # user IDs per chunk (8 KiB as a bitmap)
+    'ARRAY_MAX': 512,  # chunks with more subscribers switch from an intset to a bitmap
+    'LOAD_PAGE_SIZE': 10000,  # subscribers per main app page during a bulk load
+    'LOAD_TTL': 10 * 60,  # longest a bulk load may run
+    'REFRESH_INTERVAL': 6 * 60 * 60,  # reload to repair missed subscribe/unsubscribe events
+    'MAX_EVENTS': 1000,  # per events request from the main app
+    'MAX_LIVE_IDS': 1000,
+    'VIEWER_TTL': 24 * 60 * 60,
+}
+
+# Stale room reaper (reconciles the directory against every LiveKit node)
+ROOM_REAPER_CONFIG = {
+    'MAX_CONCURRENCY': int(os.environ.get('ROOM_REAPER_CONCURRENCY', '8')),  # LiveKit calls in flight
+    'GRACE_PERIOD': 120,  # seconds before a new room can be considered stale
+    'EMPTY_ROOM_TIMEOUT': 10 * 60,  # seconds a room may sit with nobody in it, counted from when it emptied
+    'MAX_DELETES': 500,  # DeleteRoom calls per run
+    'LOCK_TIMEOUT': 5 * 60,
+}
+
+# Chat history: Redis Streams per room, archived to Postgres by Celery beat.
+# Appends cap a stream at MAX_LENGTH by dropping only archived entries; a
+# room over the cap with unarchived entries is archived right away instead
+# of at the next beat.
+CHAT_CONFIG = {
+    'MAX_LENGTH': int(os.environ.get('CHAT_STREAM_MAX_LENGTH', '5000')),  # per room
+    'TRIM_BATCH': 100,  # archived entries an append may trim at most
+    'ARCHIVE_LOCK_TTL': 5 * 60,
+    'RETENTION': 60 * 60,  # seconds kept in Redis after archiving
+    'ARCHIVE_BATCH_SIZE': 5000,
+    'MAX_MESSAGE_LENGTH': 500,
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 200,
+}
+
+# Chat moderation filter
+MODERATION_CONFIG = {
+    'RELOAD_INTERVAL': 1.0,  # seconds between blocklist version checks per process
+    'CACHE_SIZE': 256,  # compiled filters kept per process
+    'MASK_CHAR': '*',
+}
+
+# Gift leaderboards: Redis sorted sets while live, flushed to Postgres on room_finished
+GIFT_LEADERBOARD_CONFIG = {
+    'RECENT_WINDOW': int(os.environ.get('GIFT_LEADERBOARD_RECENT_WINDOW', '600')),  # seconds
+    'UNION_TTL': 5,  # seconds a computed recent board is reused
+    'ROOM_TTL': 24 * 60 * 60,
+    'CLOSED_TTL': 7 * 24 * 60 * 60,  # finished boards kept in Redis until flushed
+    'FLUSH_BATCH_SIZE': 1000,
+    'FLUSH_GRACE': 5 * 60,
+    'TOP_SIZE': 10,
+    'MAX_TOP_SIZE': 100,
+}
+
+# Wallet escrow: gift allowances reserved from the main app, settled in batches
+WALLET_ESCROW_CONFIG = {
+    'ALLOWANCE': int(os.environ.get('WALLET_ESCROW_ALLOWANCE', '500')),  # coins reserved per room entry / top-up
+    'IDLE_TIMEOUT': 15 * 60,  # seconds without a gift before the allowance is released
+    'RESERVATION_TTL': 24 * 60 * 60,  # expiry of the per-room holder sets; reservations themselves never expire
+    'SETTLE_BATCH_SIZE': 500,
+}
+
+# Viewer session analytics (day-partitioned table on PostgreSQL)
+ANALYTICS_CONFIG = {
+    'SESSION_FLUSH_BATCH_SIZE': 5000,
+    'SESSION_FLUSH_LOCK_TIMEOUT': 5 * 60,
+    'MAX_SESSION_SECONDS': 12 * 60 * 60,  # open sessions older than this are closed
+    'PARTITION_DAYS_AHEAD': 7,
+    'SESSION_RETENTION_DAYS': None,  # days of partitions kept; None keeps everything
 }
 
 # Recording Configuration
@@ -275,6 +568,52 @@ RECORDING_CONFIG = {
     'LOCAL_PATH': '/var/recordings/',
 }
 
+# Recording egress scheduling: per-node concurrency, paid-tier priority and retries
+EGRESS_CONFIG = {
+    'MAX_PER_NODE': int(os.environ.get('EGRESS_MAX_PER_NODE', '4')),
+    'NODE_LIMITS': {},  # node URL -> concurrent egresses, overriding MAX_PER_NODE
+    'PRIORITY_BOOST': {'paid': 60 * 60, 'free': 0},  # seconds of queue advance per tier
+    'MAX_ATTEMPTS': 4,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 10 * 60,
+    'LOST_AFTER': 2 * 60,
+    'LAYOUT': 'speaker',
+    'FILE_TYPE': 'MP4',
+}
+
+# HLS ladder transcoding of finished recordings (run by the `transcode` Celery queue)
+TRANSCODE_CONFIG = {
+    'HLS_PATH': os.environ.get('TRANSCODE_HLS_PATH', ''),  # defaults to LOCAL_PATH/hls
+    'LADDER': [
+        {'name': '1080p', 'height': 1080, 'video_bitrate': 5000, 'audio_bitrate': 128},  # kbps
+        {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+        {'name': '480p', 'height': 480, 'video_bitrate': 1400, 'audio_bitrate': 96},
+        {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+        {'name': '240p', 'height': 240, 'video_bitrate': 400, 'audio_bitrate': 64},
+    ],
+    'SEGMENT_SECONDS': 6,
+    'PRESET': os.environ.get('TRANSCODE_PRESET', 'veryfast'),
+    'JOBS_PER_CORE': float(os.environ.get('TRANSCODE_JOBS_PER_CORE', '0.5')),  # concurrent ffmpegs per host core
+    'JOB_TIMEOUT': 6 * 60 * 60,
+    'MAX_ATTEMPTS': 3,
+    'RETRY_PENALTY': 10 * 60,
+    'DURATION_WEIGHT': 1.0,  # seconds of queue delay per second of recording
+    'POPULARITY_WEIGHT': 600,  # seconds of queue advance per doubling of viewers
+    'DISPATCH_BATCH': 16,
+}
+
+# Highlight clips and thumbnails cut from recordings via their keyframe index
+CLIP_CONFIG = {
+    'CLIPS_PATH': os.environ.get('CLIPS_PATH', ''),  # defaults to LOCAL_PATH/clips
+    'THUMBNAILS_PATH': os.environ.get('THUMBNAILS_PATH', ''),  # defaults to LOCAL_PATH/thumbnails
+    'MAX_CLIP_SECONDS': 3 * 60,
+    'EDGE_PRESET': 'veryfast',  # x264 settings for the re-encoded partial GOPs
+    'EDGE_CRF': 18,
+    'THUMBNAIL_HEIGHT': 360,
+    'FFMPEG_TIMEOUT': 60,
+    'INDEX_TIMEOUT': 10 * 60,  # keyframe-only decode of a whole recording, in the indexing task
+}
+
 # Email Configuration
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 if EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend':
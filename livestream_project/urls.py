@@ -13,6 +13,8 @@ urlpatterns = [
     path('', root_health_check),  # Root endpoint
     path('health/', include('apps.core.urls')),  # Health check endpoints
     path('api/', include('apps.livestream.urls')),  # Your livestream API
+    path('api/', include('apps.analytics.urls')),
+    path('api/', include('apps.streaming.urls')),
 ]
 
 if settings.DEBUG:
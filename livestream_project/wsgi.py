@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from livestream_project import serving
+
+# Under SERVING_MODE=gevent the stdlib must be patched before Django is imported
+if serving.is_gevent():
+    serving.patch_gevent()
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'livestream_project.settings')
 
+# Routes prefixes in FAST_LANE_CONFIG through their reduced middleware chains
+from apps.core.fastlane import get_wsgi_application  # noqa: E402
+
 application = get_wsgi_application()
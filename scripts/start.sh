@@ -139,31 +139,32 @@ except Exception as e:
 trap 'echo "🛑 Received SIGTERM, shutting down gracefully..."; kill -TERM $PID; wait $PID' TERM
 trap 'echo "🛑 Received SIGINT, shutting down gracefully..."; kill -INT $PID; wait $PID' INT
 
-echo "🚀 Starting gunicorn server..."
+SERVING_MODE=${SERVING_MODE:-sync}
+echo "🚀 Starting web server (mode: $SERVING_MODE)..."
 echo "Bind: 0.0.0.0:8000"
-echo "Workers: 3"
-echo "Timeout: 120s"
-
-# Start gunicorn with optimized settings
-exec gunicorn \
-    --bind 0.0.0.0:8000 \
-    --workers 3 \
-    --worker-class sync \
-    --worker-connections 1000 \
-    --timeout 120 \
-    --keepalive 5 \
-    --max-requests 1000 \
-    --max-requests-jitter 100 \
-    --preload \
-    --access-logfile - \
-    --error-logfile - \
-    --log-level info \
-    --capture-output \
-    --enable-stdio-inheritance \
-    livestream_project.wsgi:application &
+
+if [ "$SERVING_MODE" = "asgi" ]; then
+    exec daphne \
+        --bind 0.0.0.0 \
+        --port 8000 \
+        --access-log - \
+        livestream_project.asgi:application &
+else
+    # Worker class, worker count and pool sizes come from the config file
+    exec gunicorn \
+        --config livestream_project/gunicorn_conf.py \
+        --bind 0.0.0.0:8000 \
+        --preload \
+        --access-logfile - \
+        --error-logfile - \
+        --log-level info \
+        --capture-output \
+        --enable-stdio-inheritance \
+        livestream_project.wsgi:application &
+fi
 
 PID=$!
-echo "🔢 Gunicorn PID: $PID"
+echo "🔢 Server PID: $PID"
 
 # Wait for the server to start
 sleep 5
@@ -181,5 +182,5 @@ done
 
 echo "✅ Startup completed successfully!"
 
-# Wait for gunicorn process
+# Wait for server process
 wait $PID